@@ -1,61 +1,129 @@
-import os
-from typing import TypedDict, List, Optional
-from langchain_openai import AzureChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+import asyncio
+import operator
+from collections import Counter
+from typing import Annotated, TypedDict, List, Optional
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
+from app import templates
+from app.llm_router import llm_router
+from app.metrics import timed_node, record_usage, record_tokens_saved
+from app.policy_index import retrieve_policies, describe_policy
+from app.prompt_budget import compact_text
+from app.resilience import CALL_DEADLINE, call_with_retries
+from app.rules_engine import match_rule, describe_match
+from app.structured_output import ChecklistStreamParser, finish, parse_stats
 
 load_dotenv()
 
 # --- State Definition ---
 class AgentState(TypedDict):
     # Inputs
+    patient_name: Optional[str]
     payer: str
     code: str
     diagnosis: str
     stage: str
     clinical_note: Optional[str]
+    force_llm: Optional[bool]
+    # Set when the letter's tokens or the checklist's items are streamed to
+    # the client, so the call is never hedged or retried (see _call_options)
+    streaming: Optional[bool]
+    # Request fields the deterministic extractor could not find in the note
+    missing_fields: Optional[List[str]]
     
     # Outputs
     auth_needed: Optional[bool]
+    rule_id: Optional[str]
+    conditions_met: Optional[bool]
     reason: Optional[str]
+    # Closest policies by semantic retrieval, when no rule matched exactly
+    related_rules: Optional[List[str]]
     checklist: Optional[List[dict]]
     letter_draft: Optional[str]
+    # Prompt tokens removed by compaction, summed across nodes
+    prompt_tokens_saved: Annotated[int, operator.add]
 
-# --- Node: Rule Check (Mock) ---
+# --- Static Instructions ---
+# Sent as system messages so the prompt prefix is identical across calls and
+# eligible for provider-side prompt caching; only the case details vary.
+EXPLAIN_INSTRUCTIONS = """You are a prior authorization specialist.
+Given a case and a preliminary rule result, provide a clear, natural language explanation for the user.
+If the rule result is definitive, explain it.
+If the rule result is unknown, use your general medical knowledge to suggest if this typically requires auth for this condition.
+Keep it concise (2-3 sentences)."""
+
+LETTER_INSTRUCTIONS = """You draft medical necessity letters to payers for prior authorization requests.
+Use the patient, payer, code, diagnosis and clinical note provided.
+Keep it formal and professional."""
+
+# Hybrid letters (app.templates.HYBRID_LETTERS): the payer's template supplies
+# the header, salutation, guideline paragraph and signature, so the model
+# writes only the part that depends on the case.
+JUSTIFICATION_INSTRUCTIONS = """You write the clinical justification section of medical necessity letters to payers for prior authorization requests.
+Use the patient, code, diagnosis and clinical note provided to explain why the requested therapy is medically necessary for this patient.
+Write one or two formal paragraphs of plain prose.
+Do not write a date, addresses, subject line, greeting, guideline statement, closing or signature: the letter template adds them."""
+
+# --- Node: Rule Check ---
+@timed_node("check_rules")
 def check_rules_node(state: AgentState):
     """
-    Deterministic check against mock rules.
+    Deterministic check against the indexed payer rules.
     """
-    payer = state.get("payer", "").lower()
-    code = state.get("code", "")
+    match = match_rule(
+        state.get("payer", ""),
+        state.get("code", ""),
+        state.get("diagnosis"),
+        state.get("stage"),
+    )
     
-    # Simple mock rule logic
-    if payer == "mockhealth" and code == "J9312":
-        return {
-            "auth_needed": True,
-            "reason": "Rule R-001: J9312 requires auth for MockHealth."
-        }
-    elif payer == "mockhealth" and code == "J9000":
-        return {
-            "auth_needed": False,
-            "reason": "Rule R-002: J9000 is exempt from auth."
-        }
+    if match is None:
+        return {"reason": describe_match(None)}
     
-    return {"reason": "No specific rule found."}
+    return {
+        "auth_needed": match.rule["requires_auth"],
+        "rule_id": match.rule_id,
+        "conditions_met": match.conditions_met,
+        "reason": describe_match(match)
+    }
+
+# --- Node: Templated Explanation ---
+@timed_node("template_explain")
+def template_explain_node(state: AgentState):
+    """
+    Explains a rule-decided outcome without calling the model.
+    """
+    if state.get("auth_needed"):
+        explanation = (
+            f"The patient's diagnosis ({state.get('diagnosis')}) and stage ({state.get('stage')}) "
+            f"meet the policy criteria, so prior authorization must be obtained before treatment."
+        )
+    else:
+        explanation = f"No prior authorization is needed for this request under {state.get('payer')}."
+    return {"reason": f"{state.get('reason')} {explanation}"}
+
+# Counts how auth checks were routed: "short_circuit" (templated) vs "llm".
+routing_stats = Counter()
+
+def route_after_rules(state: AgentState) -> str:
+    """
+    Rule-decided outcomes get a templated explanation; unknown rules or
+    ambiguous conditions (and requests with force_llm) go to the model.
+    """
+    if state.get("rule_id") and state.get("conditions_met") is True and not state.get("force_llm"):
+        routing_stats["short_circuit"] += 1
+        return "template_explain"
+    routing_stats["llm"] += 1
+    return "llm_explain"
 
 # --- Node: LLM Analysis ---
-def llm_analysis_node(state: AgentState):
+@timed_node("llm_explain")
+async def llm_analysis_node(state: AgentState):
     """
     Uses Azure OpenAI to explain the decision or infer if auth is needed based on clinical context.
     """
-    llm = AzureChatOpenAI(
-        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-        openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        temperature=0.7
-    )
     
     diagnosis = state.get("diagnosis")
     stage = state.get("stage")
@@ -64,38 +132,31 @@ def llm_analysis_node(state: AgentState):
     current_reason = state.get("reason", "")
     auth_needed = state.get("auth_needed")
 
-    prompt = f"""
-    You are a prior authorization specialist.
-    
-    Context:
-    - Payer: {payer}
-    - Code: {code}
-    - Diagnosis: {diagnosis}
-    - Stage: {stage}
-    - Preliminary Rule Result: {auth_needed} (Reason: {current_reason})
-    
-    Task:
-    Provide a clear, natural language explanation for the user. 
-    If the rule result is definitive, explain it.
-    If the rule result is unknown, use your general medical knowledge to suggest if this typically requires auth for this condition.
+    prompt = f"""Context:
+- Payer: {payer}
+- Code: {code}
+- Diagnosis: {diagnosis}
+- Stage: {stage}
+- Preliminary Rule Result: {auth_needed} (Reason: {current_reason})"""
     
-    Keep it concise (2-3 sentences).
-    """
+    related = []
+    if not state.get("rule_id"):
+        # No exact (payer, code) rule: ground the model in the closest policies
+        # Off the event loop: the first retrieval in a process builds the index
+        related = await asyncio.to_thread(retrieve_policies, payer, code, diagnosis, stage)
+        if related:
+            prompt += "\n\nRelated payer policies (closest matches, possibly from other payers):\n"
+            prompt += "\n".join(f"- {describe_policy(rule)}" for rule, _ in related)
     
-    response = llm.invoke([HumanMessage(content=prompt)])
+    messages = [SystemMessage(content=EXPLAIN_INSTRUCTIONS), HumanMessage(content=prompt)]
+    response = await call_with_retries(lambda: llm_router.call("explain", lambda llm: llm.ainvoke(messages)))
+    record_usage("explain", response)
     
-    return {"reason": response.content}
+    return {"reason": response.content, "related_rules": [rule["id"] for rule, _ in related]}
 
 # --- Node: Checklist Generator ---
-def checklist_node(state: AgentState):
-    llm = AzureChatOpenAI(
-        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-        openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        temperature=0.7
-    )
-    
+@timed_node("generate")
+async def checklist_node(state: AgentState):
     prompt = f"""
     Generate a checklist of 3-5 mandatory documents for prior auth submission.
     Diagnosis: {state.get("diagnosis")}
@@ -109,66 +170,205 @@ def checklist_node(state: AgentState):
     ]
     """
     
-    response = llm.invoke([HumanMessage(content=prompt)])
-    
-    # In a real app, we'd use PydanticOutputParser here. 
-    # For this demo, we'll rely on the LLM being smart or do simple cleaning.
-    import json
-    try:
-        content = response.content.strip()
-        if content.startswith("```json"):
-            content = content.replace("```json", "").replace("```", "")
-        checklist = json.loads(content)
-    except:
-        checklist = []
+    messages = [HumanMessage(content=prompt)]
+    options = _call_options(state)
+    streaming = bool(state.get("streaming"))
+    checklist, error, reply = await call_with_retries(_checklist_call(messages, streaming), **options)
+    if error:
+        # One retry that shows the model what was wrong with its reply
+        parse_stats["reprompted"] += 1
+        messages += [
+            AIMessage(content=reply),
+            HumanMessage(content=f"{error} Reply again with ONLY the JSON list of checklist objects.")
+        ]
+        checklist, error, reply = await call_with_retries(_checklist_call(messages, streaming), **options)
+        if error:
+            parse_stats["failed"] += 1
         
     return {"checklist": checklist}
 
+def _call_options(state: AgentState) -> dict:
+    """
+    Retry settings for a node's model call. Streamed tokens and items reach
+    the client as they arrive and can't be taken back, so a streamed call
+    runs once, bounded by the overall deadline rather than the per-attempt
+    timeout: a retry would start the reply over mid-stream.
+    """
+    if state.get("streaming"):
+        return {"max_retries": 0, "attempt_timeout": CALL_DEADLINE}
+    return {}
+
+def _checklist_call(messages, streaming: bool = False):
+    # Items are streamed to the client as they parse, so the call must not
+    # be hedged (two replies would emit duplicate items), nor failed over
+    # to another deployment once a client is reading them
+    return lambda: llm_router.call("checklist", lambda llm: _stream_checklist(llm, messages), hedge=False,
+                                   failover=not streaming)
+
+async def _stream_checklist(llm, messages):
+    """
+    Streams a checklist reply through the incremental parser, emitting each
+    item on the graph's custom stream as soon as its object closes.
+    Returns (items, error, reply_text).
+    """
+    writer = get_stream_writer()
+    parser = ChecklistStreamParser()
+    try:
+        async for chunk in llm.astream(messages):
+            # Chunks carry incremental usage when the provider reports it
+            record_usage("checklist", chunk)
+            for item in parser.feed(chunk.content):
+                writer({"checklist_item": item.dict()})
+    except Exception:
+        # Items already emitted can't be taken back, so a reply cut off
+        # midway keeps what parsed instead of being retried from scratch
+        if not parser.buffer:
+            raise
+    checklist, error = finish(parser)
+    return checklist, error, parser.buffer
+
 # --- Node: Letter Drafter ---
-def letter_node(state: AgentState):
-    llm = AzureChatOpenAI(
-        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-        openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        temperature=0.7
-    )
+@timed_node("draft")
+async def letter_node(state: AgentState):
+    # Long notes and repeated justification points are trimmed to the token
+    # budget, keeping the clinically salient sentences
+    note = compact_text(state.get("clinical_note"))
+    record_tokens_saved("letter", note.saved)
+    
+    hybrid = templates.HYBRID_LETTERS
+    prompt = f"""{"Write the clinical justification." if hybrid else "Draft a medical necessity letter."}
+Patient: {state.get("patient_name", "The Patient")}
+Payer: {state.get("payer")}
+Code: {state.get("code")}
+Diagnosis: {state.get("diagnosis")}
+Clinical Note:
+{note.text}"""
+    
+    instructions = JUSTIFICATION_INSTRUCTIONS if hybrid else LETTER_INSTRUCTIONS
+    messages = [SystemMessage(content=instructions), HumanMessage(content=prompt)]
+    # A streamed letter is neither hedged nor failed over: its tokens are
+    # already with the client, and a second reply would follow them
+    restartable = not state.get("streaming")
+    response = await call_with_retries(lambda: llm_router.call("letter", lambda llm: llm.ainvoke(messages),
+                                                               hedge=restartable, failover=restartable),
+                                       **_call_options(state))
+    record_usage("letter", response)
+    letter = response.content
+    if hybrid:
+        letter = templates.render_letter(state.get("patient_name"), state.get("payer"), state.get("code"), [], letter)
+    return {"letter_draft": letter, "prompt_tokens_saved": note.saved}
+
+# --- Node: Field Extraction ---
+@timed_node("extract")
+async def extract_node(state: AgentState):
+    """
+    Fallback for note fields the deterministic extractor (app.extractor)
+    could not resolve. Only the missing fields are requested and returned.
+    """
+    missing = state.get("missing_fields") or []
     
     prompt = f"""
-    Draft a medical necessity letter.
-    Patient: {state.get("patient_name", "The Patient")}
-    Payer: {state.get("payer")}
-    Code: {state.get("code")}
-    Diagnosis: {state.get("diagnosis")}
-    Clinical Note: {state.get("clinical_note")}
+    Extract the following fields from the clinical note: {", ".join(missing)}.
+    - diagnosis: the primary cancer diagnosis, e.g. "Non-small cell lung cancer"
+    - stage: the cancer stage, e.g. "Stage IV"
+    - code: the HCPCS J-code of the requested drug, e.g. "J9305"
+    
+    Clinical Note:
+    {state.get("clinical_note")}
     
-    Keep it formal and professional.
+    Output ONLY a JSON object with those keys. Use null for anything not stated in the note.
     """
     
-    response = llm.invoke([HumanMessage(content=prompt)])
-    return {"letter_draft": response.content}
+    messages = [HumanMessage(content=prompt)]
+    response = await call_with_retries(lambda: llm_router.call("extract", lambda llm: llm.ainvoke(messages)))
+    record_usage("extract", response)
+    
+    import json
+    try:
+        content = response.content.strip()
+        if content.startswith("```"):
+            content = content.strip("`").removeprefix("json")
+        extracted = json.loads(content)
+    except ValueError:
+        return {}
+    if not isinstance(extracted, dict):
+        return {}
+    return {name: str(extracted[name]) for name in missing if extracted.get(name)}
 
 # --- Graph Construction ---
+# The LLM nodes are coroutines, so these graphs must be driven with `ainvoke`.
+# Graphs are compiled on first access (e.g. `agent_workflow.auth_app`) rather
+# than at import, keeping cold starts cheap.
 
 # 1. Auth Check Graph
-auth_workflow = StateGraph(AgentState)
-auth_workflow.add_node("check_rules", check_rules_node)
-auth_workflow.add_node("llm_explain", llm_analysis_node)
-auth_workflow.set_entry_point("check_rules")
-auth_workflow.add_edge("check_rules", "llm_explain")
-auth_workflow.add_edge("llm_explain", END)
-auth_app = auth_workflow.compile()
+def _build_auth_app():
+    auth_workflow = StateGraph(AgentState)
+    auth_workflow.add_node("check_rules", check_rules_node)
+    auth_workflow.add_node("template_explain", template_explain_node)
+    auth_workflow.add_node("llm_explain", llm_analysis_node)
+    auth_workflow.set_entry_point("check_rules")
+    auth_workflow.add_conditional_edges("check_rules", route_after_rules, ["template_explain", "llm_explain"])
+    auth_workflow.add_edge("template_explain", END)
+    auth_workflow.add_edge("llm_explain", END)
+    return auth_workflow.compile()
 
 # 2. Checklist Graph (Simple single node for now, but extensible)
-checklist_workflow = StateGraph(AgentState)
-checklist_workflow.add_node("generate", checklist_node)
-checklist_workflow.set_entry_point("generate")
-checklist_workflow.add_edge("generate", END)
-checklist_app = checklist_workflow.compile()
+def _build_checklist_app():
+    checklist_workflow = StateGraph(AgentState)
+    checklist_workflow.add_node("generate", checklist_node)
+    checklist_workflow.set_entry_point("generate")
+    checklist_workflow.add_edge("generate", END)
+    return checklist_workflow.compile()
 
 # 3. Letter Graph
-letter_workflow = StateGraph(AgentState)
-letter_workflow.add_node("draft", letter_node)
-letter_workflow.set_entry_point("draft")
-letter_workflow.add_edge("draft", END)
-letter_app = letter_workflow.compile()
+def _build_letter_app():
+    letter_workflow = StateGraph(AgentState)
+    letter_workflow.add_node("draft", letter_node)
+    letter_workflow.set_entry_point("draft")
+    letter_workflow.add_edge("draft", END)
+    return letter_workflow.compile()
+
+# 4. Full PA Packet Graph
+# Rules run once; the explanation, checklist and letter then run as parallel
+# branches over the shared state, so wall time is the slowest branch.
+def _build_packet_app():
+    packet_workflow = StateGraph(AgentState)
+    packet_workflow.add_node("check_rules", check_rules_node)
+    packet_workflow.add_node("template_explain", template_explain_node)
+    packet_workflow.add_node("llm_explain", llm_analysis_node)
+    packet_workflow.add_node("generate", checklist_node)
+    packet_workflow.add_node("draft", letter_node)
+    packet_workflow.set_entry_point("check_rules")
+    packet_workflow.add_conditional_edges("check_rules", route_after_rules, ["template_explain", "llm_explain"])
+    packet_workflow.add_edge("check_rules", "generate")
+    packet_workflow.add_edge("check_rules", "draft")
+    packet_workflow.add_edge("template_explain", END)
+    packet_workflow.add_edge("llm_explain", END)
+    packet_workflow.add_edge("generate", END)
+    packet_workflow.add_edge("draft", END)
+    return packet_workflow.compile()
+
+# 5. Field Extraction Graph
+def _build_extract_app():
+    extract_workflow = StateGraph(AgentState)
+    extract_workflow.add_node("extract", extract_node)
+    extract_workflow.set_entry_point("extract")
+    extract_workflow.add_edge("extract", END)
+    return extract_workflow.compile()
+
+_GRAPH_BUILDERS = {
+    "auth_app": _build_auth_app,
+    "checklist_app": _build_checklist_app,
+    "letter_app": _build_letter_app,
+    "packet_app": _build_packet_app,
+    "extract_app": _build_extract_app,
+}
+
+def __getattr__(name: str):
+    builder = _GRAPH_BUILDERS.get(name)
+    if builder is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    graph = builder()
+    # Cache as a real module attribute so later lookups skip this hook
+    globals()[name] = graph
+    return graph
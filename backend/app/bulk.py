@@ -0,0 +1,293 @@
+"""
+Bulk pre-screening of claim worklists against the rules engine, without
+going through the API:
+
+    python -m app.bulk claims.csv -o screened.csv
+    python -m app.bulk claims.jsonl --processes 8 --chunk-size 20000 > screened.jsonl
+
+Input is CSV (with a header row) or JSONL carrying payer and code, plus
+optional diagnosis and stage. Rows are read in chunks, scored across worker
+processes and written in input order as each chunk finishes, so memory stays
+flat however long the extract is. Every output row is the input row plus
+rule_id, auth_needed, conditions_met and reason (the deterministic one-line
+reason); --explain adds the model's explanation, which is far slower and off
+by default. Throughput is reported on stderr.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.rules_engine import RuleIndex, RuleMatch, describe_match, get_index, load_rules, normalize_code, normalize_payer
+
+# --- Settings ---
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "10000"))
+BULK_PROCESSES = int(os.getenv("BULK_PROCESSES", str(os.cpu_count() or 1)))
+# Model calls in flight per worker process with --explain
+BULK_EXPLAIN_CONCURRENCY = int(os.getenv("BULK_EXPLAIN_CONCURRENCY", "8"))
+PROGRESS_INTERVAL = 5.0
+
+RESULT_FIELDS = ["rule_id", "auth_needed", "conditions_met", "reason"]
+EXPLANATION_FIELD = "explanation"
+
+INPUT_FIELDS = ("payer", "code", "diagnosis", "stage")
+
+# (rows, input CSV header or None for JSONL, output format, output CSV columns, explain)
+Chunk = Tuple[List, Optional[List[str]], str, Optional[List[str]], bool]
+
+# --- Input ---
+def _format(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def read_rows(stream, fmt: str) -> Tuple[Optional[List[str]], Iterator]:
+    """
+    Returns the CSV header (None for JSONL) and a lazy iterator over rows:
+    lists of cells for CSV, dicts for JSONL.
+    """
+    if fmt == "csv":
+        reader = csv.reader(stream)
+        return next(reader, []), reader
+    return None, (json.loads(line) for line in stream if line.strip())
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _value(value) -> Optional[str]:
+    # CSV gives "" for empty cells; JSONL may carry numbers (e.g. stage 4)
+    return None if value is None or value == "" else str(value)
+
+def columns_of(rows: List, header: Optional[List[str]]) -> List[List[Optional[str]]]:
+    """
+    The payer, code, diagnosis and stage columns of a chunk.
+    """
+    if header is None:
+        return [[_value(row.get(name)) for row in rows] for name in INPUT_FIELDS]
+    columns = []
+    for name in INPUT_FIELDS:
+        if name not in header:
+            columns.append([None] * len(rows))
+            continue
+        i = header.index(name)
+        columns.append([_value(row[i]) if i < len(row) else None for row in rows])
+    return columns
+
+# --- Scoring ---
+def score_columns(payers: List[Optional[str]], codes: List[Optional[str]], diagnoses: List[Optional[str]],
+                  stages: List[Optional[str]], index: RuleIndex) -> List[Optional[RuleMatch]]:
+    """
+    Scores a chunk column-wise: each distinct payer and code spelling is
+    normalized once, each distinct (payer, code) key is tested for
+    membership in the index once, and conditions are evaluated once per
+    distinct case. Rows whose key no rule covers (most of a typical
+    extract) stop at the set lookup.
+    """
+    payer_keys = {payer: normalize_payer(payer) for payer in set(payers)}
+    code_keys = {code: normalize_code(code) for code in set(codes)}
+    keys = [(payer_keys[payer], code_keys[code]) for payer, code in zip(payers, codes)]
+    covered = {key for key in set(keys) if index.candidates(*key)}
+
+    matches: List[Optional[RuleMatch]] = []
+    cases: Dict[Tuple, Optional[RuleMatch]] = {}
+    for key, diagnosis, stage in zip(keys, diagnoses, stages):
+        if key not in covered:
+            matches.append(None)
+            continue
+        case = (key, diagnosis, stage)
+        if case not in cases:
+            cases[case] = index.match(*key, diagnosis, stage)
+        matches.append(cases[case])
+    return matches
+
+def _result(match: Optional[RuleMatch]) -> Tuple:
+    # Same outcome as /check_auth_need, with the deterministic reason
+    # (values in RESULT_FIELDS order)
+    if match is None:
+        return (None, False, None, describe_match(None))
+    return (match.rule_id, match.rule["requires_auth"], match.conditions_met, describe_match(match))
+
+# One event loop per process runs every chunk's model calls: the pooled HTTP
+# client (app.llm_pool) and llm_client's semaphore belong to the loop they
+# were first used on, and a loop per chunk would strand them chunk by chunk
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _run(coroutine):
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+def _close_loop():
+    # Worker processes skip this: their connections end with the process
+    global _loop
+    if _loop is None:
+        return
+    from app.llm_pool import aclose_pool
+    try:
+        _loop.run_until_complete(aclose_pool())
+    finally:
+        _loop.close()
+        _loop = None
+
+async def _explain(columns: List[List[Optional[str]]], matches: List[Optional[RuleMatch]]) -> List[str]:
+    # Imported here so plain scoring never loads the model stack
+    from app.llm_client import llm_client
+
+    semaphore = asyncio.Semaphore(BULK_EXPLAIN_CONCURRENCY)
+    explanations: Dict[Tuple, asyncio.Task] = {}
+
+    async def explain(match: Optional[RuleMatch], request: Dict) -> str:
+        async with semaphore:
+            return await llm_client.explain_auth_need(match.rule if match else None, request)
+
+    cases = list(zip(*columns))
+    for case, match in zip(cases, matches):
+        if case not in explanations:
+            explanations[case] = asyncio.ensure_future(explain(match, dict(zip(INPUT_FIELDS, case))))
+    await asyncio.gather(*explanations.values())
+    return [explanations[case].result() for case in cases]
+
+def _score_chunk(chunk: Chunk, index: RuleIndex) -> Tuple[str, int, int]:
+    """
+    Scores and serializes one chunk (in the worker, so formatting is
+    parallel too). Returns (output text, rows, rows needing auth).
+    """
+    rows, header, fmt, columns, explain = chunk
+    fields = columns_of(rows, header)
+    matches = score_columns(*fields, index)
+    # Rows sharing a rule outcome share one result tuple
+    outcomes: Dict[Tuple, Tuple] = {}
+    results = []
+    for match in matches:
+        key = (match.rule_id, match.conditions_met) if match else None
+        if key not in outcomes:
+            outcomes[key] = _result(match)
+        results.append(outcomes[key])
+    if explain:
+        results = [result + (explanation,) for result, explanation in zip(results, _run(_explain(fields, matches)))]
+    names = RESULT_FIELDS + ([EXPLANATION_FIELD] if explain else [])
+
+    out = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        # Input part of the output columns (previous results are replaced)
+        keep = columns[:len(columns) - len(names)]
+        if header == keep:
+            width = len(header)
+            writer.writerows((row if len(row) == width else (row + [""] * width)[:width]) + list(result)
+                             for row, result in zip(rows, results))
+        elif header is not None:
+            positions = [header.index(name) for name in keep]
+            writer.writerows([row[i] if i < len(row) else "" for i in positions] + list(result)
+                             for row, result in zip(rows, results))
+        else:
+            writer.writerows([row.get(name) for name in keep] + list(result) for row, result in zip(rows, results))
+    else:
+        for row, result in zip(rows, results):
+            record = dict(zip(header, row)) if header is not None else dict(row)
+            record.update(zip(names, result))
+            out.write(json.dumps(record) + "\n")
+    return out.getvalue(), len(rows), sum(result[1] for result in results)
+
+# --- Worker processes ---
+_worker_index: Optional[RuleIndex] = None
+
+def _init_worker(rules_path: Optional[str]):
+    global _worker_index
+    _worker_index = RuleIndex(load_rules(rules_path)) if rules_path else get_index()
+
+def _score_in_worker(chunk: Chunk) -> Tuple[str, int, int]:
+    return _score_chunk(chunk, _worker_index)
+
+def score_chunks(chunks: Iterable[Chunk], processes: int, rules_path: Optional[str] = None) -> Iterator[Tuple[str, int, int]]:
+    """
+    Yields scored chunks in input order. At most two chunks per process
+    are in flight, so a slow writer or a huge input can't pile up results.
+    """
+    if processes <= 1:
+        index = RuleIndex(load_rules(rules_path)) if rules_path else get_index()
+        try:
+            for chunk in chunks:
+                yield _score_chunk(chunk, index)
+        finally:
+            _close_loop()
+        return
+
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(rules_path,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_in_worker, chunk))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSONL worklist ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Where to write scored rows (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from the file extension)")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], help="Output format (default: from -o, else the input format)")
+    parser.add_argument("--rules", help="Rules file to score against (default: RULES_PATH)")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    parser.add_argument("--processes", type=int, default=BULK_PROCESSES)
+    parser.add_argument("--explain", action="store_true", help="Add the model's explanation to every row (slow)")
+    args = parser.parse_args(argv)
+
+    in_format = _format(args.input, args.format)
+    out_format = args.output_format or (_format(args.output, None) if args.output != "-" else in_format)
+
+    source = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        header, rows = read_rows(source, in_format)
+        columns = None
+        if out_format == "csv":
+            input_columns = header
+            if input_columns is None:
+                # JSONL in, CSV out: the first row's keys decide the columns
+                first = next(rows, None)
+                input_columns = list(first) if first else []
+                rows = itertools.chain([first], rows) if first else rows
+            result_columns = RESULT_FIELDS + ([EXPLANATION_FIELD] if args.explain else [])
+            # Re-scoring an already scored file replaces its result columns
+            columns = [name for name in input_columns if name not in result_columns] + result_columns
+            csv.writer(sink, lineterminator="\n").writerow(columns)
+
+        chunks = ((chunk, header, out_format, columns, args.explain) for chunk in chunked(rows, args.chunk_size))
+        started = last_report = time.perf_counter()
+        total = needs_auth = 0
+        for text, count, auth in score_chunks(chunks, args.processes, args.rules):
+            sink.write(text)
+            total += count
+            needs_auth += auth
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                print(f"{total:,} rows ({total / (now - started):,.0f} rows/s)", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Scored {total:,} rows in {elapsed:.2f}s ({rate:,.0f} rows/s); {needs_auth:,} need auth", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
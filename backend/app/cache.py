@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.rules_engine import normalize_stage
+
+logger = logging.getLogger(__name__)
+
+# --- Settings ---
+# LLM_CACHE: "memory" (per process), "sqlite" (shared by workers on one host) or "off"
+CACHE_BACKEND = os.getenv("LLM_CACHE", "memory")
+CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "llm_cache.sqlite3")
+)
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+CACHE_MAXSIZE = int(os.getenv("LLM_CACHE_MAXSIZE", "1024"))
+
+_MISS = object()
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# --- Key Normalization ---
+def normalize_text(value: Any) -> str:
+    return _WHITESPACE_RE.sub(" ", str(value or "")).strip().lower()
+
+def make_key(kind: str, **fields: Any) -> str:
+    """
+    Builds a cache key from request fields. Text is case/whitespace folded and
+    a field named "stage" is mapped to its canonical form, so "Stage IV" and
+    "stage 4" share an entry.
+    """
+    normalized = {}
+    for name, value in sorted(fields.items()):
+        text = normalize_text(value)
+        if name == "stage":
+            text = normalize_stage(text) or text
+        normalized[name] = text
+    digest = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    return f"{kind}:{digest}"
+
+# --- Backends ---
+class MemoryCache:
+    """
+    LRU with a per-entry TTL, bounded to `maxsize` entries.
+    """
+
+    # Lookups are in memory: called directly on the event loop
+    blocking = False
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISS
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SQLiteCache:
+    """
+    JSON values in a SQLite file, so every worker on the host shares one cache.
+    Expired rows are skipped on read and purged on write.
+    """
+
+    # Calls can wait out the busy timeout while another worker writes, so
+    # ResponseCache runs them in a thread
+    blocking = True
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use in each process: with a preloaded app the cache
+        # is created in the pre-fork master, and a SQLite connection must not
+        # be used across fork()
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires >= ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else _MISS
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl),
+            )
+            db.execute("DELETE FROM cache WHERE expires < ?", (now,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+# --- Response Cache ---
+class ResponseCache:
+    """
+    Caches model outputs by normalized request key and collapses concurrent
+    identical requests onto a single computation (single flight).
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.stats = Counter()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        if CACHE_BACKEND == "off":
+            return cls(None)
+        if CACHE_BACKEND == "sqlite":
+            return cls(SQLiteCache())
+        return cls(MemoryCache())
+
+    async def _get(self, key: str) -> Any:
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.backend.get, key)
+        return self.backend.get(key)
+
+    async def _set(self, key: str, value: Any):
+        if self.backend.blocking:
+            await asyncio.to_thread(self.backend.set, key, value)
+        else:
+            self.backend.set(key, value)
+
+    async def peek(self, key: str) -> Any:
+        """
+        Returns the cached value for `key` (None on a miss) without computing.
+        """
+        if self.backend is None:
+            return None
+        value = await self._get(key)
+        return None if value is _MISS else value
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        if self.backend is None:
+            return await compute()
+
+        value = await self._get(key)
+        if value is not _MISS:
+            self.stats["hits"] += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The computation we joined was cancelled (e.g. an abandoned
+                # prefetch), not this request: compute it ourselves
+                return await self.get_or_compute(key, compute)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody waited on isn't logged
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # Empty outputs (e.g. an unparseable checklist) are not worth keeping
+            if value:
+                try:
+                    await self._set(key, value)
+                except Exception as e:
+                    # Caching is best effort; the answer still goes out
+                    logger.warning("Response cache write failed: %s: %s", type(e).__name__, e)
+            return value
+        finally:
+            del self._inflight[key]
+
+response_cache = ResponseCache.from_env()
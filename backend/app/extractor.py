@@ -0,0 +1,110 @@
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from app.rules_engine import normalize_stage
+
+# --- Vocabulary ---
+# Canonical diagnosis -> synonyms seen in oncology notes
+DIAGNOSIS_SYNONYMS: Dict[str, List[str]] = {
+    "Non-small cell lung cancer": ["non-small cell lung cancer", "non small cell lung cancer", "nsclc"],
+    "Small cell lung cancer": ["small cell lung cancer", "sclc"],
+    "Lung cancer": ["lung cancer", "lung adenocarcinoma", "lung carcinoma"],
+    "Breast cancer": ["breast cancer", "breast carcinoma", "her2-positive breast", "triple negative breast"],
+    "Colorectal cancer": ["colorectal cancer", "colon cancer", "rectal cancer", "crc"],
+    "Multiple myeloma": ["multiple myeloma", "myeloma"],
+    "Melanoma": ["melanoma"],
+    "Prostate cancer": ["prostate cancer", "prostate adenocarcinoma"],
+    "Non-Hodgkin lymphoma": ["non-hodgkin lymphoma", "nhl", "diffuse large b-cell lymphoma", "dlbcl"],
+    "Pancreatic cancer": ["pancreatic cancer", "pancreatic adenocarcinoma"],
+}
+
+# Drug name -> HCPCS J-code, used when the note names the drug but not the code
+DRUG_CODES: Dict[str, str] = {
+    "atezolizumab": "J9022",
+    "bevacizumab": "J9035",
+    "bortezomib": "J9041",
+    "carboplatin": "J9045",
+    "cetuximab": "J9055",
+    "daratumumab": "J9145",
+    "paclitaxel": "J9267",
+    "pembrolizumab": "J9271",
+    "nivolumab": "J9299",
+    "pemetrexed": "J9305",
+    "rituximab": "J9312",
+    "trastuzumab": "J9355",
+}
+
+def _alternation(terms) -> str:
+    # Longest first so e.g. "non-small cell lung cancer" wins over "lung cancer"
+    return "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+
+_CODE_RE = re.compile(r"\b(J\d{4})\b", re.IGNORECASE)
+_STAGE_RE = re.compile(r"\bstage\b\s*[:\-]?\s*((?:iv|iii|ii|i|[0-4])(?:[abc]\d?)?)\b", re.IGNORECASE)
+_ECOG_RE = re.compile(r"\becog\b(?:\s*ps)?\s*[:=]?\s*([0-5])\b", re.IGNORECASE)
+_DIAGNOSIS_LINE_RE = re.compile(r"^\s*(?:diagnosis|dx)\s*:(.*)$", re.IGNORECASE | re.MULTILINE)
+_SYNONYM_TO_DIAGNOSIS = {
+    synonym: canonical
+    for canonical, synonyms in DIAGNOSIS_SYNONYMS.items()
+    for synonym in synonyms
+}
+_DIAGNOSIS_RE = re.compile(r"\b(" + _alternation(_SYNONYM_TO_DIAGNOSIS) + r")\b", re.IGNORECASE)
+_DRUG_RE = re.compile(r"\b(" + _alternation(DRUG_CODES) + r")\b", re.IGNORECASE)
+
+# CheckAuthRequest fields the extractor can fill
+NOTE_FIELDS = ("diagnosis", "stage", "code")
+
+@dataclass
+class ExtractedFields:
+    diagnosis: Optional[str] = None
+    stage: Optional[str] = None
+    code: Optional[str] = None
+    # Every J-code in the note, in order of appearance
+    codes: List[str] = field(default_factory=list)
+    ecog: Optional[int] = None
+
+    def missing(self) -> List[str]:
+        return [name for name in NOTE_FIELDS if not getattr(self, name)]
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+def _find_diagnosis(note: str) -> Optional[str]:
+    # A "Diagnosis:" line is more reliable than mentions elsewhere in the note
+    line = _DIAGNOSIS_LINE_RE.search(note)
+    for text in ((line.group(1),) if line else ()) + (note,):
+        match = _DIAGNOSIS_RE.search(text)
+        if match:
+            return _SYNONYM_TO_DIAGNOSIS[match.group(1).lower()]
+    return None
+
+def _find_stage(note: str) -> Optional[str]:
+    match = _STAGE_RE.search(note)
+    if not match:
+        return None
+    raw = match.group(1).upper()
+    # Keep the substage ("IVB") but spell the stage itself in roman numerals
+    base = normalize_stage(raw).split()[1].upper()
+    digits = re.match(r"(IV|III|II|I|[0-4])", raw).group(1)
+    return f"Stage {base}{raw[len(digits):]}"
+
+def extract_fields(note: Optional[str]) -> ExtractedFields:
+    """
+    Pulls diagnosis, stage, J-code(s) and ECOG out of a free-text note using
+    precompiled patterns only. Fields that can't be found are left as None.
+    """
+    if not note:
+        return ExtractedFields()
+    codes = list(dict.fromkeys(code.upper() for code in _CODE_RE.findall(note)))
+    code = codes[0] if codes else None
+    if code is None:
+        drug = _DRUG_RE.search(note)
+        code = DRUG_CODES[drug.group(1).lower()] if drug else None
+    ecog = _ECOG_RE.search(note)
+    return ExtractedFields(
+        diagnosis=_find_diagnosis(note),
+        stage=_find_stage(note),
+        code=code,
+        codes=codes,
+        ecog=int(ecog.group(1)) if ecog else None,
+    )
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+# --- Settings ---
+# Results stored under client-sent Idempotency-Key headers. The SQLite file
+# is shared by every worker process on the host.
+IDEMPOTENCY_PATH = os.getenv(
+    "IDEMPOTENCY_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "idempotency.sqlite3")
+)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# A key whose first request never finished (worker died) frees up after this
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "120"))
+# How long a duplicate waits for the original request before giving up (409)
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "60"))
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+
+PENDING, DONE = "pending", "done"
+
+class IdempotencyMismatch(Exception):
+    """The key was already used with a different request body."""
+
+class IdempotencyInProgress(Exception):
+    """The original request is still running after IDEMPOTENCY_WAIT."""
+
+def fingerprint(body: Dict) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+class IdempotencyStore:
+    """
+    Stores one result per key for IDEMPOTENCY_TTL. The first request with a
+    key reserves it and computes; repeats get the stored result, and
+    duplicates arriving while it runs wait for it (on the shared future in
+    this process, by polling the file across processes).
+    """
+
+    def __init__(self, path: str = IDEMPOTENCY_PATH, ttl: float = IDEMPOTENCY_TTL,
+                 lock_timeout: float = IDEMPOTENCY_LOCK_TIMEOUT, wait: float = IDEMPOTENCY_WAIT):
+        self.path = path
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.wait = wait
+        # "stored", "replayed" and "waited" (duplicates that waited for the original)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inflight: Dict[str, Tuple[asyncio.Future, str]] = {}
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use so importing the app doesn't create the file
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency (key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+                "status TEXT NOT NULL, response TEXT, expires REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _reserve(self, key: str, body_fingerprint: str) -> Tuple[str, Any]:
+        """
+        Returns ("owner", None) if this caller should compute, ("done",
+        response) for a stored result, or ("pending", None).
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM idempotency WHERE expires < ?", (now,))
+            # Inserts the reservation, or takes over one whose holder timed out
+            taken = db.execute(
+                "INSERT INTO idempotency (key, fingerprint, status, expires) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET fingerprint = excluded.fingerprint, expires = excluded.expires "
+                "WHERE status = ? AND expires < ?",
+                (key, body_fingerprint, PENDING, now + self.lock_timeout, PENDING, now),
+            ).rowcount
+            row = db.execute(
+                "SELECT fingerprint, status, response FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+        if taken:
+            return "owner", None
+        if row is None:
+            # Released between the two statements; try again
+            return self._reserve(key, body_fingerprint)
+        stored_fingerprint, status, response = row
+        if stored_fingerprint != body_fingerprint:
+            raise IdempotencyMismatch(key)
+        return (DONE, json.loads(response)) if status == DONE else (PENDING, None)
+
+    def _complete(self, key: str, response: Any):
+        with self._lock:
+            self._db().execute(
+                "UPDATE idempotency SET status = ?, response = ?, expires = ? WHERE key = ?",
+                (DONE, json.dumps(response), time.time() + self.ttl, key),
+            )
+
+    def _release(self, key: str):
+        with self._lock:
+            self._db().execute("DELETE FROM idempotency WHERE key = ? AND status = ?", (key, PENDING))
+
+    async def run(self, key: str, body: Dict, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Returns (result, replayed). `compute` must return a JSON-serializable
+        value; failures are not stored, so the client can retry the key.
+        """
+        body_fingerprint = fingerprint(body)
+        deadline = time.monotonic() + self.wait
+        waited = False
+        while True:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                future, pending_fingerprint = pending
+                if pending_fingerprint != body_fingerprint:
+                    raise IdempotencyMismatch(key)
+                try:
+                    value = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                    # The original request was cancelled, not this one: its
+                    # key was released, so try to take it over
+                    continue
+                self.stats["waited"] += 1
+                return value, True
+
+            # SQLite calls block (busy timeout included), so they run in a thread
+            state, stored = await asyncio.to_thread(self._reserve, key, body_fingerprint)
+            if state == DONE:
+                self.stats["waited" if waited else "replayed"] += 1
+                return stored, True
+            if state == "owner":
+                break
+            # Another request holds the key: wait for its result
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(key)
+            waited = True
+            await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (future, body_fingerprint)
+        try:
+            value = await compute()
+        except BaseException as e:
+            await asyncio.to_thread(self._release, key)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark retrieved so an exception nobody waited on isn't logged
+                future.exception()
+            raise
+        else:
+            await asyncio.to_thread(self._complete, key, value)
+            self.stats["stored"] += 1
+            future.set_result(value)
+            return value, False
+        finally:
+            del self._inflight[key]
+
+idempotency_store = IdempotencyStore()
+
+# --- Endpoint helper ---
+Model = TypeVar("Model", bound=BaseModel)
+
+async def idempotent(endpoint: str, key: Optional[str], request: BaseModel, response: Optional[Response],
+                     model: Type[Model], compute: Callable[[], Awaitable[Model]]) -> Model:
+    """
+    Runs an endpoint's `compute` under the client's Idempotency-Key (scoped to
+    the endpoint). Without a key it just runs. Replays are marked with an
+    `Idempotent-Replayed: true` header.
+    """
+    if not key:
+        return await compute()
+
+    async def stored():
+        return (await compute()).dict()
+
+    try:
+        value, replayed = await idempotency_store.run(f"{endpoint}:{key}", request.dict(), stored)
+    except IdempotencyMismatch:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress",
+                            headers={"Retry-After": "1"})
+    if replayed and response is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+    return model(**value)
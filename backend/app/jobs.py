@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Settings ---
+# One SQLite file is the queue for every worker process on the host, so
+# adding uvicorn workers adds job workers without an external broker.
+JOBS_PATH = os.getenv(
+    "JOBS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "jobs.sqlite3")
+)
+# Jobs each process runs at once
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Submissions are refused (503) once this many jobs are waiting
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+# A running job whose worker went away is re-queued after this many seconds
+JOB_LEASE = float(os.getenv("JOB_LEASE", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs are kept this long for polling
+JOB_TTL = float(os.getenv("JOB_TTL", "86400"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# A worker whose store call failed (e.g. the database stayed locked past its
+# busy timeout) waits this long before trying again
+JOB_ERROR_BACKOFF = float(os.getenv("JOB_ERROR_BACKOFF", "5"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+_COLUMNS = "id, kind, status, priority, payload, result, error, attempts, created, started, finished"
+
+class QueueFull(Exception):
+    pass
+
+# --- Store ---
+class JobStore:
+    """
+    Jobs in a SQLite table. Claiming is a single UPDATE ... RETURNING, so
+    concurrent workers (threads or processes) never get the same job.
+    The file is opened on first use.
+    """
+
+    def __init__(self, path: str = JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+                "payload TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created REAL NOT NULL, started REAL, finished REAL, leased_until REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(row) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip([c.strip() for c in _COLUMNS.split(",")], row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def submit(self, kind: str, payload: Dict, priority: int = 0, max_queued: int = JOB_MAX_QUEUED) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._db()
+            # IMMEDIATE takes the write lock, so the size check and insert are atomic
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued >= max_queued:
+                    raise QueueFull(f"{queued} jobs already queued")
+                db.execute(
+                    "INSERT INTO jobs (id, kind, status, priority, payload, created) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, QUEUED, priority, json.dumps(payload), time.time()),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def claim(self, lease: float = JOB_LEASE, max_attempts: int = JOB_MAX_ATTEMPTS) -> Optional[Dict[str, Any]]:
+        """
+        Takes the highest-priority, oldest runnable job: queued, or running
+        with an expired lease (its worker died) and attempts left.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db().execute(
+                f"UPDATE jobs SET status = ?, started = ?, leased_until = ?, attempts = attempts + 1 "
+                f"WHERE id = (SELECT id FROM jobs WHERE status = ? OR (status = ? AND leased_until < ? AND attempts < ?) "
+                f"ORDER BY priority DESC, created LIMIT 1) RETURNING {_COLUMNS}",
+                (RUNNING, now, now + lease, QUEUED, RUNNING, now, max_attempts),
+            ).fetchone()
+        return self._row(row)
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, leased_until = NULL WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+
+    def complete(self, job_id: str, result: Any):
+        self._finish(job_id, DONE, result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, FAILED, error=error)
+
+    def requeue(self, job_id: str):
+        with self._lock:
+            self._db().execute(
+                "UPDATE jobs SET status = ?, started = NULL, leased_until = NULL WHERE id = ? AND status = ?",
+                (QUEUED, job_id, RUNNING),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def purge(self, ttl: float = JOB_TTL, max_attempts: int = JOB_MAX_ATTEMPTS):
+        """
+        Drops finished jobs older than `ttl` and fails jobs whose lease
+        expired with no attempts left.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?", (DONE, FAILED, now - ttl))
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, leased_until = NULL "
+                "WHERE status = ? AND leased_until < ? AND attempts >= ?",
+                (FAILED, "Worker stopped responding", now, RUNNING, now, max_attempts),
+            )
+
+job_store = JobStore()
+
+# --- Workers ---
+Handler = Callable[[Dict], Awaitable[Any]]
+
+class JobWorkers:
+    """
+    `concurrency` asyncio tasks that claim jobs from the store and run the
+    handler registered for each job's kind. Submissions in this process wake
+    them immediately; jobs from other processes are picked up by polling.
+    Store calls block on SQLite, so they run in threads off the event loop.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler], store: JobStore = job_store,
+                 concurrency: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL,
+                 error_backoff: float = JOB_ERROR_BACKOFF):
+        self.handlers = handlers
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.error_backoff = error_backoff
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        try:
+            await asyncio.to_thread(self.store.purge)
+        except Exception as e:
+            logger.warning("Job purge failed: %s: %s", type(e).__name__, e)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def _run(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._execute(job)
+            except Exception as e:
+                # Keep the worker: a job whose result couldn't be stored is
+                # re-claimed once its lease expires
+                logger.warning("Job worker store call failed, retrying in %.1fs: %s: %s",
+                               self.error_backoff, type(e).__name__, e)
+                await asyncio.sleep(self.error_backoff)
+
+    async def _execute(self, job: Dict[str, Any]):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await asyncio.to_thread(self.store.fail, job["id"], f"Unknown job kind: {job['kind']}")
+            return
+        try:
+            result = await handler(job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back rather than lose it
+            await asyncio.to_thread(self.store.requeue, job["id"])
+            raise
+        except Exception as e:
+            logger.warning("Job %s (%s) failed: %s", job["id"], job["kind"], e)
+            await asyncio.to_thread(self.store.fail, job["id"], str(e))
+        else:
+            await asyncio.to_thread(self.store.complete, job["id"], result)
@@ -1,14 +1,60 @@
+import asyncio
+import logging
 import os
-from typing import List, Dict
-from app.agent_workflow import auth_app, checklist_app, letter_app
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional
+from dotenv import load_dotenv
+from app import templates
+from app.cache import response_cache, make_key
+from app.metrics import record_path
+from app.resilience import breaker, resilience_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on graph runs in flight per process. Requests beyond this wait on
+# the semaphore instead of piling more concurrent calls onto Azure.
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+# Words per chunk when streaming the mock letter
+MOCK_STREAM_WORDS = 8
+_WORD_RE = re.compile(r"\S+\s*")
+
+def _workflow():
+    # Deferred so that importing the client (and serving mock mode) never pulls
+    # in langgraph/langchain or compiles graphs; see app.agent_workflow.
+    from app import agent_workflow
+    return agent_workflow
 
 class LLMClient:
     def __init__(self):
-        # We don't need to init the client here anymore as the graph handles it per request
-        # but we check if env vars are set
+        # The graph nodes share pooled chat models (see app.llm_pool),
+        # so here we only check if env vars are set
         self.has_azure = os.getenv("AZURE_OPENAI_API_KEY") is not None
 
-    def explain_auth_need(self, rule: Dict, patient_data: Dict) -> str:
+    async def _resilient(self, operation: str, compute: Callable[[], Awaitable[Any]],
+                         fallback: Callable[[], Any], key: Optional[str] = None) -> Any:
+        """
+        Runs `compute` (through the response cache when `key` is given). While
+        the circuit breaker is open, or if the call still fails after the
+        retries in app.resilience, serves the cached answer or `fallback()`.
+        """
+        if breaker.allow():
+            try:
+                if key is None:
+                    return await compute()
+                return await response_cache.get_or_compute(key, compute)
+            except Exception as e:
+                logger.warning("%s failed, falling back: %s: %s", operation, type(e).__name__, e)
+        resilience_stats["fallbacks"] += 1
+        cached = await response_cache.peek(key) if key else None
+        return cached if cached is not None else fallback()
+
+    async def explain_auth_need(self, rule: Dict, patient_data: Dict) -> str:
+        record_path("explain", self.has_azure)
         if not self.has_azure:
             return self._mock_explain_auth_need(rule, patient_data)
             
@@ -19,14 +65,32 @@ class LLMClient:
             "diagnosis": patient_data.get("diagnosis"),
             "stage": patient_data.get("stage"),
             "clinical_note": patient_data.get("clinical_note"),
+            "force_llm": patient_data.get("force_llm", False),
             # We pass the rule result if we have it, but the graph also checks rules.
             # For consistency with the graph's logic, we let the graph do the work.
         }
         
-        result = auth_app.invoke(state)
+        key = make_key(
+            "explain",
+            payer=state["payer"],
+            code=state["code"],
+            diagnosis=state["diagnosis"],
+            stage=state["stage"],
+            rule=rule["id"] if rule else None,
+            force_llm=state["force_llm"],
+        )
+        return await self._resilient(
+            "explain", lambda: self._run_auth(state),
+            lambda: self._mock_explain_auth_need(rule, patient_data), key
+        )
+
+    async def _run_auth(self, state: Dict) -> str:
+        async with _semaphore:
+            result = await _workflow().auth_app.ainvoke(state)
         return result.get("reason", "Could not generate explanation.")
 
-    def generate_checklist(self, diagnosis: str, stage: str, code: str) -> List[Dict]:
+    async def generate_checklist(self, diagnosis: str, stage: str, code: str) -> List[Dict]:
+        record_path("checklist", self.has_azure)
         if not self.has_azure:
             return self._mock_checklist(diagnosis, stage, code)
             
@@ -35,10 +99,54 @@ class LLMClient:
             "stage": stage,
             "code": code
         }
-        result = checklist_app.invoke(state)
+        key = make_key("checklist", diagnosis=diagnosis, stage=stage, code=code)
+        return await self._resilient(
+            "checklist", lambda: self._run_checklist(state),
+            lambda: self._mock_checklist(diagnosis, stage, code), key
+        )
+
+    async def _run_checklist(self, state: Dict) -> List[Dict]:
+        async with _semaphore:
+            result = await _workflow().checklist_app.ainvoke(state)
         return result.get("checklist", [])
 
-    def draft_letter(self, patient_name: str, payer: str, code: str, justification: List[str]) -> str:
+    async def stream_checklist(self, diagnosis: str, stage: str, code: str) -> AsyncIterator[Dict]:
+        """
+        Yields checklist items one by one as the model completes them.
+        """
+        record_path("checklist_stream", self.has_azure)
+        if not self.has_azure:
+            for item in self._mock_checklist(diagnosis, stage, code):
+                yield item
+            return
+
+        state = {
+            "diagnosis": diagnosis,
+            "stage": stage,
+            "code": code,
+            "streaming": True
+        }
+        emitted = False
+        if breaker.allow():
+            try:
+                async with _semaphore:
+                    # checklist_node emits each parsed item on the "custom" stream
+                    async for event in _workflow().checklist_app.astream(state, stream_mode="custom"):
+                        if "checklist_item" in event:
+                            emitted = True
+                            yield event["checklist_item"]
+                return
+            except Exception as e:
+                # Once items went out the stream can't switch sources
+                if emitted:
+                    raise
+                logger.warning("checklist_stream failed, falling back: %s: %s", type(e).__name__, e)
+        resilience_stats["fallbacks"] += 1
+        for item in self._mock_checklist(diagnosis, stage, code):
+            yield item
+
+    async def draft_letter(self, patient_name: str, payer: str, code: str, justification: List[str]) -> str:
+        record_path("letter", self.has_azure)
         if not self.has_azure:
             return self._mock_letter(patient_name, payer, code, justification)
             
@@ -48,62 +156,142 @@ class LLMClient:
             "code": code,
             "clinical_note": "\n".join(justification) # Passing justification as note for simplicity
         }
-        result = letter_app.invoke(state)
+        return await self._resilient(
+            "letter", lambda: self._run_letter(state),
+            lambda: self._mock_letter(patient_name, payer, code, justification)
+        )
+
+    async def _run_letter(self, state: Dict) -> str:
+        async with _semaphore:
+            result = await _workflow().letter_app.ainvoke(state)
         return result.get("letter_draft", "Could not draft letter.")
 
-    # --- Mock Fallbacks (kept for safety) ---
-    def _mock_explain_auth_need(self, rule: Dict, patient_data: Dict) -> str:
-        diagnosis = patient_data.get("diagnosis", "Unknown")
-        stage = patient_data.get("stage", "Unknown")
-        payer = patient_data.get("payer", "Unknown")
-        code = patient_data.get("code", "Unknown")
-        
-        if rule:
-             return f"For {code} under {payer}, prior authorization is required for {diagnosis} {stage}. This patient matches the criteria, so prior auth is required."
-        return f"No specific rule found for {code} under {payer}. Standard protocol suggests verifying with the payer directly."
+    async def stream_letter(self, patient_name: str, payer: str, code: str, justification: List[str]) -> AsyncIterator[str]:
+        """
+        Yields the letter in pieces as the model produces them.
+        """
+        record_path("letter_stream", self.has_azure)
+        if not self.has_azure:
+            for piece in self._mock_letter_pieces(patient_name, payer, code, justification):
+                yield piece
+            return
 
-    def _mock_checklist(self, diagnosis: str, stage: str, code: str) -> List[Dict]:
-        return [
-            {
-                "category": "Pathology",
-                "item": f"Biopsy report confirming {diagnosis}",
-                "mandatory": True,
-                "reason": "Required to verify diagnosis specificity."
-            },
-            {
-                "category": "Imaging",
-                "item": f"Recent CT/PET scan for {stage} confirmation",
-                "mandatory": True,
-                "reason": "Needed to establish disease progression/staging."
-            },
-            {
-                "category": "Clinical Notes",
-                "item": "Oncologist consultation notes from last 30 days",
-                "mandatory": True,
-                "reason": "To verify current clinical status and treatment plan."
+        state = {
+            "patient_name": patient_name,
+            "payer": payer,
+            "code": code,
+            "clinical_note": "\n".join(justification),
+            "streaming": True
+        }
+        hybrid = templates.HYBRID_LETTERS
+        if hybrid:
+            # The payer's template doesn't depend on the model: send its head
+            # while the justification is generated, and its tail after
+            head, tail = templates.letter_parts(patient_name, payer, code)
+            yield head
+        emitted = False
+        if breaker.allow():
+            try:
+                async with _semaphore:
+                    # "messages" mode surfaces the chat model's tokens from inside the node
+                    async for chunk, metadata in _workflow().letter_app.astream(state, stream_mode="messages"):
+                        if metadata.get("langgraph_node") == "draft" and chunk.content:
+                            emitted = True
+                            yield chunk.content
+                if hybrid:
+                    yield tail
+                return
+            except Exception as e:
+                # Once tokens went out the stream can't switch sources
+                if emitted:
+                    raise
+                logger.warning("letter_stream failed, falling back: %s: %s", type(e).__name__, e)
+        resilience_stats["fallbacks"] += 1
+        if hybrid:
+            yield templates.render_justification(justification) + tail
+            return
+        for piece in self._mock_letter_pieces(patient_name, payer, code, justification):
+            yield piece
+
+    async def full_packet(self, rule: Dict, patient_data: Dict) -> Dict:
+        """
+        Explanation, checklist and letter for one case in a single graph run.
+        Returns a dict with "reason", "checklist" and "letter_draft".
+        """
+        record_path("packet", self.has_azure)
+        justification = patient_data.get("justification_points") or []
+
+        def mock_packet():
+            return {
+                "reason": self._mock_explain_auth_need(rule, patient_data),
+                "checklist": self._mock_checklist(patient_data.get("diagnosis"), patient_data.get("stage"), patient_data.get("code")),
+                "letter_draft": self._mock_letter(patient_data.get("patient_name"), patient_data.get("payer"), patient_data.get("code"), justification),
             }
-        ]
 
-    def _mock_letter(self, patient_name: str, payer: str, code: str, justification: List[str]) -> str:
-        points = "\n- ".join(justification)
-        return f"""Date: [Current Date]
+        if not self.has_azure:
+            return mock_packet()
+
+        state = {
+            "patient_name": patient_data.get("patient_name"),
+            "payer": patient_data.get("payer"),
+            "code": patient_data.get("code"),
+            "diagnosis": patient_data.get("diagnosis"),
+            "stage": patient_data.get("stage"),
+            # The letter drafts from the justification points when given
+            "clinical_note": "\n".join(justification) or patient_data.get("clinical_note"),
+            "force_llm": patient_data.get("force_llm", False),
+        }
+        return await self._resilient("packet", lambda: self._run_packet(state), mock_packet)
 
-To: {payer} Utilization Management
-Re: Medical Necessity for {patient_name}
-Treatment Code: {code}
+    async def _run_packet(self, state: Dict) -> Dict:
+        async with _semaphore:
+            result = await _workflow().packet_app.ainvoke(state)
+        return {
+            "reason": result.get("reason", "Could not generate explanation."),
+            "checklist": result.get("checklist", []),
+            "letter_draft": result.get("letter_draft", "Could not draft letter."),
+        }
+
+    async def extract_fields(self, clinical_note: str, fields: List[str]) -> Dict[str, str]:
+        """
+        Asks the model for note fields the deterministic extractor missed.
+        Mock mode can't do better than the extractor, so it returns nothing.
+        """
+        record_path("extract", self.has_azure)
+        if not self.has_azure:
+            return {}
 
-To Whom It May Concern,
+        state = {
+            "clinical_note": clinical_note,
+            "missing_fields": fields
+        }
+        return await self._resilient("extract", lambda: self._run_extract(state, fields), dict)
 
-I am writing to provide clinical justification for the treatment of my patient, {patient_name}, with the requested therapy ({code}).
+    async def _run_extract(self, state: Dict, fields: List[str]) -> Dict[str, str]:
+        async with _semaphore:
+            result = await _workflow().extract_app.ainvoke(state)
+        return {name: result[name] for name in fields if result.get(name)}
 
-The patient has a confirmed diagnosis that requires this specific intervention. The following clinical factors support this request:
-- {points}
+    # --- Mock Fallbacks (kept for safety) ---
+    # Rendered from the shared templates in app.templates
+    def _mock_explain_auth_need(self, rule: Dict, patient_data: Dict) -> str:
+        return templates.render_explanation(
+            bool(rule),
+            patient_data.get("payer", "Unknown"),
+            patient_data.get("code", "Unknown"),
+            patient_data.get("diagnosis", "Unknown"),
+            patient_data.get("stage", "Unknown"),
+        )
 
-This treatment aligns with current NCCN guidelines and is considered the standard of care for this clinical presentation.
+    def _mock_checklist(self, diagnosis: str, stage: str, code: str) -> List[Dict]:
+        return templates.render_checklist(diagnosis, stage)
 
-Please review the attached documentation for further details.
+    def _mock_letter_pieces(self, patient_name: str, payer: str, code: str, justification: List[str]) -> List[str]:
+        words = _WORD_RE.findall(self._mock_letter(patient_name, payer, code, justification))
+        return ["".join(words[i:i + MOCK_STREAM_WORDS]) for i in range(0, len(words), MOCK_STREAM_WORDS)]
 
-Sincerely,
+    def _mock_letter(self, patient_name: str, payer: str, code: str, justification: List[str]) -> str:
+        return templates.render_letter(patient_name, payer, code, justification)
 
-[Physician Name]
-[Institution]"""
+# One client per process, shared by every router
+llm_client = LLMClient()
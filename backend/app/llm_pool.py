@@ -0,0 +1,182 @@
+import asyncio
+import os
+import threading
+from typing import TYPE_CHECKING, Awaitable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+# httpx and langchain_openai are imported on first use: this module is loaded
+# at startup (for shutdown cleanup) even when Azure is never called.
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import AzureChatOpenAI
+
+load_dotenv()
+
+# --- Pool Settings ---
+# One keep-alive connection pool per process, shared by every chat model.
+POOL_SIZE = int(os.getenv("AZURE_OPENAI_POOL_SIZE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("AZURE_OPENAI_KEEPALIVE_EXPIRY", "60"))
+CONNECT_TIMEOUT = float(os.getenv("AZURE_OPENAI_CONNECT_TIMEOUT", "5"))
+REQUEST_TIMEOUT = float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+# SDK-level retries are off by default: app.resilience retries with a deadline,
+# jitter and circuit breaking, and stacking both would multiply attempts.
+MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "0"))
+
+DEFAULT_TEMPERATURE = 0.7
+
+# Tasks that can carry their own deployment/temperature, e.g.
+# AZURE_OPENAI_LETTER_DEPLOYMENT or AZURE_OPENAI_EXPLAIN_TEMPERATURE.
+TASKS = ("explain", "checklist", "letter", "extract")
+
+# Short replies go to the small (fast, cheap) deployments, letters to the
+# large ones: AZURE_OPENAI_SMALL_DEPLOYMENTS / AZURE_OPENAI_LARGE_DEPLOYMENTS,
+# comma-separated. A task's own AZURE_OPENAI_<TASK>_DEPLOYMENTS wins.
+TASK_TIERS = {"explain": "small", "checklist": "small", "extract": "small", "letter": "large"}
+
+_lock = threading.Lock()
+_http_client: Optional["httpx.Client"] = None
+_http_async_client: Optional["httpx.AsyncClient"] = None
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_models: Dict[Tuple[str, float], "AzureChatOpenAI"] = {}
+# Closes of replaced async clients still in flight (see _close_async_client)
+_closing: Set[Awaitable] = set()
+
+
+def _limits() -> "httpx.Limits":
+    import httpx
+    return httpx.Limits(
+        max_connections=POOL_SIZE,
+        max_keepalive_connections=POOL_SIZE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> "httpx.Timeout":
+    import httpx
+    return httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+async def _aclose(client: "httpx.AsyncClient"):
+    try:
+        await client.aclose()
+    except RuntimeError:
+        # Its loop is closed, so its sockets can't be closed through it; the
+        # client still drops its connections, whose sockets are closed when
+        # they are collected
+        pass
+
+
+def _close_async_client(client: "httpx.AsyncClient", loop: Optional[asyncio.AbstractEventLoop]) -> Awaitable:
+    """
+    Closes an async client on the loop it was made on if that loop is still
+    running (in another thread), otherwise on the current one. Must be called
+    from a running loop; returns an awaitable for the close.
+    """
+    if loop is not None and loop.is_running() and loop is not _running_loop():
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(_aclose(client), loop))
+    return asyncio.get_running_loop().create_task(_aclose(client))
+
+
+def _ensure_clients():
+    """
+    Creates the shared HTTP clients on first use. The async client is bound to
+    the event loop it was created on, so a new loop (e.g. a fresh asyncio.run)
+    gets a fresh client, the old one is closed and the cached models are
+    rebuilt around the new one.
+    """
+    global _http_client, _http_async_client, _async_loop
+    import httpx
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits(), timeout=_timeout())
+    loop = _running_loop()
+    if _http_async_client is None or (loop is not None and loop is not _async_loop):
+        if _http_async_client is not None:
+            closing = _close_async_client(_http_async_client, _async_loop)
+            _closing.add(closing)
+            closing.add_done_callback(_closing.discard)
+        _http_async_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+        _async_loop = loop
+        _models.clear()
+
+
+def task_settings(task: str) -> Tuple[str, float]:
+    """
+    Resolves the (deployment, temperature) pair for a task, falling back to the
+    global AZURE_OPENAI_DEPLOYMENT_NAME and the default temperature.
+    """
+    prefix = f"AZURE_OPENAI_{task.upper()}_"
+    deployment = os.getenv(prefix + "DEPLOYMENT") or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    temperature = os.getenv(prefix + "TEMPERATURE")
+    return deployment, float(temperature) if temperature is not None else DEFAULT_TEMPERATURE
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def task_deployments(task: str) -> List[str]:
+    """
+    The deployments a task can be routed to (see app.llm_router), in order
+    of preference: AZURE_OPENAI_<TASK>_DEPLOYMENTS, then the task's tier
+    list, then its single deployment from task_settings.
+    """
+    prefix = f"AZURE_OPENAI_{task.upper()}_"
+    deployments = _split(os.getenv(prefix + "DEPLOYMENTS"))
+    if not deployments and not os.getenv(prefix + "DEPLOYMENT") and task in TASK_TIERS:
+        deployments = _split(os.getenv(f"AZURE_OPENAI_{TASK_TIERS[task].upper()}_DEPLOYMENTS"))
+    return deployments or [task_settings(task)[0]]
+
+
+def get_chat_model(task: str, deployment: Optional[str] = None) -> "AzureChatOpenAI":
+    """
+    Returns the shared chat model for a task (on `deployment` if given).
+    Models are cached per (deployment, temperature) and all reuse the same
+    pooled HTTP clients.
+    """
+    default_deployment, temperature = task_settings(task)
+    deployment = deployment or default_deployment
+    key = (deployment, temperature)
+    with _lock:
+        _ensure_clients()
+        llm = _models.get(key)
+        if llm is None:
+            from langchain_openai import AzureChatOpenAI
+            llm = AzureChatOpenAI(
+                azure_deployment=deployment,
+                openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                temperature=temperature,
+                timeout=_timeout(),
+                max_retries=MAX_RETRIES,
+                # Streamed replies end with a usage chunk, so streamed calls
+                # (e.g. the checklist) are counted in llm_tokens too
+                stream_usage=True,
+                http_client=_http_client,
+                http_async_client=_http_async_client,
+            )
+            _models[key] = llm
+        return llm
+
+
+async def aclose_pool():
+    """
+    Closes the shared HTTP clients. Called on application shutdown.
+    """
+    global _http_client, _http_async_client, _async_loop
+    with _lock:
+        sync_client, async_client, loop = _http_client, _http_async_client, _async_loop
+        _http_client = _http_async_client = _async_loop = None
+        _models.clear()
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None:
+        await _close_async_client(async_client, loop)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from app.llm_pool import get_chat_model, task_deployments
+from app.resilience import is_retryable, retry_after
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# --- Settings ---
+# Weight of the newest latency in a deployment's moving average
+ROUTER_EWMA_ALPHA = float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+# A throttled (429) deployment gets no traffic for its Retry-After, or this long
+ROUTER_COOLDOWN = float(os.getenv("LLM_ROUTER_COOLDOWN", "10"))
+# Added to the moving average on other failures, so a deployment that fails
+# fast doesn't look fast
+ROUTER_ERROR_PENALTY = float(os.getenv("LLM_ROUTER_ERROR_PENALTY", "5"))
+
+# Hedging: a call still running after the task's recent p95 latency is
+# duplicated on another deployment and the first reply wins. Needs
+# HEDGE_MIN_SAMPLES latencies for the task, and at most HEDGE_MAX_RATIO of
+# recent calls are hedged so a provider-wide slowdown isn't doubled.
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1") != "0"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.25"))
+HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+LATENCY_WINDOW = 200
+
+# Counts "calls", "hedges", "hedge_wins", "failovers" and "cooldowns"
+router_stats = Counter()
+
+class DeploymentRouter:
+    """
+    Spreads each task's model calls over its deployments (see
+    app.llm_pool.task_deployments). Picks the deployment with the lowest
+    latency moving average scaled by its calls in flight, skips deployments
+    cooling down after a 429, fails over immediately when a call fails with
+    a retryable error, and hedges calls slower than the task's p95.
+    """
+
+    def __init__(self, model_factory: Callable[[str, str], Any] = get_chat_model,
+                 deployments: Callable[[str], Sequence[str]] = task_deployments, hedge: bool = HEDGE_ENABLED):
+        self.model_factory = model_factory
+        self.deployments = deployments
+        self.hedge = hedge
+        # Latency averages are per (task, deployment): a letter and an
+        # explanation on the same deployment take very different times
+        self._ewma: Dict[Tuple[str, str], float] = {}
+        self._in_flight: Counter = Counter()
+        self._cooldown_until: Dict[str, float] = {}
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._hedged: Dict[str, Deque[bool]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+    # --- Selection ---
+    def pick(self, task: str, candidates: Sequence[str], exclude: Sequence[str] = ()) -> Optional[str]:
+        """
+        The best deployment not in `exclude` and not cooling down, or None.
+        Deployments without a latency yet score 0, so each gets tried.
+        """
+        now = time.monotonic()
+        available = [d for d in candidates if d not in exclude and self._cooldown_until.get(d, 0) <= now]
+        if not available:
+            return None
+        return min(available, key=lambda d: self._ewma.get((task, d), 0.0) * (1 + self._in_flight[d]))
+
+    def _soonest(self, candidates: Sequence[str]) -> str:
+        # Everything is throttled: use whichever comes back first
+        return min(candidates, key=lambda d: self._cooldown_until.get(d, 0))
+
+    def hedge_delay(self, task: str) -> Optional[float]:
+        """
+        Seconds to wait before hedging a call for `task`, or None if it
+        shouldn't be hedged (not enough samples, or the hedge budget is spent).
+        """
+        latencies = self._latencies[task]
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        hedged = self._hedged[task]
+        if hedged and sum(hedged) >= HEDGE_MAX_RATIO * len(hedged):
+            return None
+        ordered = sorted(latencies)
+        return max(ordered[int(HEDGE_PERCENTILE * (len(ordered) - 1))], HEDGE_MIN_DELAY)
+
+    # --- Feedback ---
+    def record(self, task: str, deployment: str, latency: float, error: Optional[BaseException] = None):
+        key = (task, deployment)
+        if error is None:
+            self._latencies[task].append(latency)
+        elif getattr(error, "status_code", None) == 429:
+            cooldown = retry_after(error) or ROUTER_COOLDOWN
+            self._cooldown_until[deployment] = time.monotonic() + cooldown
+            router_stats["cooldowns"] += 1
+            logger.info("Deployment %s throttled: cooling down for %.1fs", deployment, cooldown)
+            return
+        else:
+            latency += ROUTER_ERROR_PENALTY
+        previous = self._ewma.get(key)
+        self._ewma[key] = latency if previous is None else previous + ROUTER_EWMA_ALPHA * (latency - previous)
+
+    # --- Calls ---
+    async def call(self, task: str, call: Callable[[Any], Awaitable[T]], hedge: bool = True,
+                   failover: bool = True) -> T:
+        """
+        Runs `call(model)` on the best deployment for `task`. Pass
+        hedge=False for calls with side effects (e.g. streaming to a client),
+        which must not run twice at once, and failover=False for calls that
+        can't be restarted once they produced output (a second deployment
+        would replay the reply after the first one's partial output).
+        """
+        candidates = list(self.deployments(task))
+        running: Dict[asyncio.Future, Tuple[str, float]] = {}
+        tried: List[str] = []
+
+        def launch(deployment: str):
+            self._in_flight[deployment] += 1
+            tried.append(deployment)
+            running[asyncio.ensure_future(call(self.model_factory(task, deployment)))] = (deployment, time.monotonic())
+
+        router_stats["calls"] += 1
+        launch(self.pick(task, candidates) or self._soonest(candidates))
+        may_hedge = hedge and self.hedge and len(candidates) > 1
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while running:
+                timeout = None
+                if may_hedge and not hedged:
+                    delay = self.hedge_delay(task)
+                    if delay is not None:
+                        started = min(start for _, start in running.values())
+                        timeout = max(0.0, started + delay - time.monotonic())
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than the task's p95: race it on another deployment
+                    alternative = self.pick(task, candidates, tried)
+                    if alternative is None:
+                        may_hedge = False
+                    else:
+                        hedged = True
+                        router_stats["hedges"] += 1
+                        launch(alternative)
+                    continue
+                for finished in done:
+                    deployment, start = running.pop(finished)
+                    self._in_flight[deployment] -= 1
+                    error = finished.exception()
+                    self.record(task, deployment, time.monotonic() - start, error)
+                    if error is None:
+                        if hedged and deployment != tried[0]:
+                            router_stats["hedge_wins"] += 1
+                        return finished.result()
+                if not running and failover and is_retryable(error):
+                    alternative = self.pick(task, candidates, tried)
+                    if alternative is not None:
+                        router_stats["failovers"] += 1
+                        logger.info("Failing over from %s to %s after %s", tried[-1], alternative, type(error).__name__)
+                        launch(alternative)
+            raise error
+        finally:
+            self._hedged[task].append(hedged)
+            for pending, (deployment, _) in running.items():
+                # The losing hedge (or everything, if we were cancelled)
+                self._in_flight[deployment] -= 1
+                if pending.done():
+                    if not pending.cancelled():
+                        pending.exception()
+                else:
+                    pending.cancel()
+
+llm_router = DeploymentRouter()
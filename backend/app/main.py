@@ -1,26 +1,80 @@
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth_check, checklist, letter
-
-app = FastAPI(
-    title="Mini-RISA PA API",
-    description="Prior Authorization Automation API",
-    version="0.1.0"
-)
-
-# Allow CORS for frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.include_router(auth_check.router)
-app.include_router(checklist.router)
-app.include_router(letter.router)
-
-@app.get("/")
-async def root():
-    return {"message": "Mini-RISA PA API is running"}
+from app.llm_pool import aclose_pool
+from app.metrics import instrument_app, http_in_flight
+from app.rules_engine import RuleStore
+from app.routers import auth_check, checklist, jobs, letter, packet
+
+VERSION = "0.2.0"
+
+def create_app(watch_rules: bool = True, run_jobs: bool = True) -> FastAPI:
+    """
+    Builds the API. Both deployments use it: the long-running server
+    (`app.main:app`) and the serverless entry point (`api/index.py`), which
+    passes watch_rules=False and run_jobs=False since it has no process to
+    keep a watcher or job workers in (so it doesn't offer /jobs either).
+    """
+    started_at = time.time()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Pick up edits to the rules file without a restart
+        rule_store = RuleStore() if watch_rules else None
+        if rule_store is not None:
+            rule_store.start()
+        # Background workers for /jobs submissions
+        if run_jobs:
+            await jobs.workers.start()
+        yield
+        if run_jobs:
+            await jobs.workers.stop()
+        if rule_store is not None:
+            rule_store.stop()
+        # Release the pooled Azure connections
+        await aclose_pool()
+
+    app = FastAPI(
+        title="Mini-RISA PA API",
+        description="Prior Authorization Automation API",
+        version=VERSION,
+        lifespan=lifespan
+    )
+
+    # Allow CORS for frontend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Latency/in-flight metrics, Server-Timing headers and /metrics
+    instrument_app(app)
+
+    app.include_router(auth_check.router)
+    app.include_router(checklist.router)
+    app.include_router(letter.router)
+    app.include_router(packet.router)
+    if run_jobs:
+        app.include_router(jobs.router)
+
+    @app.get("/")
+    async def root():
+        return {"message": "Mini-RISA PA API is running", "status": "ok", "version": VERSION}
+
+    @app.get("/health")
+    async def health():
+        return {
+            "status": "healthy",
+            "service": "mini-risa-pa",
+            "uptime_seconds": round(time.time() - started_at, 1),
+            # Includes this health check itself
+            "in_flight": http_in_flight.value()
+        }
+
+    return app
+
+app = create_app()
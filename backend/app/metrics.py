@@ -0,0 +1,262 @@
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Instrumentation is decided once at import: when disabled, decorators return
+# the original function and no middleware is installed, so there is no cost.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+# --- Metric Types ---
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, value: float = 1, **labels: str):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_labels(labels), 0)
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for key, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, value: float = 1, **labels: str):
+        self.inc(-value, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _labels(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for key, row in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(key)} {row[-1]}"
+            yield f"{self.name}_count{_format_labels(key)} {cumulative}"
+
+REGISTRY: List[_Metric] = []
+
+# --- Metrics ---
+http_latency = Histogram("risa_http_request_duration_seconds", "HTTP request latency by route.")
+http_in_flight = Gauge("risa_http_requests_in_flight", "HTTP requests currently being served.")
+node_latency = Histogram("risa_graph_node_duration_seconds", "Graph node latency.")
+llm_tokens = Counter("risa_llm_tokens_total", "Model tokens by task and direction (input/output).")
+llm_path = Counter("risa_llm_calls_total", "LLMClient calls by operation and path (azure/mock).")
+prompt_tokens_saved = Counter("risa_prompt_tokens_saved_total", "Prompt tokens removed by compaction, by task.")
+
+# Counters kept by other modules, exported at scrape time: (metric, help, module, attribute)
+_EXTERNAL_COUNTERS = (
+    ("risa_auth_routing_total", "Auth checks by route (short_circuit/llm).", "app.agent_workflow", "routing_stats"),
+    ("risa_response_cache_total", "Response cache lookups by outcome.", "app.cache", "response_cache.stats"),
+    ("risa_checklist_parse_total", "Checklist reply parses by outcome.", "app.structured_output", "parse_stats"),
+    ("risa_llm_resilience_total", "Model call retries, timeouts, breaker trips/recoveries and fallbacks.", "app.resilience", "resilience_stats"),
+    ("risa_llm_router_total", "Deployment router calls, hedges, hedge wins, failovers and 429 cooldowns.", "app.llm_router", "router_stats"),
+    ("risa_prefetch_total", "Speculative checklist/letter prefetches by outcome.", "app.prefetch", "prefetcher.stats"),
+    ("risa_idempotency_total", "Idempotency-Key requests stored, replayed or waited on the original.", "app.idempotency", "idempotency_store.stats"),
+)
+
+def _render_external() -> Iterable[str]:
+    for name, help, module_name, attribute in _EXTERNAL_COUNTERS:
+        # Only report modules that are already loaded; scraping must not
+        # trigger heavy imports (see app.agent_workflow)
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        counts = functools.reduce(getattr, attribute.split("."), module)
+        yield f"# HELP {name} {help}"
+        yield f"# TYPE {name} counter"
+        for outcome, value in list(counts.items()):
+            yield f'{name}{{outcome="{outcome}"}} {value}'
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_external())
+    return "\n".join(lines) + "\n"
+
+# --- Instrumentation ---
+# Per-request node timings, surfaced in the Server-Timing header
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("risa_timings", default=None)
+# Per-request prompt tokens saved, surfaced in the X-Prompt-Tokens-Saved header
+_tokens_saved: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("risa_tokens_saved", default=None)
+
+def _record_node(name: str, seconds: float):
+    node_latency.observe(seconds, node=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+def timed_node(name: str) -> Callable:
+    """
+    Decorator recording a graph node's latency. Works for sync and async
+    nodes; a no-op when metrics are disabled.
+    """
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _record_node(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record_node(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def record_usage(task: str, message):
+    """
+    Adds a model reply's token usage (if the provider reported it).
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if METRICS_ENABLED and usage:
+        llm_tokens.inc(usage.get("input_tokens", 0), task=task, direction="input")
+        llm_tokens.inc(usage.get("output_tokens", 0), task=task, direction="output")
+
+def record_tokens_saved(task: str, saved: int):
+    if METRICS_ENABLED:
+        prompt_tokens_saved.inc(saved, task=task)
+        per_request = _tokens_saved.get()
+        if per_request is not None:
+            per_request.append(saved)
+
+def record_path(operation: str, azure: bool):
+    if METRICS_ENABLED:
+        llm_path.inc(operation=operation, path="azure" if azure else "mock")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware tracking in-flight requests and per-route latency, and
+    adding a Server-Timing header with the total and per-node durations (plus
+    X-Prompt-Tokens-Saved when prompts were compacted).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        saved: List[int] = []
+        token = _timings.set(timings)
+        saved_token = _tokens_saved.set(saved)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+                parts.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(parts).encode()))
+                if saved:
+                    headers.append((b"x-prompt-tokens-saved", str(sum(saved)).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            _timings.reset(token)
+            _tokens_saved.reset(saved_token)
+            route = scope.get("route")
+            http_latency.observe(
+                time.perf_counter() - start,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=str(status["code"]),
+            )
+
+def instrument_app(app):
+    """
+    Installs the middleware and a Prometheus text-format /metrics endpoint.
+    """
+    if not METRICS_ENABLED:
+        return
+    from fastapi.responses import PlainTextResponse
+
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
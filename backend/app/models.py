@@ -1,23 +1,45 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class CheckAuthRequest(BaseModel):
     payer: str
-    code: str
-    diagnosis: str
-    stage: str
+    # code/diagnosis/stage may be omitted when clinical_note contains them
+    code: Optional[str] = None
+    diagnosis: Optional[str] = None
+    stage: Optional[str] = None
     clinical_note: Optional[str] = None
+    # Always ask the model for the explanation, even for rule-decided cases
+    force_llm: bool = False
+    # If auth is needed, start the checklist (and, given patient_name and
+    # justification_points, the letter) in the background; see app.prefetch
+    prefetch: bool = False
+    patient_name: Optional[str] = None
+    justification_points: Optional[List[str]] = None
 
 class CheckAuthResponse(BaseModel):
     auth_needed: bool
     reason: str
     rule_id: Optional[str] = None
+    # Pass to /generate_checklist and /draft_letter to pick up prefetched results
+    case_token: Optional[str] = None
+
+class CheckAuthBatchRequest(BaseModel):
+    items: List[CheckAuthRequest]
+    # Cap on explanations generated at once for this batch
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+class CheckAuthBatchResult(BaseModel):
+    # Position of the item in the request; results arrive in completion order
+    index: int
+    result: Optional[CheckAuthResponse] = None
+    error: Optional[str] = None
 
 class ChecklistRequest(BaseModel):
     diagnosis: str
     stage: str
     clinical_note: Optional[str] = None
     code: str
+    case_token: Optional[str] = None
 
 class ChecklistItem(BaseModel):
     category: str
@@ -34,6 +56,36 @@ class DraftLetterRequest(BaseModel):
     code: str
     clinical_note: Optional[str] = None
     justification_points: List[str]
+    case_token: Optional[str] = None
 
 class DraftLetterResponse(BaseModel):
     letter_content: str
+
+class PacketRequest(BaseModel):
+    patient_name: str
+    payer: str
+    code: str
+    diagnosis: str
+    stage: str
+    clinical_note: Optional[str] = None
+    justification_points: List[str] = []
+    force_llm: bool = False
+
+class PacketResponse(BaseModel):
+    auth: CheckAuthResponse
+    checklist: List[ChecklistItem]
+    letter_content: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    # "draft_letter" or "generate_checklist"
+    kind: str
+    # queued -> running -> done | failed
+    status: str
+    priority: int
+    # The synchronous endpoint's response body, once done
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
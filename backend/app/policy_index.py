@@ -0,0 +1,293 @@
+"""
+In-process vector index over payer policy text, used when a request has no
+exact (payer, code) rule.
+
+    python -m app.policy_index build [--rules data/rules.jsonl] [--out data/policy_index]
+
+Policies are embedded with the hashing trick (word unigrams and bigrams,
+IDF-weighted, L2-normalized), so no model or external service is involved.
+Vectors are written as a .npy file and memory-mapped on load.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: retrieval is disabled without NumPy
+    np = None
+
+from app.extractor import DRUG_CODES, extract_fields
+from app.rules_engine import RuleIndex, get_index, load_rules, normalize_stage, rules_fingerprint, RULES_PATH
+
+logger = logging.getLogger(__name__)
+
+# --- Settings ---
+POLICY_INDEX_PATH = os.getenv(
+    "POLICY_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "policy_index")
+)
+EMBEDDING_DIM = int(os.getenv("POLICY_EMBEDDING_DIM", "256"))
+POLICY_TOP_K = int(os.getenv("POLICY_TOP_K", "3"))
+POLICY_MIN_SCORE = float(os.getenv("POLICY_MIN_SCORE", "0.15"))
+BUILD_BATCH_SIZE = 4096
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CODE_TO_DRUG = {code: drug for drug, code in DRUG_CODES.items()}
+
+# --- Text ---
+def _context(payer: Optional[str], code: Optional[str], diagnosis: Optional[str], stage: Optional[str]) -> List[str]:
+    code = (code or "").strip().upper()
+    # Synonyms ("NSCLC") also contribute their canonical diagnosis name
+    canonical = extract_fields(diagnosis).diagnosis if diagnosis else None
+    return [payer or "", code, _CODE_TO_DRUG.get(code, ""), diagnosis or "", canonical or "",
+            normalize_stage(stage) or stage or ""]
+
+def policy_text(rule: Dict) -> str:
+    """
+    Searchable text for a rule: its payer, code, drug, conditions, outcome
+    and free-text policy (the optional "policy" field).
+    """
+    conditions = rule.get("conditions") or {}
+    keywords = "; ".join(conditions.get("diagnosis_keywords") or [])
+    parts = _context(rule.get("payer"), rule.get("code"), keywords, None)
+    parts += conditions.get("stages") or []
+    parts.append("requires prior authorization" if rule.get("requires_auth") else "exempt from prior authorization")
+    parts.append(rule.get("policy") or "")
+    return " ".join(p for p in parts if p)
+
+def query_text(payer: Optional[str], code: Optional[str], diagnosis: Optional[str], stage: Optional[str]) -> str:
+    return " ".join(p for p in _context(payer, code, diagnosis, stage) if p)
+
+# --- Embedding ---
+@lru_cache(maxsize=65536)
+def _bucket(feature: str) -> Tuple[int, float]:
+    # crc32 is stable across processes, unlike hash(); the top bit picks the sign
+    h = zlib.crc32(feature.encode())
+    return h % EMBEDDING_DIM, (1.0 if h >> 31 else -1.0)
+
+def _features(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+def _hashed(texts: Sequence[str]) -> "np.ndarray":
+    """
+    Raw signed term counts for a batch of texts, shape (len(texts), dim).
+    """
+    rows, cols, signs = [], [], []
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            col, sign = _bucket(feature)
+            rows.append(row)
+            cols.append(col)
+            signs.append(sign)
+    matrix = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), np.asarray(signs, dtype=np.float32))
+    return matrix
+
+def _normalize(matrix: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def fingerprint(texts: Iterable[str]) -> str:
+    digest = hashlib.sha256(str(EMBEDDING_DIM).encode())
+    for text in texts:
+        digest.update(text.encode() + b"\0")
+    return digest.hexdigest()
+
+# --- Index ---
+class PolicyIndex:
+    """
+    Row-normalized policy vectors (possibly a read-only memmap) with the rule
+    id of each row and the IDF weights used to embed queries. `source` is the
+    fingerprint of the rules it was built from (app.rules_engine.rules_fingerprint).
+    """
+
+    def __init__(self, vectors: "np.ndarray", idf: "np.ndarray", ids: List[str], fingerprint: str,
+                 source: Optional[str] = None):
+        self.vectors = vectors
+        self.idf = idf
+        self.ids = ids
+        self.fingerprint = fingerprint
+        self.source = source
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, rules: Sequence[Dict], path: Optional[str] = None,
+              batch_size: int = BUILD_BATCH_SIZE, source: Optional[str] = None) -> "PolicyIndex":
+        """
+        Embeds rules in batches. With `path`, vectors are written straight
+        into a .npy memmap there, so memory stays bounded by the batch size.
+        Pass the rules' fingerprint as `source` when it is already known.
+        """
+        texts = [policy_text(rule) for rule in rules]
+        ids = [rule["id"] for rule in rules]
+
+        # Pass 1: document frequency per hash bucket
+        df = np.zeros(EMBEDDING_DIM, dtype=np.float64)
+        for start in range(0, len(texts), batch_size):
+            df += (_hashed(texts[start:start + batch_size]) != 0).sum(axis=0)
+        idf = (np.log((len(texts) + 1) / (df + 1)) + 1).astype(np.float32)
+
+        # Pass 2: weighted, normalized vectors
+        shape = (len(texts), EMBEDDING_DIM)
+        if path:
+            os.makedirs(path, exist_ok=True)
+            vectors = np.lib.format.open_memmap(os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float32, shape=shape)
+        else:
+            vectors = np.empty(shape, dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            vectors[start:start + len(batch)] = _normalize(_hashed(batch) * idf)
+
+        index = cls(vectors, idf, ids, fingerprint(texts), source or rules_fingerprint(rules))
+        if path:
+            vectors.flush()
+            np.save(os.path.join(path, "idf.npy"), idf)
+            with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"ids": ids, "fingerprint": index.fingerprint, "rules": index.source,
+                           "dim": EMBEDDING_DIM}, f)
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> "PolicyIndex":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["dim"] != EMBEDDING_DIM:
+            raise ValueError(f"Index at {path} has dim {meta['dim']}, expected {EMBEDDING_DIM}")
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        idf = np.load(os.path.join(path, "idf.npy"))
+        return cls(vectors, idf, meta["ids"], meta["fingerprint"], meta.get("rules"))
+
+    def search(self, query: str, k: int = POLICY_TOP_K) -> List[Tuple[str, float]]:
+        """
+        Returns up to k (rule id, cosine score) pairs, best first.
+        """
+        if not self.ids or k <= 0:
+            return []
+        q = _normalize(_hashed([query]) * self.idf)[0]
+        scores = self.vectors @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+# --- Active Index ---
+# Rebuilt (or re-loaded from POLICY_INDEX_PATH when its fingerprint matches)
+# whenever the rules engine swaps in a new rule index. The rebuild runs on a
+# background thread and the previous index keeps serving until it is ready,
+# so a rule reload never stalls requests; only the first use in a process,
+# with nothing to serve yet, builds in the caller.
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_active: Tuple[Optional[RuleIndex], Optional[PolicyIndex]] = (None, None)
+# The rule index a background rebuild is running for
+_building: Optional[RuleIndex] = None
+
+def _build(rule_index: RuleIndex) -> Optional[PolicyIndex]:
+    global _active, _building
+    with _build_lock:
+        if _active[0] is rule_index:
+            return _active[1]
+        try:
+            # A mapped rule index answers fingerprint() from its header, so
+            # the rules are only read when the index has to be built
+            policy_index = saved_index(rule_index)
+            if policy_index is None:
+                policy_index = PolicyIndex.build(rule_index.rules(), source=rule_index.fingerprint())
+        except Exception:
+            logger.exception("Policy index rebuild failed; keeping the previous index")
+            policy_index = None
+        with _lock:
+            if _building is rule_index:
+                _building = None
+            # Skip if a newer rule index was swapped in and built meanwhile
+            if policy_index is not None and _active[0] is not get_index():
+                _active = (rule_index, policy_index)
+        return policy_index
+
+def get_policy_index() -> Optional[PolicyIndex]:
+    global _building
+    if np is None:
+        return None
+    rule_index = get_index()
+    with _lock:
+        active_rules, policy_index = _active
+        if active_rules is rule_index:
+            return policy_index
+        if policy_index is not None:
+            if _building is not rule_index:
+                _building = rule_index
+                threading.Thread(target=_build, args=(rule_index,), name="policy-index", daemon=True).start()
+            return policy_index
+    return _build(rule_index)
+
+def saved_index(rule_index: RuleIndex, path: str = POLICY_INDEX_PATH) -> Optional[PolicyIndex]:
+    """
+    The index saved at `path` if it was built from exactly the rules in
+    `rule_index`, compared by fingerprint.
+    """
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    try:
+        saved = PolicyIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return saved if saved.source == rule_index.fingerprint() else None
+
+def retrieve_policies(payer: Optional[str], code: Optional[str], diagnosis: Optional[str],
+                      stage: Optional[str], k: int = POLICY_TOP_K) -> List[Tuple[Dict, float]]:
+    """
+    The k rules whose policy text is closest to the request, as
+    (rule, score) pairs scoring at least POLICY_MIN_SCORE. Empty when NumPy
+    is not installed.
+    """
+    policy_index = get_policy_index()
+    if policy_index is None:
+        return []
+    rule_index = get_index()
+    results = []
+    for rule_id, score in policy_index.search(query_text(payer, code, diagnosis, stage), k):
+        rule = rule_index.get(rule_id)
+        if score >= POLICY_MIN_SCORE and rule is not None:
+            results.append((rule, score))
+    return results
+
+def describe_policy(rule: Dict) -> str:
+    conditions = rule.get("conditions") or {}
+    outcome = "requires prior auth" if rule.get("requires_auth") else "no prior auth required"
+    details = [outcome]
+    if conditions.get("diagnosis_keywords"):
+        details.append("diagnosis: " + ", ".join(conditions["diagnosis_keywords"]))
+    if conditions.get("stages"):
+        details.append("stages: " + ", ".join(conditions["stages"]))
+    text = f"{rule['id']} ({rule['payer']}, {rule['code']}): " + "; ".join(details)
+    if rule.get("policy"):
+        text += f". {rule['policy']}"
+    return text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Embed the rules file and save the index")
+    build.add_argument("--rules", default=RULES_PATH)
+    build.add_argument("--out", default=POLICY_INDEX_PATH)
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("NumPy is required to build the policy index")
+    rules = list({rule["id"]: rule for rule in load_rules(args.rules)}.values())
+    index = PolicyIndex.build(rules, args.out, source=rules_fingerprint(rules))
+    print(f"Indexed {len(index)} policies into {args.out}")
+
+if __name__ == "__main__":
+    main()
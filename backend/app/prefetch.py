@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.cache import make_key
+
+logger = logging.getLogger(__name__)
+
+# --- Settings ---
+# After an auth check that needs auth, the checklist and letter for the case
+# are generated in the background so the follow-up calls find them ready.
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") != "0"
+# Results (or running generations) not claimed within this many seconds are dropped
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "300"))
+# Cases held at once; the oldest is dropped (and cancelled) beyond this
+PREFETCH_MAX_CASES = int(os.getenv("PREFETCH_MAX_CASES", "256"))
+# Background generations running at once; a case past this isn't prefetched,
+# so speculation never crowds out requests someone is waiting for
+PREFETCH_MAX_RUNNING = int(os.getenv("PREFETCH_MAX_RUNNING", "8"))
+
+Compute = Callable[[], Awaitable[Any]]
+
+# --- Input Keys ---
+# A follow-up only attaches to a prefetch computed from the same inputs
+def checklist_inputs(diagnosis: str, stage: str, code: str) -> str:
+    return make_key("checklist", diagnosis=diagnosis, stage=stage, code=code)
+
+def letter_inputs(patient_name: str, payer: str, code: str, justification_points: List[str]) -> str:
+    return make_key("letter", patient_name=patient_name, payer=payer, code=code,
+                    justification="\n".join(justification_points))
+
+@dataclass
+class _Case:
+    expires: float
+    # kind -> (input key, generation)
+    tasks: Dict[str, Tuple[str, asyncio.Task]] = field(default_factory=dict)
+
+class PrefetchManager:
+    """
+    Speculative generations keyed by case token. `start` launches them in
+    the background and returns the token; `attach` hands a follow-up request
+    the running or finished result when its inputs match, and computes
+    normally otherwise (unknown or expired token, different inputs, or a
+    failed prefetch).
+    """
+
+    def __init__(self, ttl: float = PREFETCH_TTL, max_cases: int = PREFETCH_MAX_CASES,
+                 max_running: int = PREFETCH_MAX_RUNNING):
+        self.ttl = ttl
+        self.max_cases = max_cases
+        self.max_running = max_running
+        # "started", "skipped", "hits", "misses", "mismatched", "cancelled" and "expired"
+        self.stats = Counter()
+        self._cases: "OrderedDict[str, _Case]" = OrderedDict()
+
+    def _running(self) -> int:
+        return sum(not task.done() for case in self._cases.values() for _, task in case.tasks.values())
+
+    def _drop(self, token: str, reason: str):
+        case = self._cases.pop(token, None)
+        if case is None:
+            return
+        for _, task in case.tasks.values():
+            if not task.done():
+                task.cancel()
+                self.stats[reason] += 1
+
+    def _purge(self):
+        now = time.monotonic()
+        for token in [token for token, case in self._cases.items() if case.expires <= now]:
+            self._drop(token, "expired")
+
+    def start(self, jobs: Dict[str, Tuple[str, Compute]]) -> Optional[str]:
+        """
+        Launches `jobs` ({kind: (input key, compute)}) in the background and
+        returns their case token, or None if prefetching is at capacity.
+        """
+        self._purge()
+        if not jobs or self._running() + len(jobs) > self.max_running:
+            self.stats["skipped"] += 1
+            return None
+        while len(self._cases) >= self.max_cases:
+            self._drop(next(iter(self._cases)), "expired")
+
+        token = uuid.uuid4().hex
+        case = _Case(expires=time.monotonic() + self.ttl)
+        for kind, (inputs, compute) in jobs.items():
+            task = asyncio.create_task(compute())
+            # A failed prefetch is recomputed by the follow-up; don't log it as unhandled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            case.tasks[kind] = (inputs, task)
+        self._cases[token] = case
+        self.stats["started"] += 1
+        return token
+
+    async def attach(self, token: Optional[str], kind: str, inputs: str, compute: Compute) -> Any:
+        """
+        The prefetched `kind` result for `token` if it was computed from the
+        same `inputs`, else `compute()`.
+        """
+        if not token:
+            return await compute()
+        self._purge()
+        case = self._cases.get(token)
+        entry = case.tasks.get(kind) if case else None
+        if entry is None:
+            self.stats["misses"] += 1
+            return await compute()
+        prefetched_inputs, task = entry
+        if prefetched_inputs != inputs:
+            self.stats["mismatched"] += 1
+            return await compute()
+        try:
+            # Shielded: a client that disconnects doesn't cancel the shared result
+            value = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            value = None
+        except Exception as e:
+            logger.warning("Prefetched %s failed, computing again: %s: %s", kind, type(e).__name__, e)
+            value = None
+        if value is None:
+            self.stats["misses"] += 1
+            return await compute()
+        self.stats["hits"] += 1
+        return value
+
+    def cancel(self, token: str) -> bool:
+        """
+        Drops a case (e.g. the user closed it), cancelling what is still running.
+        """
+        found = token in self._cases
+        self._drop(token, "cancelled")
+        return found
+
+prefetcher = PrefetchManager()
@@ -0,0 +1,126 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from app.extractor import extract_fields
+
+# --- Settings ---
+# Token budget for free text (clinical note / justification points) in a prompt
+NOTE_TOKEN_BUDGET = int(os.getenv("PROMPT_NOTE_TOKEN_BUDGET", "400"))
+# tiktoken encoding used for counting; "heuristic" skips tiktoken entirely
+TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "o200k_base")
+
+# Roughly one BPE token per 5 word characters or punctuation mark
+_APPROX_TOKEN_RE = re.compile(r"\w{1,5}|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.;!?])\s+")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+_FOLD_RE = re.compile(r"[\W_]+")
+
+# Findings that make a line worth keeping beyond the fields the extractor knows
+_SALIENT_RE = re.compile(
+    r"\b(?:progress\w*|metasta\w*|recurr\w*|biops\w*|patholog\w*|histolog\w*|ct|pet|mri|imaging|"
+    r"egfr|alk|ros1|kras|braf|her2|pd-?l1|mutation\w*|tmb|msi|"
+    r"fail\w*|intoleran\w*|contraindicat\w*|refractory|line|prior|guideline\w*|nccn)\b"
+    r"|\d+(?:\.\d+)?\s*(?:%|mg|cm|mm)",
+    re.IGNORECASE,
+)
+
+# --- Token Counting ---
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if TOKEN_ENCODING != "heuristic":
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception:
+                # Not installed, or the encoding file can't be fetched offline
+                pass
+    return _encoding or None
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Counts tokens locally: exact with tiktoken when its encoding is available,
+    otherwise a close approximation.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_APPROX_TOKEN_RE.findall(text))
+
+# --- Compaction ---
+@dataclass
+class CompactedText:
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+def salience(unit: str) -> int:
+    fields = extract_fields(unit)
+    found = sum(1 for value in (fields.diagnosis, fields.stage, fields.code, fields.ecog) if value)
+    return 2 * found + len(_SALIENT_RE.findall(unit))
+
+def _units(text: str) -> List[Tuple[int, str]]:
+    """
+    Splits text into (line number, sentence) units, dropping bullets and
+    repeats (compared case-, whitespace- and punctuation-insensitively).
+    """
+    units, seen = [], set()
+    for line_no, line in enumerate(text.splitlines()):
+        line = _BULLET_RE.sub("", line).strip()
+        for sentence in _SENTENCE_RE.split(line):
+            folded = _FOLD_RE.sub(" ", sentence).strip().lower()
+            if folded and folded not in seen:
+                seen.add(folded)
+                units.append((line_no, sentence))
+    return units
+
+def _join(units: List[Tuple[int, str]]) -> str:
+    lines: List[str] = []
+    last_line = None
+    for line_no, sentence in units:
+        if line_no == last_line:
+            lines[-1] += " " + sentence
+        else:
+            lines.append(sentence)
+        last_line = line_no
+    return "\n".join(lines)
+
+def compact_text(text: Optional[str], budget: int = NOTE_TOKEN_BUDGET) -> CompactedText:
+    """
+    Deduplicates `text` and, if it is still over `budget` tokens, keeps the
+    most clinically salient sentences (diagnosis, stage, codes, ECOG, prior
+    lines, biomarkers...) that fit, in their original order.
+    """
+    text = text or ""
+    before = count_tokens(text)
+    units = _units(text)
+    deduped = _join(units)
+    if count_tokens(deduped) <= budget:
+        return CompactedText(deduped, before, count_tokens(deduped))
+
+    ranked = sorted(range(len(units)), key=lambda i: (-salience(units[i][1]), i))
+    kept, used = [], 0
+    for i in ranked:
+        cost = count_tokens(units[i][1]) + 1
+        if used + cost <= budget:
+            kept.append(i)
+            used += cost
+    if not kept:
+        # A single sentence longer than the whole budget: cut it at word level
+        words = units[ranked[0]][1].split()
+        while words and count_tokens(" ".join(words)) > budget:
+            words = words[:max(1, len(words) * 3 // 4)] if len(words) > 1 else []
+        units, kept = [(0, " ".join(words))], [0]
+    compacted = _join([units[i] for i in sorted(kept)])
+    return CompactedText(compacted, before, count_tokens(compacted))
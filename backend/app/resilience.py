@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# --- Settings ---
+# Per-attempt timeout and overall deadline (retries included) for a model call
+ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30"))
+CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+# Circuit breaker: trips when, over the last BREAKER_WINDOW calls (at least
+# BREAKER_MIN_CALLS), the failure rate or the rate of calls slower than
+# BREAKER_SLOW_CALL seconds reaches its threshold.
+BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL = float(os.getenv("LLM_BREAKER_SLOW_CALL", "20"))
+BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_PROBE_INTERVAL = float(os.getenv("LLM_BREAKER_PROBE_INTERVAL", "2"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Counts "retries", "timeouts", "trips", "recoveries" and "fallbacks"
+resilience_stats = Counter()
+
+class DeadlineExceeded(Exception):
+    pass
+
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """
+    closed -> open when the rolling failure or slow-call rate crosses its
+    threshold; open -> half-open after `open_seconds`; half-open lets one
+    probe through every `probe_interval` and closes on the first success or
+    re-opens on a failure.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE, slow_call: float = BREAKER_SLOW_CALL,
+                 slow_rate: float = BREAKER_SLOW_RATE, open_seconds: float = BREAKER_OPEN_SECONDS,
+                 probe_interval: float = BREAKER_PROBE_INTERVAL):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.probe_interval = probe_interval
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._last_probe = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._last_probe = 0.0
+
+    def allow(self) -> bool:
+        """
+        Whether a call to the provider should be attempted now.
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN:
+                now = time.monotonic()
+                if now - self._last_probe >= self.probe_interval:
+                    self._last_probe = now
+                    return True
+            return False
+
+    def record(self, success: bool, latency: float = 0.0):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                if success:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    resilience_stats["recoveries"] += 1
+                    logger.info("Circuit breaker closed: provider recovered")
+                else:
+                    self._open()
+                return
+            if self._state == self.OPEN:
+                return
+            self._outcomes.append((success, latency >= self.slow_call))
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = sum(1 for ok, _ in self._outcomes if not ok) / len(self._outcomes)
+            slow = sum(1 for _, is_slow in self._outcomes if is_slow) / len(self._outcomes)
+            if failures >= self.failure_rate or slow >= self.slow_rate:
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        resilience_stats["trips"] += 1
+        logger.warning("Circuit breaker opened: failing over to fallbacks for %ss", self.open_seconds)
+
+# Shared by every Azure call in the process
+breaker = CircuitBreaker()
+
+# --- Retries ---
+def _status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Connection and timeout errors from the SDK carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds the provider asked us to wait (Retry-After / retry-after-ms).
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+async def call_with_retries(call: Callable[[], Awaitable[T]], *, attempt_timeout: float = ATTEMPT_TIMEOUT,
+                            deadline: float = CALL_DEADLINE, max_retries: int = MAX_RETRIES,
+                            circuit: Optional[CircuitBreaker] = None) -> T:
+    """
+    Runs `call` with a per-attempt timeout, retrying retryable failures with
+    jittered exponential backoff (or the provider's Retry-After, if longer)
+    until `max_retries` or the overall `deadline` is used up. Every attempt
+    that reaches the provider is reported to the circuit breaker.
+    """
+    circuit = circuit or breaker
+    give_up_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Model call exceeded its {deadline}s deadline")
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call(), timeout=min(attempt_timeout, remaining))
+        except Exception as e:
+            if not is_retryable(e):
+                # Bad requests etc. say nothing about provider health
+                raise
+            circuit.record(False, time.monotonic() - start)
+            if isinstance(e, asyncio.TimeoutError):
+                resilience_stats["timeouts"] += 1
+            delay = max(backoff_delay(attempt), retry_after(e) or 0)
+            if attempt >= max_retries or time.monotonic() + delay >= give_up_at:
+                raise
+            attempt += 1
+            resilience_stats["retries"] += 1
+            logger.info("Retrying model call in %.2fs after %s", delay, type(e).__name__)
+            await asyncio.sleep(delay)
+        else:
+            circuit.record(True, time.monotonic() - start)
+            return result
@@ -1,29 +1,159 @@
-from fastapi import APIRouter, HTTPException
-from app.models import CheckAuthRequest, CheckAuthResponse
-from app.rules_engine import find_rule
-from app.llm_client import LLMClient
+import asyncio
+import os
+from typing import Annotated, Dict, List, Optional
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from app.models import CheckAuthRequest, CheckAuthResponse, CheckAuthBatchRequest, CheckAuthBatchResult
+from app.rules_engine import RuleMatch, match_rule, match_rules
+from app.cache import make_key
+from app.extractor import NOTE_FIELDS, extract_fields
+from app.idempotency import idempotent
+from app.llm_client import llm_client
+from app.prefetch import PREFETCH_ENABLED, checklist_inputs, letter_inputs, prefetcher
+
+# Default number of explanations a batch generates at once
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
 
 router = APIRouter()
-llm_client = LLMClient()
 
-@router.post("/check_auth_need", response_model=CheckAuthResponse)
-async def check_auth_need(request: CheckAuthRequest):
-    rule = find_rule(request.payer, request.code)
-    
+def _missing_fields(request: CheckAuthRequest) -> List[str]:
+    return [name for name in NOTE_FIELDS if not getattr(request, name)]
+
+def _fill_from_note(request: CheckAuthRequest) -> CheckAuthRequest:
+    """
+    Fills omitted code/diagnosis/stage from the clinical note with the
+    deterministic extractor. Fields the caller sent are never overwritten.
+    """
+    missing = _missing_fields(request)
+    if not missing or not request.clinical_note:
+        return request
+    extracted = extract_fields(request.clinical_note)
+    updates = {name: getattr(extracted, name) for name in missing if getattr(extracted, name)}
+    return request.copy(update=updates) if updates else request
+
+async def _resolve_fields(request: CheckAuthRequest) -> CheckAuthRequest:
+    """
+    Deterministic extraction first; the model is only asked for what is
+    still missing. Raises 422 if a field can't be resolved at all.
+    """
+    request = _fill_from_note(request)
+    missing = _missing_fields(request)
+    if missing and request.clinical_note:
+        updates = await llm_client.extract_fields(request.clinical_note, missing)
+        request = request.copy(update=updates)
+        missing = _missing_fields(request)
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing {', '.join(missing)} (not provided or found in clinical_note)")
+    return request
+
+async def _check(request: CheckAuthRequest, match: Optional[RuleMatch]) -> CheckAuthResponse:
     auth_needed = False
     rule_id = None
+    rule = None
     
-    if rule:
-        rule_id = rule["id"]
-        # Simple logic: if rule exists and requires_auth is True
-        # In a real engine, we'd check conditions against patient data
+    if match:
+        rule = match.rule
+        rule_id = match.rule_id
+        # Conditions either matched or could not be evaluated; in the latter
+        # case we stay conservative and follow the rule.
         auth_needed = rule["requires_auth"]
     
     # Generate explanation
-    reason = llm_client.explain_auth_need(rule, request.dict())
+    reason = await llm_client.explain_auth_need(rule, request.dict())
     
     return CheckAuthResponse(
         auth_needed=auth_needed,
         reason=reason,
         rule_id=rule_id
     )
+
+def _prefetch(request: CheckAuthRequest) -> Optional[str]:
+    """
+    Starts the checklist (and the letter, if the request carries what it
+    needs) for a case that needs auth. Returns the case token, or None if
+    prefetching is off or at capacity.
+    """
+    if not PREFETCH_ENABLED:
+        return None
+    diagnosis, stage, code = request.diagnosis, request.stage, request.code
+    jobs = {
+        "checklist": (checklist_inputs(diagnosis, stage, code),
+                      lambda: llm_client.generate_checklist(diagnosis, stage, code)),
+    }
+    if request.patient_name and request.justification_points:
+        patient_name, payer, points = request.patient_name, request.payer, request.justification_points
+        jobs["letter"] = (letter_inputs(patient_name, payer, code, points),
+                          lambda: llm_client.draft_letter(patient_name, payer, code, points))
+    return prefetcher.start(jobs)
+
+@router.post("/check_auth_need", response_model=CheckAuthResponse)
+async def check_auth_need(request: CheckAuthRequest, response: Response = None,
+                          idempotency_key: Annotated[Optional[str], Header()] = None):
+    async def compute():
+        resolved = await _resolve_fields(request)
+        match = match_rule(resolved.payer, resolved.code, resolved.diagnosis, resolved.stage)
+        # The rule already decides auth_needed, so the follow-ups can start
+        # while the explanation is still being written
+        case_token = None
+        if request.prefetch and match and match.rule["requires_auth"]:
+            case_token = _prefetch(resolved)
+        result = await _check(resolved, match)
+        return result.copy(update={"case_token": case_token}) if case_token else result
+
+    return await idempotent("check_auth_need", idempotency_key, request, response, CheckAuthResponse, compute)
+
+@router.delete("/prefetch/{case_token}", status_code=204)
+async def cancel_prefetch(case_token: str):
+    """
+    Drops a case's prefetched results, cancelling generations still running
+    (e.g. when the user closes the case).
+    """
+    prefetcher.cancel(case_token)
+    return Response(status_code=204)
+
+@router.post("/check_auth_need/batch")
+async def check_auth_need_batch(batch: CheckAuthBatchRequest):
+    """
+    Checks many cases at once and streams NDJSON lines of CheckAuthBatchResult
+    in completion order. Identical cases are computed once, and a failing item
+    reports its error without failing the rest of the batch.
+    """
+    items = [_fill_from_note(r) for r in batch.items]
+    # Items still missing fields are resolved (and matched) individually in run()
+    matches = match_rules((r.payer, r.code, r.diagnosis, r.stage) for r in items)
+
+    # Group identical cases so each is explained once
+    groups: Dict[str, List[int]] = {}
+    for i, request in enumerate(items):
+        key = make_key("check", **request.dict())
+        groups.setdefault(key, []).append(i)
+
+    semaphore = asyncio.Semaphore(batch.max_concurrency or BATCH_MAX_CONCURRENCY)
+
+    async def run(indices: List[int]):
+        first = indices[0]
+        async with semaphore:
+            try:
+                request, match = items[first], matches[first]
+                if _missing_fields(request):
+                    request = await _resolve_fields(request)
+                    match = match_rule(request.payer, request.code, request.diagnosis, request.stage)
+                return indices, await _check(request, match), None
+            except HTTPException as e:
+                return indices, None, e.detail
+            except Exception as e:
+                return indices, None, f"{type(e).__name__}: {e}"
+
+    async def lines():
+        tasks = [asyncio.ensure_future(run(indices)) for indices in groups.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indices, result, error = await next_done
+                for i in indices:
+                    yield CheckAuthBatchResult(index=i, result=result, error=error).json() + "\n"
+        finally:
+            # Client went away: don't keep generating explanations for nobody
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,11 +1,43 @@
-from fastapi import APIRouter
+import json
+from typing import Annotated, Optional
+from fastapi import APIRouter, Header, Response
+from fastapi.responses import StreamingResponse
 from app.models import ChecklistRequest, ChecklistResponse
-from app.llm_client import LLMClient
+from app.idempotency import idempotent
+from app.llm_client import llm_client
+from app.prefetch import checklist_inputs, prefetcher
 
 router = APIRouter()
-llm_client = LLMClient()
 
 @router.post("/generate_checklist", response_model=ChecklistResponse)
-async def generate_checklist(request: ChecklistRequest):
-    checklist = llm_client.generate_checklist(request.diagnosis, request.stage, request.code)
-    return ChecklistResponse(checklist=checklist)
+async def generate_checklist(request: ChecklistRequest, response: Response = None,
+                             idempotency_key: Annotated[Optional[str], Header()] = None):
+    async def compute():
+        checklist = await prefetcher.attach(
+            request.case_token, "checklist", checklist_inputs(request.diagnosis, request.stage, request.code),
+            lambda: llm_client.generate_checklist(request.diagnosis, request.stage, request.code)
+        )
+        return ChecklistResponse(checklist=checklist)
+
+    return await idempotent("generate_checklist", idempotency_key, request, response, ChecklistResponse, compute)
+
+@router.post("/generate_checklist/stream")
+async def generate_checklist_stream(request: ChecklistRequest):
+    """
+    Streams checklist items as Server-Sent Events as soon as each one is
+    parsed: `data: {"item": ...}` per item, then `done` (or `error`).
+    """
+    async def events():
+        try:
+            async for item in llm_client.stream_checklist(request.diagnosis, request.stage, request.code):
+                yield f"data: {json.dumps({'item': item})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from typing import Any, Dict
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.jobs import FINISHED, JOB_POLL_INTERVAL, JobWorkers, QueueFull, job_store
+from app.models import ChecklistRequest, DraftLetterRequest, JobStatus
+from app.routers import checklist, letter
+
+router = APIRouter(prefix="/jobs")
+
+# --- Handlers ---
+# A job runs the same code as the synchronous endpoint and stores its body
+async def _draft_letter(payload: Dict) -> Dict:
+    return (await letter.draft_letter(DraftLetterRequest(**payload))).dict()
+
+async def _generate_checklist(payload: Dict) -> Dict:
+    return (await checklist.generate_checklist(ChecklistRequest(**payload))).dict()
+
+workers = JobWorkers({
+    "draft_letter": _draft_letter,
+    "generate_checklist": _generate_checklist,
+})
+
+def _status(job: Dict[str, Any]) -> JobStatus:
+    return JobStatus(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        priority=job["priority"],
+        result=job["result"],
+        error=job["error"],
+        created_at=job["created"],
+        started_at=job["started"],
+        finished_at=job["finished"],
+    )
+
+# Store calls block on SQLite, so they run in threads off the event loop
+async def _submit(kind: str, payload: Dict, priority: int) -> JobStatus:
+    try:
+        job = await asyncio.to_thread(job_store.submit, kind, payload, priority)
+    except QueueFull:
+        # Backpressure: tell the client to come back rather than queue forever
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "5"})
+    workers.notify()
+    return _status(job)
+
+# --- Routes ---
+@router.post("/draft_letter", response_model=JobStatus, status_code=202)
+async def submit_draft_letter(request: DraftLetterRequest, priority: int = Query(0, description="Higher runs first")):
+    return await _submit("draft_letter", request.dict(), priority)
+
+@router.post("/generate_checklist", response_model=JobStatus, status_code=202)
+async def submit_generate_checklist(request: ChecklistRequest, priority: int = Query(0, description="Higher runs first")):
+    return await _submit("generate_checklist", request.dict(), priority)
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _status(job)
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events for a job: a `status` event on every state change,
+    then `done` carrying the finished job.
+    """
+    if await asyncio.to_thread(job_store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            job = await asyncio.to_thread(job_store.get, job_id)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'detail': 'Job expired'})}\n\n"
+                return
+            if job["status"] in FINISHED:
+                yield f"event: done\ndata: {_status(job).json()}\n\n"
+                return
+            if job["status"] != last:
+                last = job["status"]
+                yield f"event: status\ndata: {json.dumps({'status': last})}\n\n"
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
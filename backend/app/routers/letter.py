@@ -1,16 +1,54 @@
-from fastapi import APIRouter
+import json
+from typing import Annotated, Optional
+from fastapi import APIRouter, Header, Response
+from fastapi.responses import StreamingResponse
 from app.models import DraftLetterRequest, DraftLetterResponse
-from app.llm_client import LLMClient
+from app.idempotency import idempotent
+from app.llm_client import llm_client
+from app.prefetch import letter_inputs, prefetcher
 
 router = APIRouter()
-llm_client = LLMClient()
 
 @router.post("/draft_letter", response_model=DraftLetterResponse)
-async def draft_letter(request: DraftLetterRequest):
-    letter = llm_client.draft_letter(
-        request.patient_name,
-        request.payer,
-        request.code,
-        request.justification_points
+async def draft_letter(request: DraftLetterRequest, response: Response = None,
+                       idempotency_key: Annotated[Optional[str], Header()] = None):
+    async def compute():
+        letter = await prefetcher.attach(
+            request.case_token, "letter",
+            letter_inputs(request.patient_name, request.payer, request.code, request.justification_points),
+            lambda: llm_client.draft_letter(
+                request.patient_name,
+                request.payer,
+                request.code,
+                request.justification_points
+            )
+        )
+        return DraftLetterResponse(letter_content=letter)
+
+    return await idempotent("draft_letter", idempotency_key, request, response, DraftLetterResponse, compute)
+
+@router.post("/draft_letter/stream")
+async def draft_letter_stream(request: DraftLetterRequest):
+    """
+    Streams the letter as Server-Sent Events: one `data: {"token": ...}` event
+    per chunk, then a `done` event (or an `error` event if drafting fails).
+    """
+    async def events():
+        try:
+            async for token in llm_client.stream_letter(
+                request.patient_name,
+                request.payer,
+                request.code,
+                request.justification_points
+            ):
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    return DraftLetterResponse(letter_content=letter)
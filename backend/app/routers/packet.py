@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from app.models import PacketRequest, PacketResponse, CheckAuthResponse
+from app.rules_engine import match_rule
+from app.llm_client import llm_client
+
+router = APIRouter()
+
+@router.post("/full_packet", response_model=PacketResponse)
+async def full_packet(request: PacketRequest):
+    """
+    Auth check, checklist and letter in one call, generated in parallel.
+    """
+    match = match_rule(request.payer, request.code, request.diagnosis, request.stage)
+    rule = match.rule if match else None
+
+    result = await llm_client.full_packet(rule, request.dict())
+
+    return PacketResponse(
+        auth=CheckAuthResponse(
+            # Same conservative reading of ambiguous matches as /check_auth_need
+            auth_needed=rule["requires_auth"] if rule else False,
+            reason=result["reason"],
+            rule_id=match.rule_id if match else None
+        ),
+        checklist=result["checklist"],
+        letter_content=result["letter_draft"]
+    )
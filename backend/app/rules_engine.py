@@ -1,37 +1,549 @@
-from typing import List, Dict, Optional
-
-MOCK_RULES = [
-    {
-        "id": "R-001",
-        "payer": "MockHealth",
-        "code": "J9312",
-        "requires_auth": True,
-        "conditions": {
-            "diagnosis_keywords": ["non-small cell lung cancer", "nsclc"],
-            "stages": ["stage iii", "stage iv"]
-        }
-    },
-    {
-        "id": "R-002",
-        "payer": "MockHealth",
-        "code": "J9000",
-        "requires_auth": False,
-        "conditions": {}
-    },
-    {
-        "id": "R-003",
-        "payer": "BlueCross",
-        "code": "J9312",
-        "requires_auth": True,
-        "conditions": {
-             "diagnosis_keywords": ["lung cancer"],
-             "stages": ["stage iv"]
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Iterable, Iterator, Optional, Pattern, FrozenSet, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rules live on disk (JSON list or JSONL, one rule per line) so policy changes
+# can be picked up by the watcher without a redeploy.
+RULES_PATH = os.getenv(
+    "RULES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "rules.jsonl")
+)
+RULES_POLL_INTERVAL = float(os.getenv("RULES_POLL_INTERVAL", "2"))
+# When set, rules are served from a read-only memory-mapped snapshot at this
+# path (built from RULES_PATH on demand), so worker processes share one copy
+# of the index instead of each holding its own (see gunicorn.conf.py).
+RULES_SNAPSHOT_PATH = os.getenv("RULES_SNAPSHOT_PATH")
+# Compiled (payer, code) buckets kept per process when serving a snapshot
+SNAPSHOT_BUCKET_CACHE = int(os.getenv("RULES_SNAPSHOT_BUCKET_CACHE", "4096"))
+
+RuleKey = Tuple[str, str]
+
+# A rule with this payer applies to every payer without a rule of its own
+# for that code (e.g. high-cost specialty drugs)
+ANY_PAYER = "*"
+
+# --- Normalization ---
+_ARABIC_TO_ROMAN = {"0": "0", "1": "i", "2": "ii", "3": "iii", "4": "iv"}
+# "Stage IV", "stage 4", "IVB", "Stage: IV (metastatic)" -> "stage iv"
+_STAGE_RE = re.compile(r"(?:stage)?[\s:]*(iv|iii|ii|i|[0-4])(?:[abc]\d?)?\b")
+
+def normalize_payer(payer: Optional[str]) -> str:
+    return (payer or "").strip().lower()
+
+def normalize_code(code: Optional[str]) -> str:
+    return (code or "").strip().upper()
+
+def rule_key(rule: Dict) -> RuleKey:
+    return (normalize_payer(rule["payer"]), normalize_code(rule["code"]))
+
+def normalize_stage(stage: Optional[str]) -> Optional[str]:
+    """
+    Maps stage spellings onto a canonical "stage <roman>" form, ignoring
+    substages. Returns None if no stage can be recognized.
+    """
+    match = _STAGE_RE.match((stage or "").strip().lower())
+    if not match:
+        return None
+    value = match.group(1)
+    return "stage " + _ARABIC_TO_ROMAN.get(value, value)
+
+# --- Compiled Rules ---
+@lru_cache(maxsize=None)
+def _compile_keywords(keywords: Tuple[str, ...]) -> Pattern:
+    # One alternation per keyword set; rules sharing a set share the automaton.
+    # Longest first so overlapping keywords resolve to the most specific one.
+    alternatives = sorted({k.strip().lower() for k in keywords}, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(k) for k in alternatives) + r")\b")
+
+@dataclass(frozen=True)
+class CompiledRule:
+    rule: Dict
+    keywords: Optional[Pattern]
+    stages: Optional[FrozenSet[str]]
+
+    @classmethod
+    def compile(cls, rule: Dict) -> "CompiledRule":
+        conditions = rule.get("conditions") or {}
+        keywords = conditions.get("diagnosis_keywords")
+        stages = conditions.get("stages")
+        return cls(
+            rule=rule,
+            keywords=_compile_keywords(tuple(keywords)) if keywords else None,
+            stages=frozenset(normalize_stage(s) or s.strip().lower() for s in stages) if stages else None,
+        )
+
+    def evaluate(self, diagnosis: Optional[str], stage: Optional[str]) -> Optional[bool]:
+        """
+        True if the request meets every condition, False if it fails one,
+        None if a condition can't be evaluated (missing diagnosis/stage).
+        """
+        results = []
+        if self.keywords is not None:
+            results.append(bool(self.keywords.search(diagnosis.lower())) if diagnosis else None)
+        if self.stages is not None:
+            normalized = normalize_stage(stage)
+            results.append(normalized in self.stages if normalized else None)
+        if False in results:
+            return False
+        if None in results:
+            return None
+        return True
+
+def changed_keys(old: Dict[str, Dict], new: Dict[str, Dict]) -> Set[RuleKey]:
+    """
+    The (payer, code) keys whose rules differ between two {id: rule} maps.
+    """
+    changed: Set[RuleKey] = set()
+    for rule_id, rule in new.items():
+        previous = old.get(rule_id)
+        if previous != rule:
+            changed.add(rule_key(rule))
+            if previous is not None:
+                changed.add(rule_key(previous))
+    for rule_id, previous in old.items():
+        if rule_id not in new:
+            changed.add(rule_key(previous))
+    return changed
+
+@dataclass(frozen=True)
+class RuleMatch:
+    rule: Dict
+    # None means the conditions could not be evaluated from the request
+    conditions_met: Optional[bool]
+
+    @property
+    def rule_id(self) -> str:
+        return self.rule["id"]
+
+class RuleIndex:
+    """
+    Rules bucketed by normalized (payer, code), so a lookup is one dict access
+    plus a condition check over the few rules sharing that key. An index is
+    never mutated after construction; updates build a new one.
+    """
+
+    def __init__(self, rules: Iterable[Dict]):
+        # Later rules with the same id replace earlier ones
+        self._by_id: Dict[str, Dict] = {rule["id"]: rule for rule in rules}
+        buckets: Dict[RuleKey, List[CompiledRule]] = {}
+        for rule in self._by_id.values():
+            buckets.setdefault(rule_key(rule), []).append(CompiledRule.compile(rule))
+        self._by_key: Dict[RuleKey, Tuple[CompiledRule, ...]] = {
+            key: tuple(bucket) for key, bucket in buckets.items()
         }
-    }
-]
+
+    @classmethod
+    def _from_parts(cls, by_id: Dict[str, Dict], by_key: Dict[RuleKey, Tuple[CompiledRule, ...]]) -> "RuleIndex":
+        index = cls.__new__(cls)
+        index._by_id = by_id
+        index._by_key = by_key
+        return index
+
+    def updated(self, rules: Iterable[Dict]) -> Tuple["RuleIndex", Set[RuleKey]]:
+        """
+        Returns an index over `rules` together with the (payer, code) keys
+        that changed. Only the buckets for those keys are recompiled; the
+        rest are shared with this index.
+        """
+        by_id = {rule["id"]: rule for rule in rules}
+        changed = changed_keys(self._by_id, by_id)
+        if not changed:
+            return self, changed
+
+        buckets: Dict[RuleKey, List[CompiledRule]] = {key: [] for key in changed}
+        for rule in by_id.values():
+            bucket = buckets.get(rule_key(rule))
+            if bucket is not None:
+                bucket.append(CompiledRule.compile(rule))
+        by_key = dict(self._by_key)
+        for key, bucket in buckets.items():
+            if bucket:
+                by_key[key] = tuple(bucket)
+            else:
+                by_key.pop(key, None)
+        return RuleIndex._from_parts(by_id, by_key), changed
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self._by_key.values())
+
+    def rules(self) -> List[Dict]:
+        return list(self._by_id.values())
+
+    def fingerprint(self) -> str:
+        return rules_fingerprint(self._by_id.values())
+
+    def get(self, rule_id: str) -> Optional[Dict]:
+        return self._by_id.get(rule_id)
+
+    def candidates(self, payer: str, code: str) -> Tuple[CompiledRule, ...]:
+        code = normalize_code(code)
+        return self._by_key.get((normalize_payer(payer), code)) or self._by_key.get((ANY_PAYER, code), ())
+
+    def find(self, payer: str, code: str) -> Optional[Dict]:
+        candidates = self.candidates(payer, code)
+        return candidates[0].rule if candidates else None
+
+    def match(self, payer: str, code: str, diagnosis: Optional[str] = None,
+              stage: Optional[str] = None) -> Optional[RuleMatch]:
+        """
+        Returns the first rule whose conditions are met, else the first rule
+        whose conditions are ambiguous, else None.
+        """
+        ambiguous = None
+        for compiled in self.candidates(payer, code):
+            result = compiled.evaluate(diagnosis, stage)
+            if result:
+                return RuleMatch(compiled.rule, True)
+            if result is None and ambiguous is None:
+                ambiguous = RuleMatch(compiled.rule, None)
+        return ambiguous
+
+# --- Shared Snapshot ---
+# File layout (little-endian): header, the rules as JSON lines in file order,
+# then two tables sorted by 64-bit hash, one entry per (payer, code) key and
+# one per rule id, then the bucket records the key table points to (a count
+# and a digest of the bucket's rules, followed by the offset/length of each
+# rule in the bucket). The header carries the rules' fingerprint, so other
+# indexes built from the same rules (app.policy_index) can be checked
+# against it without reading the rules.
+_SNAPSHOT_MAGIC = b"RISARUL2"
+# magic, source mtime_ns, source size, keys, ids, key table, id table, rules fingerprint
+_HEADER = struct.Struct("<8sqqIIQQ16s")
+# hash, offset, length
+_ENTRY = struct.Struct("<QQI")
+# rule count, digest of the rules
+_BUCKET = struct.Struct("<IQ")
+# rule offset, rule length
+_REF = struct.Struct("<QI")
+
+def _hash(*parts: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b("\0".join(parts).encode(), digest_size=8).digest(), "little")
+
+def _blob(rule: Dict) -> bytes:
+    return json.dumps(rule, separators=(",", ":")).encode() + b"\n"
+
+def _digest(blobs: Iterable[bytes], size: int) -> bytes:
+    digest = hashlib.blake2b(digest_size=size)
+    for blob in blobs:
+        digest.update(blob)
+    return digest.digest()
+
+def _source_signature(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def rules_fingerprint(rules: Iterable[Dict]) -> str:
+    """
+    Digest of a rule set (later rules replacing earlier ones with the same
+    id), equal to the header fingerprint of a snapshot written from it.
+    """
+    by_id = {rule["id"]: rule for rule in rules}
+    return _digest((_blob(rule) for rule in by_id.values()), 16).hex()
+
+def write_rule_snapshot(rules: Iterable[Dict], path: str, source: Tuple[int, int] = (0, 0)):
+    """
+    Writes `rules` as a snapshot for MappedRuleIndex. The file is replaced
+    atomically, so processes mapping the old one keep a consistent view.
+    """
+    by_id = {rule["id"]: rule for rule in rules}
+    blobs = [_blob(rule) for rule in by_id.values()]
+    offset = _HEADER.size
+    refs: Dict[RuleKey, List[Tuple[int, int]]] = {}
+    bucket_blobs: Dict[RuleKey, List[bytes]] = {}
+    ids = []
+    for rule, blob in zip(by_id.values(), blobs):
+        refs.setdefault(rule_key(rule), []).append((offset, len(blob)))
+        bucket_blobs.setdefault(rule_key(rule), []).append(blob)
+        ids.append((_hash(rule["id"]), offset, len(blob)))
+        offset += len(blob)
+
+    key_table = offset
+    id_table = key_table + _ENTRY.size * len(refs)
+    offset = id_table + _ENTRY.size * len(ids)
+    keys, buckets = [], []
+    for key, bucket in refs.items():
+        digest = int.from_bytes(_digest(bucket_blobs[key], 8), "little")
+        record = _BUCKET.pack(len(bucket), digest) + b"".join(_REF.pack(*ref) for ref in bucket)
+        keys.append((_hash(*key), offset, len(record)))
+        buckets.append(record)
+        offset += len(record)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_SNAPSHOT_MAGIC, *source, len(keys), len(ids), key_table, id_table, _digest(blobs, 16)))
+        f.writelines(blobs)
+        f.writelines(_ENTRY.pack(*entry) for entry in sorted(keys))
+        f.writelines(_ENTRY.pack(*entry) for entry in sorted(ids))
+        f.writelines(buckets)
+    os.replace(tmp, path)
+
+class MappedRuleIndex(RuleIndex):
+    """
+    A RuleIndex over a snapshot file mapped read-only. Every process mapping
+    the file shares its pages, so the rules cost one copy per host rather
+    than one per worker; each process only compiles the buckets it looks up,
+    keeping up to SNAPSHOT_BUCKET_CACHE of them.
+    """
+
+    def __init__(self, path: str, bucket_cache: int = SNAPSHOT_BUCKET_CACHE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, mtime, size, self._keys, self._ids, self._key_table, self._id_table,
+         digest) = _HEADER.unpack_from(self._map)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a rules snapshot")
+        self.source = (mtime, size)
+        self._fingerprint = digest.hex()
+        self._bucket = lru_cache(maxsize=bucket_cache)(self._load_bucket)
+
+    def _lookup(self, table: int, count: int, target: int) -> Iterator[Tuple[int, int]]:
+        """
+        (offset, length) of every entry with hash `target`, by binary search.
+        """
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _ENTRY.unpack_from(self._map, table + mid * _ENTRY.size)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < count:
+            found, offset, length = _ENTRY.unpack_from(self._map, table + lo * _ENTRY.size)
+            if found != target:
+                return
+            yield offset, length
+            lo += 1
+
+    def _rule(self, offset: int, length: int) -> Dict:
+        return json.loads(self._map[offset:offset + length])
+
+    def _bucket_rules(self, offset: int) -> List[Dict]:
+        count, _ = _BUCKET.unpack_from(self._map, offset)
+        return [self._rule(*_REF.unpack_from(self._map, offset + _BUCKET.size + i * _REF.size)) for i in range(count)]
+
+    def _bucket_digests(self) -> Dict[int, Tuple[int, int]]:
+        # key hash -> (bucket digest, bucket offset), without reading any rule
+        digests = {}
+        for i in range(self._keys):
+            key_hash, offset, _ = _ENTRY.unpack_from(self._map, self._key_table + i * _ENTRY.size)
+            digests[key_hash] = (_BUCKET.unpack_from(self._map, offset)[1], offset)
+        return digests
+
+    def _load_bucket(self, key: RuleKey) -> Tuple[CompiledRule, ...]:
+        for offset, _ in self._lookup(self._key_table, self._keys, _hash(*key)):
+            rules = self._bucket_rules(offset)
+            # Hashes can collide; the rules carry their real key
+            if rules and rule_key(rules[0]) == key:
+                return tuple(CompiledRule.compile(rule) for rule in rules)
+        return ()
+
+    def candidates(self, payer: str, code: str) -> Tuple[CompiledRule, ...]:
+        code = normalize_code(code)
+        return self._bucket((normalize_payer(payer), code)) or self._bucket((ANY_PAYER, code))
+
+    def __len__(self) -> int:
+        return self._ids
+
+    def rules(self) -> List[Dict]:
+        return [json.loads(line) for line in self._map[_HEADER.size:self._key_table].splitlines()]
+
+    def fingerprint(self) -> str:
+        return self._fingerprint
+
+    def changed_since(self, other: "MappedRuleIndex") -> Set[RuleKey]:
+        """
+        The (payer, code) keys whose rules differ from `other`'s, comparing
+        bucket digests; only the rules of changed buckets are read.
+        """
+        if other.fingerprint() == self.fingerprint():
+            return set()
+        mine, theirs = self._bucket_digests(), other._bucket_digests()
+        changed: Set[RuleKey] = set()
+        for key_hash in mine.keys() | theirs.keys():
+            if mine.get(key_hash, (None,))[0] == theirs.get(key_hash, (None,))[0]:
+                continue
+            index, (_, offset) = (self, mine[key_hash]) if key_hash in mine else (other, theirs[key_hash])
+            changed.update(rule_key(rule) for rule in index._bucket_rules(offset))
+        return changed
+
+    def get(self, rule_id: str) -> Optional[Dict]:
+        for offset, length in self._lookup(self._id_table, self._ids, _hash(rule_id)):
+            rule = self._rule(offset, length)
+            if rule["id"] == rule_id:
+                return rule
+        return None
+
+    def updated(self, rules: Iterable[Dict]) -> Tuple[RuleIndex, Set[RuleKey]]:
+        by_id = {rule["id"]: rule for rule in rules}
+        changed = changed_keys({rule["id"]: rule for rule in self.rules()}, by_id)
+        return (RuleIndex(by_id.values()) if changed else self), changed
+
+def open_rule_snapshot(rules_path: str, snapshot_path: str) -> MappedRuleIndex:
+    """
+    Maps the snapshot of `rules_path`, (re)building it first if it is
+    missing or older than the rules file. Concurrent workers build it once:
+    the others wait on the lock and then map the fresh file.
+    """
+    source = _source_signature(rules_path)
+
+    def current() -> Optional[MappedRuleIndex]:
+        try:
+            index = MappedRuleIndex(snapshot_path)
+        except (OSError, ValueError):
+            return None
+        return index if index.source == source else None
+
+    index = current()
+    if index is not None:
+        return index
+    with open(snapshot_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index = current()
+        if index is None:
+            write_rule_snapshot(load_rules(rules_path), snapshot_path, source)
+            index = MappedRuleIndex(snapshot_path)
+            logger.info("Built rules snapshot %s (%d rules)", snapshot_path, len(index))
+    return index
+
+# --- Rule Store ---
+def load_rules(path: str) -> List[Dict]:
+    """
+    Reads rules from a JSON list or a JSONL file (blank lines ignored).
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def _load_index(path: str, snapshot_path: Optional[str] = RULES_SNAPSHOT_PATH) -> RuleIndex:
+    if snapshot_path:
+        return open_rule_snapshot(path, snapshot_path)
+    return RuleIndex(load_rules(path))
+
+_index = _load_index(RULES_PATH) if os.path.exists(RULES_PATH) else RuleIndex([])
+
+def get_index() -> RuleIndex:
+    return _index
+
+def set_index(index: RuleIndex):
+    # A single reference swap: readers see either the old or the new index,
+    # never a partially built one.
+    global _index
+    _index = index
+
+class RuleStore:
+    """
+    Polls a rules file and swaps in an incrementally updated index when it
+    changes. Parsing and recompiling happen on the watcher thread, off the
+    request path. A file that fails to parse (e.g. caught mid-write) leaves
+    the active index untouched and is retried on the next poll. With a
+    snapshot path, the new rules are served from a rebuilt shared snapshot.
+    """
+
+    def __init__(self, path: str = RULES_PATH, poll_interval: float = RULES_POLL_INTERVAL,
+                 snapshot_path: Optional[str] = RULES_SNAPSHOT_PATH):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.snapshot_path = snapshot_path
+        self._signature = self._stat()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def reload_if_changed(self) -> Set[RuleKey]:
+        """
+        Applies the file to the active index if it changed since the last
+        check, returning the (payer, code) keys that were re-indexed.
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return set()
+        try:
+            snapshot = open_rule_snapshot(self.path, self.snapshot_path) if self.snapshot_path else None
+            rules = load_rules(self.path) if snapshot is None else None
+        except (OSError, ValueError) as e:
+            logger.warning("Could not reload rules from %s: %s", self.path, e)
+            return set()
+        self._signature = signature
+        if snapshot is not None:
+            # Swapped whole: the snapshot is already built and shared.
+            # Snapshots are compared by bucket digests, without parsing rules
+            index = snapshot
+            current = get_index()
+            if isinstance(current, MappedRuleIndex):
+                changed = snapshot.changed_since(current)
+            else:
+                changed = changed_keys({rule["id"]: rule for rule in current.rules()},
+                                       {rule["id"]: rule for rule in snapshot.rules()})
+        else:
+            index, changed = get_index().updated(rules)
+        if changed:
+            set_index(index)
+            logger.info("Reloaded rules from %s (%d keys re-indexed)", self.path, len(changed))
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.reload_if_changed()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rule-store-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
 
 def find_rule(payer: str, code: str) -> Optional[Dict]:
-    for rule in MOCK_RULES:
-        if rule["payer"].lower() == payer.lower() and rule["code"] == code:
-            return rule
-    return None
+    return get_index().find(payer, code)
+
+def match_rule(payer: str, code: str, diagnosis: Optional[str] = None,
+               stage: Optional[str] = None) -> Optional[RuleMatch]:
+    return get_index().match(payer, code, diagnosis, stage)
+
+def match_rules(requests: Iterable[Tuple[str, str, Optional[str], Optional[str]]]) -> List[Optional[RuleMatch]]:
+    """
+    Matches many (payer, code, diagnosis, stage) tuples against one snapshot
+    of the index, so a reload mid-batch can't mix rule versions.
+    """
+    index = get_index()
+    return [index.match(payer, code, diagnosis, stage) for payer, code, diagnosis, stage in requests]
+
+def describe_match(match: Optional[RuleMatch]) -> str:
+    """
+    Deterministic one-line reason for a rule outcome.
+    """
+    if match is None:
+        return "No specific rule found."
+    rule = match.rule
+    payer = "all payers" if rule["payer"] == ANY_PAYER else rule["payer"]
+    if rule["requires_auth"]:
+        reason = f"Rule {rule['id']}: {rule['code']} requires auth for {payer}."
+    else:
+        reason = f"Rule {rule['id']}: {rule['code']} is exempt from auth."
+    if match.conditions_met is None:
+        reason += " Diagnosis/stage conditions could not be confirmed."
+    return reason
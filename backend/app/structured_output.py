@@ -0,0 +1,126 @@
+import json
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.models import ChecklistItem
+
+# Counts checklist parses by outcome: "clean", "repaired", "reprompted",
+# "failed", plus "invalid_items" for objects dropped by validation.
+parse_stats = Counter()
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PY_LITERAL_RE = re.compile(r"\b(True|False|None)\b")
+
+def strip_fences(text: str) -> str:
+    return _FENCE_RE.sub("", text.strip())
+
+def _loads_lenient(text: str):
+    """
+    json.loads with repairs for slips models commonly make: trailing commas
+    and Python-style True/False/None.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        repaired = _TRAILING_COMMA_RE.sub(r"\1", text)
+        repaired = _PY_LITERAL_RE.sub(lambda m: _PY_LITERALS[m.group(1)], repaired)
+        return json.loads(repaired)
+
+class ChecklistStreamParser:
+    """
+    Incremental parser for a model reply containing checklist objects.
+
+    Text is fed in chunks as it streams; every JSON object is validated
+    against ChecklistItem the moment its closing brace arrives, so items are
+    available before the reply is complete. Anything around the objects
+    (fences, prose, an unterminated list, a wrapper object) is ignored, which
+    also makes truncated replies recoverable up to the last complete item.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.items: List[ChecklistItem] = []
+        self.invalid = 0
+        self._pos = 0
+        self._starts: List[int] = []
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[ChecklistItem]:
+        """
+        Consumes a chunk and returns the items completed by it.
+        """
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._starts.append(i)
+            elif ch == "}" and self._starts:
+                item = self._validate(buffer[self._starts.pop():i + 1])
+                if item is not None:
+                    completed.append(item)
+        self._pos = len(buffer)
+        self.items.extend(completed)
+        return completed
+
+    def _validate(self, candidate: str) -> Optional[ChecklistItem]:
+        try:
+            data = _loads_lenient(candidate)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or not {"category", "item"} <= data.keys():
+            # Wrapper or unrelated object, not a malformed item
+            return None
+        try:
+            return ChecklistItem(**data)
+        except (TypeError, ValidationError):
+            self.invalid += 1
+            return None
+
+def parse_checklist(text: str) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Parses a complete reply. Returns (items, error); error is None when at
+    least one valid item was recovered.
+    """
+    parser = ChecklistStreamParser()
+    parser.feed(text)
+    return finish(parser)
+
+def finish(parser: ChecklistStreamParser) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Result of a parser once the whole reply has been fed, recording in
+    parse_stats whether the reply was clean JSON or needed repair.
+    """
+    text = parser.buffer
+    parse_stats["invalid_items"] += parser.invalid
+    items = [item.dict() for item in parser.items]
+    if not items:
+        try:
+            json.loads(strip_fences(text))
+            error = "Reply contained no valid checklist items (keys: category, item, mandatory, reason)."
+        except ValueError as e:
+            error = f"Reply is not valid JSON: {e}"
+        return [], error
+    try:
+        strict = json.loads(strip_fences(text))
+        clean = isinstance(strict, list) and len(strict) == len(items)
+    except ValueError:
+        clean = False
+    parse_stats["clean" if clean else "repaired"] += 1
+    return items, None
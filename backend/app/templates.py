@@ -0,0 +1,138 @@
+import json
+import os
+from functools import lru_cache
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+from app.rules_engine import normalize_payer
+
+# Offline responses shared by every deployment (mock mode and the failover
+# path in app.llm_client). Static text lives in module constants built once at
+# import; rendering is a single f-string per field.
+
+# --- Settings ---
+# Per-payer letter skeletons (JSON keyed by payer). Payers not in the file
+# get the default letter below.
+LETTER_TEMPLATES_PATH = os.getenv(
+    "LETTER_TEMPLATES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "letter_templates.json")
+)
+# With Azure, the model writes only the clinical justification and the
+# payer's skeleton is rendered around it; set to 0 to have the model draft
+# the whole letter.
+HYBRID_LETTERS = os.getenv("LETTER_HYBRID", "1") != "0"
+
+# --- Explanation ---
+def render_explanation(has_rule: bool, payer: str, code: str, diagnosis: str, stage: str) -> str:
+    if has_rule:
+        return (f"For {code} under {payer}, prior authorization is required for {diagnosis} {stage}. "
+                f"This patient matches the criteria, so prior auth is required.")
+    return (f"No specific rule found for {code} under {payer}. "
+            f"Standard protocol suggests verifying with the payer directly.")
+
+# --- Checklist ---
+def render_checklist(diagnosis: Optional[str], stage: Optional[str]) -> List[Dict]:
+    # Fresh dicts per call: callers are free to modify what they get back
+    return [
+        {
+            "category": "Pathology",
+            "item": f"Biopsy report confirming {diagnosis}",
+            "mandatory": True,
+            "reason": "Required to verify diagnosis specificity."
+        },
+        {
+            "category": "Imaging",
+            "item": f"Recent CT/PET scan for {stage} confirmation",
+            "mandatory": True,
+            "reason": "Needed to establish disease progression/staging."
+        },
+        {
+            "category": "Clinical Notes",
+            "item": "Oncologist consultation notes from last 30 days",
+            "mandatory": True,
+            "reason": "To verify current clinical status and treatment plan."
+        }
+    ]
+
+# --- Letter ---
+# A letter is the payer's head and tail around the clinical justification.
+# Heads and tails may use {patient_name}, {payer} and {code}; they are parsed
+# once per payer into (literal, field) segments, so rendering is a join.
+_LETTER_FIELDS = frozenset({"patient_name", "payer", "code"})
+
+_DEFAULT_LETTER = {
+    "head": """Date: [Current Date]
+
+To: {payer} Utilization Management
+Re: Medical Necessity for {patient_name}
+Treatment Code: {code}
+
+To Whom It May Concern,
+
+I am writing to provide clinical justification for the treatment of my patient, {patient_name}, with the requested therapy ({code}).""",
+    "tail": """This treatment aligns with current NCCN guidelines and is considered the standard of care for this clinical presentation.
+
+Please review the attached documentation for further details.
+
+Sincerely,
+
+[Physician Name]
+[Institution]""",
+}
+
+Segments = Tuple[Tuple[str, Optional[str]], ...]
+
+def compile_template(text: str) -> Segments:
+    """
+    Splits `text` into (literal, field) segments. Raises ValueError on a
+    field other than patient_name, payer and code.
+    """
+    segments = []
+    for literal, field, spec, conversion in Formatter().parse(text):
+        if field is not None and (field not in _LETTER_FIELDS or spec or conversion):
+            raise ValueError(f"Unsupported letter template field: {{{field}}}")
+        segments.append((literal, field))
+    return tuple(segments)
+
+def _fill(segments: Segments, fields: Dict[str, str]) -> str:
+    return "".join(literal + fields[field] if field else literal for literal, field in segments)
+
+def _template_text(value) -> str:
+    # Templates may be stored as one string or as a list of lines
+    return "\n".join(value) if isinstance(value, list) else value
+
+@lru_cache(maxsize=1)
+def _letter_templates() -> Dict[str, Tuple[Segments, Segments]]:
+    templates = {"*": _DEFAULT_LETTER}
+    if os.path.exists(LETTER_TEMPLATES_PATH):
+        with open(LETTER_TEMPLATES_PATH) as f:
+            for payer, template in json.load(f).items():
+                # Keyed like the rules, so "mockhealth" gets MockHealth's letter
+                templates[normalize_payer(payer)] = {part: _template_text(template.get(part, _DEFAULT_LETTER[part]))
+                                    for part in ("head", "tail")}
+    return {payer: (compile_template(t["head"]), compile_template(t["tail"])) for payer, t in templates.items()}
+
+def letter_parts(patient_name: Optional[str], payer: Optional[str], code: Optional[str]) -> Tuple[str, str]:
+    """
+    The payer's letter head and tail, each ending where the justification
+    goes (separators included).
+    """
+    templates = _letter_templates()
+    head, tail = templates.get(normalize_payer(payer)) or templates["*"]
+    fields = {"patient_name": f"{patient_name}", "payer": f"{payer}", "code": f"{code}"}
+    return _fill(head, fields) + "\n\n", "\n\n" + _fill(tail, fields)
+
+def render_justification(justification: List[str]) -> str:
+    points = "\n- ".join(justification)
+    return f"""The patient has a confirmed diagnosis that requires this specific intervention. The following clinical factors support this request:
+- {points}"""
+
+def render_letter(patient_name: Optional[str], payer: Optional[str], code: Optional[str],
+                  justification: List[str], paragraph: Optional[str] = None) -> str:
+    """
+    The payer's letter around `paragraph` (the model's justification), or
+    around the justification points as a list when there is none.
+    """
+    head, tail = letter_parts(patient_name, payer, code)
+    body = paragraph.strip() if paragraph else render_justification(justification)
+    return head + body + tail
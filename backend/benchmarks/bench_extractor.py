@@ -0,0 +1,81 @@
+"""
+Throughput benchmark for the deterministic clinical-note extractor.
+
+    python benchmarks/bench_extractor.py [--notes 5000]
+
+Generates synthetic oncology notes with known diagnosis/stage/code, runs
+app.extractor.extract_fields over all of them and reports notes/sec,
+microseconds per note and per-field accuracy.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.extractor import DIAGNOSIS_SYNONYMS, DRUG_CODES, extract_fields
+from app.rules_engine import normalize_stage
+
+ROMAN = ["I", "II", "III", "IV"]
+TEMPLATES = [
+    "Patient: {name}\nDOB: 01/01/1960\nDiagnosis: {diagnosis}\nStage: {stage}\n"
+    "Current Status: Progression after first-line chemotherapy.\nPlan: Start {drug} ({code}).\nECOG PS: {ecog}\n",
+    "{name} is a {age} y/o with {diagnosis}, stage {stage}, ECOG {ecog}. "
+    "Discussed options; will request authorization for {drug} {code} q3w.\n",
+    "HPI: {age}-year-old presenting for follow-up of {diagnosis}.\nAssessment: {stage_word} disease, "
+    "ECOG performance status {ecog}.\nPlan: {drug}. Order: {code}.\n",
+]
+NAMES = ["John Doe", "Jane Roe", "Alex Smith", "Sam Lee"]
+
+def make_notes(count: int, rng: random.Random):
+    notes = []
+    for _ in range(count):
+        canonical = rng.choice(list(DIAGNOSIS_SYNONYMS))
+        drug, code = rng.choice(list(DRUG_CODES.items()))
+        stage_number = rng.randint(1, 4)
+        stage = rng.choice([ROMAN[stage_number - 1], str(stage_number), ROMAN[stage_number - 1] + "A"])
+        note = rng.choice(TEMPLATES).format(
+            name=rng.choice(NAMES),
+            age=rng.randint(35, 85),
+            diagnosis=rng.choice(DIAGNOSIS_SYNONYMS[canonical]),
+            stage=stage,
+            stage_word=f"Stage {stage}",
+            drug=drug.title(),
+            code=code,
+            ecog=rng.randint(0, 3),
+        )
+        notes.append((note, canonical, f"stage {ROMAN[stage_number - 1].lower()}", code))
+    return notes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    notes = make_notes(args.notes, random.Random(7))
+    texts = [n[0] for n in notes]
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        results = [extract_fields(text) for text in texts]
+        best = min(best, time.perf_counter() - start)
+
+    correct = {"diagnosis": 0, "stage": 0, "code": 0}
+    for result, (_, diagnosis, stage, code) in zip(results, notes):
+        correct["diagnosis"] += result.diagnosis == diagnosis
+        correct["stage"] += normalize_stage(result.stage) == stage
+        correct["code"] += result.code == code
+
+    print(f"notes:        {len(texts)}")
+    print(f"notes/sec:    {len(texts) / best:,.0f}")
+    print(f"us/note:      {best / len(texts) * 1e6:.1f}")
+    for name, count in correct.items():
+        print(f"{name + ' acc:':<14}{count / len(texts):.1%}")
+
+if __name__ == "__main__":
+    main()
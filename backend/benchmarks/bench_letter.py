@@ -0,0 +1,146 @@
+"""
+Full-generation vs hybrid (template + justification) letters.
+
+    python benchmarks/bench_letter.py [--letters 5] [--latency 0.3] [--tokens-per-sec 50]
+
+Both modes run the real Azure path (app.llm_client, the letter graph, the
+router) against the fake server (benchmarks/fake_openai.py), which answers
+like a model would in each mode:
+
+  full    the whole letter: the payer's skeleton around the justification.
+          That skeleton is the least a model writes, so this understates
+          the cost of full generation.
+  hybrid  only the justification paragraph (LETTER_HYBRID=1, the default);
+          app.templates renders the rest
+
+Each mode first drafts one discarded warm-up letter, so neither pays for
+connection setup or first imports. Reports completion tokens per letter,
+wall time per letter, and for the streamed letter the time to its first
+byte (the template head, in hybrid mode) apart from the time to the
+model's first token; then the local template render time.
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+import timeit
+from typing import Tuple
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai import FakeOpenAIServer, add_arguments, settings_from_args
+
+PAYER = "MockHealth"
+CODE = "J9312"
+POINTS = ["Metastatic NSCLC, Stage IV", "Progression after platinum-based chemotherapy", "ECOG PS 1", "PD-L1 TPS 60%"]
+PARAGRAPH = (
+    "The patient has metastatic non-small cell lung cancer, Stage IV, with radiographic progression on CT after "
+    "four cycles of platinum-based doublet chemotherapy. Tumor PD-L1 expression is 60% by tumor proportion score "
+    "and there is no actionable EGFR, ALK or ROS1 alteration on next-generation sequencing. The patient remains "
+    "fully ambulatory with an ECOG performance status of 1, has no active autoimmune disease or untreated brain "
+    "metastases, and has adequate organ function. Second-line single-agent immunotherapy offers this patient a "
+    "meaningful survival benefit over further cytotoxic chemotherapy, which would carry greater toxicity with "
+    "lower expected response. Delaying treatment risks further clinical decline and loss of eligibility for "
+    "effective therapy."
+)
+_TOKEN_RE = re.compile(r"\S+\s*")
+
+class LetterModelServer(FakeOpenAIServer):
+    """
+    Fake server that writes a whole letter or just the justification, as
+    asked, and counts the completion tokens it sends.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.completion_tokens = 0
+
+    def reply_for(self, messages):
+        from app import templates
+        prompt = " ".join(str(m.get("content", "")) for m in messages)
+        if "Write the clinical justification." in prompt:
+            reply = PARAGRAPH
+        else:
+            patient = re.search(r"Patient: (.*)", prompt).group(1)
+            reply = templates.render_letter(patient, PAYER, CODE, [], PARAGRAPH)
+        with self._lock:
+            self.completion_tokens += len(_TOKEN_RE.findall(reply))
+        return reply
+
+async def _letter(client, patient: str, hybrid: bool) -> Tuple[float, float, float]:
+    # (wall time, time to the first streamed piece, time to the model's first token)
+    start = time.perf_counter()
+    await client.draft_letter(patient, PAYER, CODE, POINTS)
+    wall = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stream = client.stream_letter(patient, PAYER, CODE, POINTS)
+    await stream.__anext__()
+    first = time.perf_counter() - start
+    if hybrid:
+        # The first piece was the template head; the model writes the next
+        await stream.__anext__()
+    model_first = time.perf_counter() - start
+    async for _ in stream:
+        pass
+    return wall, first, model_first
+
+async def run_mode(client, server, letters: int, mode: str) -> dict:
+    from app import templates
+    hybrid = templates.HYBRID_LETTERS = mode == "hybrid"
+    await _letter(client, f"Patient {mode} warm-up", hybrid)
+    server.completion_tokens = 0
+    wall, first, model_first = zip(*[await _letter(client, f"Patient {mode} {i}", hybrid) for i in range(letters)])
+    return {
+        # Each letter was generated twice (plain and streamed)
+        "tokens": server.completion_tokens / (2 * letters),
+        "wall_ms": statistics.median(wall) * 1000,
+        "first_ms": statistics.median(first) * 1000,
+        "ttft_ms": statistics.median(model_first) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--letters", type=int, default=5)
+    add_arguments(parser)
+    parser.set_defaults(latency=0.3, tokens_per_sec=50.0)
+    args = parser.parse_args()
+
+    server = LetterModelServer(settings=settings_from_args(args)).start()
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": server.url,
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": "2024-02-01",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "fake",
+    })
+    from app import templates
+    from app.llm_client import LLMClient
+
+    async def run():
+        client = LLMClient()
+        return {mode: await run_mode(client, server, args.letters, mode) for mode in ("full", "hybrid")}
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.stop()
+
+    number = 10000
+    render_us = timeit.timeit(lambda: templates.render_letter("Jane Doe", PAYER, CODE, [], PARAGRAPH),
+                              number=number) / number * 1e6
+    print(f"{args.letters} letters per mode, {args.latency}s to first token, {args.tokens_per_sec:g} tokens/s")
+    print(f"{'mode':>8} {'tokens':>8} {'wall ms':>9} {'first byte ms':>14} {'model ttft ms':>14}")
+    for mode, result in results.items():
+        print(f"{mode:>8} {result['tokens']:>8.0f} {result['wall_ms']:>9.0f} {result['first_ms']:>14.1f} "
+              f"{result['ttft_ms']:>14.1f}")
+    full, hybrid = results["full"], results["hybrid"]
+    print(f"output tokens {full['tokens'] / hybrid['tokens']:.1f}x fewer, wall time "
+          f"{full['wall_ms'] / hybrid['wall_ms']:.1f}x faster; template render {render_us:.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Recall and latency of the semantic policy index (app.policy_index).
+
+    python benchmarks/bench_policy_retrieval.py [--sizes 1000,10000,100000] [--k 3]
+
+Builds a memory-mapped index over synthetic policies per size and runs two
+query sets against it:
+
+  exact        the rule's own payer, code, a diagnosis synonym and stage;
+               a hit is the rule itself in the top k
+  cross-payer  an unknown payer with the same code/diagnosis; a hit is any
+               rule for that code and diagnosis in the top k
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.extractor import DIAGNOSIS_SYNONYMS, DRUG_CODES
+from app.policy_index import PolicyIndex, query_text
+
+STAGE_SETS = [["stage iii", "stage iv"], ["stage iv"], ["stage ii", "stage iii"]]
+DOCUMENTS = ["pathology report", "staging imaging", "oncology consult notes", "biomarker testing", "prior therapy history"]
+DIAGNOSES = list(DIAGNOSIS_SYNONYMS)
+DRUGS = {code: drug for drug, code in DRUG_CODES.items()}
+
+def make_rules(count: int, rng: random.Random):
+    rules = []
+    for i in range(count):
+        code = f"J{(i // 500) % 10000:04d}" if i % 5 else rng.choice(list(DRUGS))
+        diagnosis = rng.choice(DIAGNOSES)
+        stages = rng.choice(STAGE_SETS)
+        drug = DRUGS.get(code, "This agent").capitalize()
+        rules.append({
+            "id": f"R-{i:06d}",
+            "payer": f"Payer{i % 500}",
+            "code": code,
+            "requires_auth": True,
+            "conditions": {"diagnosis_keywords": [diagnosis.lower()], "stages": stages},
+            "policy": f"{drug} for {' or '.join(stages)} {diagnosis.lower()} requires prior authorization; "
+                      f"submit {rng.choice(DOCUMENTS)} and {rng.choice(DOCUMENTS)}.",
+        })
+    return rules
+
+def make_queries(rules, count: int, rng: random.Random):
+    queries = []
+    for rule in rng.sample(rules, min(count, len(rules))):
+        canonical = next(d for d in DIAGNOSES if d.lower() == rule["conditions"]["diagnosis_keywords"][0])
+        synonym = rng.choice(DIAGNOSIS_SYNONYMS[canonical])
+        stage = rng.choice(rule["conditions"]["stages"]).title()
+        queries.append((rule, synonym, stage))
+    return queries
+
+def percentile(sorted_values, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))]
+
+def run(size: int, queries_per_size: int, k: int, rng: random.Random):
+    rules = make_rules(size, rng)
+    by_topic = {}
+    for rule in rules:
+        by_topic.setdefault((rule["code"], rule["conditions"]["diagnosis_keywords"][0]), set()).add(rule["id"])
+
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        PolicyIndex.build(rules, path)
+        build_s = time.perf_counter() - start
+        index = PolicyIndex.load(path)
+
+        results = {}
+        for name in ("exact", "cross-payer"):
+            hits, latencies = 0, []
+            for rule, synonym, stage in make_queries(rules, queries_per_size, rng):
+                payer = rule["payer"] if name == "exact" else "UnknownHealth"
+                query = query_text(payer, rule["code"], synonym, stage)
+                start = time.perf_counter()
+                top = [rule_id for rule_id, _ in index.search(query, k)]
+                latencies.append(time.perf_counter() - start)
+                if name == "exact":
+                    hits += rule["id"] in top
+                else:
+                    relevant = by_topic[(rule["code"], rule["conditions"]["diagnosis_keywords"][0])]
+                    hits += any(rule_id in relevant for rule_id in top)
+            latencies.sort()
+            results[name] = (hits / len(latencies), percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000)
+    return build_s, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'rules':>8} {'build s':>8} {'query set':<12} {f'recall@{args.k}':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        build_s, results = run(size, args.queries, args.k, rng)
+        for name, (recall, p50, p95) in results.items():
+            print(f"{size:>8} {build_s:>8.2f} {name:<12} {recall:>9.1%} {p50:>8.2f} {p95:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Microbenchmark for the rules engine: lookup cost as the rule count grows.
+
+    python benchmarks/bench_rules_engine.py [--sizes 100,1000,10000,100000]
+
+The indexed lookup should stay flat; the linear scan (the old find_rule) is
+shown for comparison up to --scan-limit rules.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rules_engine import RuleIndex
+
+KEYWORD_SETS = [
+    ["non-small cell lung cancer", "nsclc"],
+    ["breast cancer", "her2-positive"],
+    ["multiple myeloma"],
+    ["colorectal cancer", "crc"],
+]
+STAGE_SETS = [["stage iii", "stage iv"], ["stage iv"], ["stage ii", "stage iii"]]
+
+def make_rules(count: int, rng: random.Random):
+    rules = []
+    for i in range(count):
+        rules.append({
+            "id": f"R-{i:06d}",
+            "payer": f"Payer{i % 500}",
+            "code": f"J{i // 500:04d}",
+            "requires_auth": rng.random() < 0.7,
+            "conditions": {
+                "diagnosis_keywords": rng.choice(KEYWORD_SETS),
+                "stages": rng.choice(STAGE_SETS),
+            },
+        })
+    return rules
+
+def linear_find(rules, payer, code):
+    for rule in rules:
+        if rule["payer"].lower() == payer.lower() and rule["code"] == code:
+            return rule
+    return None
+
+def time_per_call(fn, queries, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            fn(*query)
+    return (time.perf_counter() - start) / (repeat * len(queries))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scan-limit", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'rules':>8} {'build ms':>10} {'match us':>10} {'scan us':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rules = make_rules(size, rng)
+        start = time.perf_counter()
+        index = RuleIndex(rules)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        sample = [rng.choice(rules) for _ in range(args.queries)]
+        queries = [
+            (r["payer"].upper(), r["code"], "Metastatic NSCLC adenocarcinoma", "Stage IV")
+            for r in sample
+        ]
+        match_us = time_per_call(index.match, queries, args.repeat) * 1e6
+
+        scan = "-"
+        if size <= args.scan_limit:
+            scan_queries = [(q[0], q[1]) for q in queries[:100]]
+            scan = f"{time_per_call(lambda p, c: linear_find(rules, p, c), scan_queries, 1) * 1e6:.2f}"
+        print(f"{size:>8} {build_ms:>10.1f} {match_us:>10.2f} {scan:>10}")
+
+if __name__ == "__main__":
+    main()
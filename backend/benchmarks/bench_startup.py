@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark for the two deployments (app.main and api/index.py).
+
+Each run is a fresh interpreter that measures how long the module takes to
+import and how long the first request takes to serve:
+
+    python benchmarks/bench_startup.py [--runs 5] [--max-import-ms 1500]
+
+"mock" runs without Azure credentials; "azure" sets a dummy key so the first
+request takes the Azure code path (lazy SDK imports and graph compilation).
+The request is a rule-decided auth check, so no network call is made.
+Exits non-zero if a median import time exceeds --max-import-ms.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "app.main": "app.main",
+    "api/index.py": "api.index",
+}
+
+PAYLOAD = {
+    "payer": "MockHealth",
+    "code": "J9312",
+    "diagnosis": "Non-small cell lung cancer",
+    "stage": "Stage IV",
+}
+
+# Runs inside the child interpreter
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__({module!r}, fromlist=["app"])
+import_ms = (time.perf_counter() - start) * 1000
+modules = len(sys.modules)
+
+from fastapi.testclient import TestClient
+client = TestClient(module.app)
+start = time.perf_counter()
+response = client.post("/check_auth_need", json={payload!r})
+first_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": import_ms, "first_ms": first_ms, "modules": modules, "status": response.status_code}}))
+"""
+
+def run_once(module: str, azure: bool) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("AZURE_OPENAI_")}
+    if azure:
+        env.update({
+            "AZURE_OPENAI_API_KEY": "benchmark",
+            "AZURE_OPENAI_ENDPOINT": "https://localhost.invalid",
+            "AZURE_OPENAI_API_VERSION": "2024-02-01",
+            "AZURE_OPENAI_DEPLOYMENT_NAME": "benchmark",
+        })
+    code = CHILD.format(module=module, payload=PAYLOAD)
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'target':<14} {'mode':<6} {'import ms':>10} {'first req ms':>13} {'modules':>8}")
+    for name, module in TARGETS.items():
+        for mode in ("mock", "azure"):
+            runs = [run_once(module, mode == "azure") for _ in range(args.runs)]
+            import_ms = statistics.median(r["import_ms"] for r in runs)
+            first_ms = statistics.median(r["first_ms"] for r in runs)
+            modules = runs[-1]["modules"]
+            print(f"{name:<14} {mode:<6} {import_ms:>10.1f} {first_ms:>13.1f} {modules:>8}")
+            if args.max_import_ms is not None and import_ms > args.max_import_ms:
+                failed = True
+    if failed:
+        print(f"Import time exceeded {args.max_import_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Per-worker memory of the rule index in a pre-fork deployment.
+
+    python benchmarks/bench_worker_memory.py [--rules 100000] [--workers 4] [--lookups 20000]
+
+For each mode, a fresh process loads the index and forks --workers children
+(as gunicorn does with preload_app), each of which serves --lookups random
+matches and then reports its memory from /proc/self/smaps_rollup:
+
+  per-process  RuleIndex built from the rules file (today's default)
+  snapshot     MappedRuleIndex over a memory-mapped snapshot (RULES_SNAPSHOT_PATH)
+
+USS is memory private to the worker; PSS splits shared pages among the
+processes mapping them. Linux only.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_rules_engine import make_rules
+from app.rules_engine import MappedRuleIndex, RuleIndex, load_rules, write_rule_snapshot
+
+MODES = ("per-process", "snapshot")
+
+def memory_kb() -> dict:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+def run_mode(mode: str, rules_path: str, snapshot_path: str, workers: int, lookups: int):
+    """
+    Child entry point: load, fork, serve, print the workers' reports as JSON.
+    """
+    start = time.perf_counter()
+    index = RuleIndex(load_rules(rules_path)) if mode == "per-process" else MappedRuleIndex(snapshot_path)
+    load_ms = (time.perf_counter() - start) * 1000
+    keys = [(f"Payer{i % 500}", f"J{i // 500:04d}") for i in range(len(index))]
+
+    pipes = []
+    for worker in range(workers):
+        read, write = os.pipe()
+        if os.fork() == 0:
+            os.close(read)
+            rng = random.Random(worker)
+            start = time.perf_counter()
+            for _ in range(lookups):
+                payer, code = rng.choice(keys)
+                index.match(payer, code, "Metastatic NSCLC", "Stage IV")
+            elapsed = time.perf_counter() - start
+            report = {**memory_kb(), "match_us": elapsed / lookups * 1e6, "load_ms": load_ms}
+            os.write(write, json.dumps(report).encode())
+            os._exit(0)
+        os.close(write)
+        pipes.append(read)
+    reports = []
+    for read in pipes:
+        with os.fdopen(read) as f:
+            reports.append(json.loads(f.read()))
+        os.waitpid(-1, 0)
+    print(json.dumps(reports))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--paths", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.child, *args.paths, args.workers, args.lookups)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rules_path = os.path.join(tmp, "rules.jsonl")
+        snapshot_path = os.path.join(tmp, "rules.snapshot")
+        rules = make_rules(args.rules, random.Random(42))
+        with open(rules_path, "w") as f:
+            f.writelines(json.dumps(rule) + "\n" for rule in rules)
+        write_rule_snapshot(rules, snapshot_path)
+        print(f"{args.rules} rules, snapshot {os.path.getsize(snapshot_path) / 2**20:.1f} MiB, {args.workers} workers")
+
+        print(f"{'mode':>12} {'load ms':>9} {'USS MiB':>9} {'PSS MiB':>9} {'RSS MiB':>9} {'match us':>9}")
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--paths", rules_path, snapshot_path,
+                 "--workers", str(args.workers), "--lookups", str(args.lookups)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            reports = json.loads(output)
+            median = {key: statistics.median(r[key] for r in reports) for key in reports[0]}
+            print(f"{mode:>12} {median['load_ms']:>9.0f} {median['uss'] / 1024:>9.1f} {median['pss'] / 1024:>9.1f} "
+                  f"{median['rss'] / 1024:>9.1f} {median['match_us']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Local stand-in for Azure OpenAI chat completions, for offline benchmarks.
+
+    python benchmarks/fake_openai.py --port 8900 --latency 0.3 --tokens-per-sec 80 --error-rate 0.02
+
+Point the API at it with:
+
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8900 AZURE_OPENAI_API_KEY=fake \\
+    AZURE_OPENAI_API_VERSION=2024-02-01 AZURE_OPENAI_DEPLOYMENT_NAME=fake
+
+Every request waits `latency` seconds before the first token and then
+emits tokens at `tokens_per_sec`; `stream: true` requests get SSE chunks.
+A fraction `error_rate` of requests fails with 429 (with Retry-After) or 500.
+The reply is shaped after the prompt: a JSON checklist, a JSON field
+extraction, or plain prose of `completion_tokens` words.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+_PATH_RE = re.compile(r"^/openai/deployments/([^/]+)/chat/completions")
+
+CHECKLIST_REPLY = json.dumps([
+    {"category": "Pathology", "item": "Biopsy report confirming diagnosis", "mandatory": True, "reason": "Confirms histology."},
+    {"category": "Imaging", "item": "CT/PET within 30 days", "mandatory": True, "reason": "Documents stage."},
+    {"category": "Clinical Notes", "item": "Oncology consult notes", "mandatory": True, "reason": "Treatment plan."},
+])
+EXTRACT_REPLY = json.dumps({"diagnosis": "Non-small cell lung cancer", "stage": "Stage IV", "code": "J9305"})
+WORDS = ("the patient has a confirmed diagnosis and meets the clinical criteria for the requested therapy "
+         "per current guidelines and payer policy").split()
+
+@dataclass
+class FakeSettings:
+    latency: float = 0.2
+    tokens_per_sec: float = 200.0
+    error_rate: float = 0.0
+    completion_tokens: int = 60
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server speaking the chat-completions subset LangChain uses.
+    Counts requests per deployment in `requests`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: Optional[FakeSettings] = None):
+        self.settings = settings or FakeSettings()
+        self.requests = {}
+        self._rng = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _roll_error(self) -> Optional[int]:
+        with self._lock:
+            if self._rng.random() >= self.settings.error_rate:
+                return None
+            return 429 if self._rng.random() < 0.7 else 500
+
+    def _count(self, deployment: str):
+        with self._lock:
+            self.requests[deployment] = self.requests.get(deployment, 0) + 1
+
+    def reply_for(self, messages: List[dict]) -> str:
+        prompt = " ".join(str(m.get("content", "")) for m in messages)
+        if "JSON list" in prompt or "checklist" in prompt.lower():
+            return CHECKLIST_REPLY
+        if "Extract the following fields" in prompt:
+            return EXTRACT_REPLY
+        count = self.settings.completion_tokens
+        return " ".join(WORDS[i % len(WORDS)] for i in range(count)).capitalize() + "."
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                match = _PATH_RE.match(self.path)
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not match:
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                server._count(match.group(1))
+
+                settings = server.settings
+                time.sleep(settings.latency)
+                error = server._roll_error()
+                if error == 429:
+                    self._send_json(429, {"error": {"code": "429", "message": "Rate limit (fake)"}},
+                                    [("Retry-After", str(settings.retry_after))])
+                    return
+                if error:
+                    self._send_json(500, {"error": {"code": "500", "message": "Internal error (fake)"}})
+                    return
+
+                content = server.reply_for(body.get("messages", []))
+                tokens = re.findall(r"\S+\s*", content)
+                usage = {
+                    "prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in body.get("messages", [])),
+                    "completion_tokens": len(tokens),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                if body.get("stream"):
+                    self._stream(tokens, usage, body)
+                else:
+                    time.sleep(len(tokens) / settings.tokens_per_sec)
+                    self._send_json(200, {
+                        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": "fake-gpt",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                     "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+
+            def _stream(self, tokens: List[str], usage: dict, body: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+                def event(choices, extra=None):
+                    payload = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                               "model": "fake-gpt", "choices": choices, **(extra or {})}
+                    self._write_chunk(f"data: {json.dumps(payload)}\n\n")
+
+                delay = 1 / server.settings.tokens_per_sec
+                for token in tokens:
+                    time.sleep(delay)
+                    event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    event([], {"usage": usage})
+                self._write_chunk("data: [DONE]\n\n")
+                self._write_chunk("")
+
+            def _write_chunk(self, text: str):
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status: int, payload: dict, headers: List[Tuple[str, str]] = ()):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 429/500")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="Length of prose replies")
+
+def settings_from_args(args) -> FakeSettings:
+    return FakeSettings(
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        completion_tokens=args.completion_tokens,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, settings_from_args(args))
+    print(f"Fake Azure OpenAI listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Offline load test for app.main and api/index.py against the fake Azure
+OpenAI server (benchmarks/fake_openai.py).
+
+    python benchmarks/load_test.py --target main --concurrency 32 --requests 200 --latency 0.5
+
+Each target is served by uvicorn in a subprocess whose AZURE_OPENAI_* env
+points at an in-process fake server (use --mock to run without Azure
+settings). Every endpoint is then driven with `--requests` requests at
+`--concurrency`, and throughput, p50/p95/p99 latency and error rate are
+reported per endpoint. By default payloads are unique so response caching
+doesn't hide the model path; pass --repeat-payloads to measure caching.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai import FakeOpenAIServer, add_arguments, settings_from_args
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "main": "app.main:app",
+    "index": "api.index:app",
+}
+
+def payloads(i: int, unique: bool) -> Dict[str, Tuple[str, dict]]:
+    case = f" (case {i})" if unique else ""
+    return {
+        "check_auth_need": ("/check_auth_need", {
+            # No rule for this payer, so the explanation comes from the model
+            "payer": "LoadTestHealth",
+            "code": "J9305",
+            "diagnosis": "Non-small cell lung cancer" + case,
+            "stage": "Stage IV",
+        }),
+        "generate_checklist": ("/generate_checklist", {
+            "diagnosis": "Non-small cell lung cancer" + case,
+            "stage": "Stage IV",
+            "code": "J9305",
+        }),
+        "draft_letter": ("/draft_letter", {
+            "patient_name": "John Doe" + case,
+            "payer": "LoadTestHealth",
+            "code": "J9305",
+            "justification_points": ["Progression after first-line chemotherapy", "ECOG PS 1"],
+        }),
+    }
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(app_path: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{app_path} did not start")
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def drive(base_url: str, name: str, count: int, concurrency: int, unique: bool) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def one(i: int):
+            nonlocal errors
+            path, body = payloads(i, unique)[name]
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=body)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+
+        # Warm up lazy imports and graph compilation outside the measurement
+        path, body = payloads(-1, unique)[name]
+        await client.post(path, json=body)
+        latencies.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(count)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": count,
+        "rps": count / elapsed,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "error_rate": errors / count,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=[*TARGETS, "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--endpoints", default="check_auth_need,generate_checklist,draft_letter")
+    parser.add_argument("--repeat-payloads", action="store_true", help="Send identical payloads (exercises caching)")
+    parser.add_argument("--mock", action="store_true", help="Run the API without Azure settings")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    targets = list(TARGETS) if args.target == "both" else [args.target]
+    endpoints = args.endpoints.split(",")
+
+    with FakeOpenAIServer(settings=settings_from_args(args)) as fake:
+        env = {k: v for k, v in os.environ.items() if not k.startswith("AZURE_OPENAI_")}
+        if not args.mock:
+            env.update({
+                "AZURE_OPENAI_ENDPOINT": fake.url,
+                "AZURE_OPENAI_API_KEY": "fake",
+                "AZURE_OPENAI_API_VERSION": "2024-02-01",
+                "AZURE_OPENAI_DEPLOYMENT_NAME": "fake",
+            })
+
+        print(f"{'target':<7} {'endpoint':<20} {'reqs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for target in targets:
+            port = free_port()
+            process = start_server(TARGETS[target], port, env)
+            try:
+                for name in endpoints:
+                    stats = asyncio.run(drive(
+                        f"http://127.0.0.1:{port}", name, args.requests, args.concurrency, not args.repeat_payloads
+                    ))
+                    print(f"{target:<7} {name:<20} {stats['requests']:>5} {stats['rps']:>8.1f} {stats['p50']:>8.1f} "
+                          f"{stats['p95']:>8.1f} {stats['p99']:>8.1f} {stats['error_rate']:>7.1%}")
+            finally:
+                process.terminate()
+                process.wait()
+        print(f"model calls served by fake server: {sum(fake.requests.values())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Pre-fork deployment with one worker per core:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master and forked. Before that, the shared
+state is put on disk so every worker maps or opens the same copy instead of
+building its own:
+
+- the rule index, as a read-only memory-mapped snapshot (RULES_SNAPSHOT_PATH)
+- the policy retrieval index, memory-mapped from POLICY_INDEX_PATH
+- the model response cache, in SQLite (LLM_CACHE=sqlite)
+
+Job queue and idempotency results are SQLite files already. Each setting can
+still be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Set before the app is imported: the modules read them at import time
+os.environ.setdefault("RULES_SNAPSHOT_PATH", os.path.join(_data, "rules.snapshot"))
+os.environ.setdefault("LLM_CACHE", "sqlite")
+
+def on_starting(server):
+    # Save the policy index now so workers memory-map it instead of each
+    # embedding the rules on its first retrieval
+    from app.policy_index import POLICY_INDEX_PATH, PolicyIndex, np, saved_index
+    from app.rules_engine import get_index
+    if np is None:
+        return
+    rule_index = get_index()
+    if saved_index(rule_index) is None:
+        PolicyIndex.build(rule_index.rules(), POLICY_INDEX_PATH, source=rule_index.fingerprint())
@@ -0,0 +1,29 @@
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.agent_workflow import auth_app, route_after_rules, routing_stats
+
+def test_rule_decided_case_skips_llm():
+    before = routing_stats["short_circuit"]
+    state = {
+        "payer": "MockHealth",
+        "code": "J9312",
+        "diagnosis": "Non-small cell lung cancer",
+        "stage": "Stage IV"
+    }
+    # Runs offline: the templated path never touches Azure
+    result = asyncio.run(auth_app.ainvoke(state))
+    assert result["auth_needed"] is True
+    assert result["reason"].startswith("Rule R-001")
+    assert routing_stats["short_circuit"] == before + 1
+
+def test_route_after_rules():
+    decided = {"rule_id": "R-001", "conditions_met": True}
+    assert route_after_rules(decided) == "template_explain"
+    assert route_after_rules({**decided, "force_llm": True}) == "llm_explain"
+    assert route_after_rules({"rule_id": "R-001", "conditions_met": None}) == "llm_explain"
+    assert route_after_rules({}) == "llm_explain"
@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+# Force mock mode so these run offline
+os.environ.pop("AZURE_OPENAI_API_KEY", None)
+
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+def test_check_auth_need():
+    response = client.post("/check_auth_need", json={
+        "payer": "MockHealth",
+        "code": "J9312",
+        "diagnosis": "Non-small cell lung cancer",
+        "stage": "Stage IV"
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["auth_needed"] is True
+    assert body["rule_id"] == "R-001"
+
+def test_generate_checklist():
+    response = client.post("/generate_checklist", json={
+        "diagnosis": "Breast Cancer",
+        "stage": "Stage II",
+        "code": "J9000"
+    })
+    assert response.status_code == 200
+    assert len(response.json()["checklist"]) > 0
+
+def test_draft_letter():
+    response = client.post("/draft_letter", json={
+        "patient_name": "Jane Doe",
+        "payer": "BlueCross",
+        "code": "J9312",
+        "justification_points": ["Progressed on first-line therapy"]
+    })
+    assert response.status_code == 200
+    assert "Jane Doe" in response.json()["letter_content"]
+
+def test_draft_letter_stream():
+    with client.stream("POST", "/draft_letter/stream", json={
+        "patient_name": "Jane Doe",
+        "payer": "BlueCross",
+        "code": "J9312",
+        "justification_points": ["Progressed on first-line therapy"]
+    }) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = response.read().decode()
+    events = body.strip().split("\n\n")
+    assert len(events) > 2
+    assert events[-1].startswith("event: done")
+    tokens = [json.loads(e[len("data: "):])["token"] for e in events[:-1]]
+    assert "Jane Doe" in "".join(tokens)
+
+def test_check_auth_need_batch():
+    case = {"payer": "MockHealth", "code": "J9312", "diagnosis": "NSCLC", "stage": "Stage IV"}
+    response = client.post("/check_auth_need/batch", json={
+        "items": [case, {**case, "stage": "stage 4"}, {"payer": "Acme", "code": "J0001", "diagnosis": "x", "stage": "I"}],
+        "max_concurrency": 2
+    })
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = {line["index"]: line for line in lines}
+    assert sorted(results) == [0, 1, 2]
+    assert results[0]["result"] == results[1]["result"]
+    assert results[0]["result"]["rule_id"] == "R-001"
+    assert results[2]["result"]["auth_needed"] is False
+
+def test_full_packet():
+    response = client.post("/full_packet", json={
+        "patient_name": "Jane Doe",
+        "payer": "MockHealth",
+        "code": "J9312",
+        "diagnosis": "NSCLC",
+        "stage": "Stage IV",
+        "justification_points": ["Progressed on first-line therapy"]
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["auth"]["rule_id"] == "R-001"
+    assert len(body["checklist"]) > 0
+    assert "Jane Doe" in body["letter_content"]
+
+def test_check_auth_need_from_clinical_note():
+    response = client.post("/check_auth_need", json={
+        "payer": "MockHealth",
+        "clinical_note": "Diagnosis: NSCLC. Stage: IV. Plan: rituximab (J9312)."
+    })
+    assert response.status_code == 200
+    assert response.json()["rule_id"] == "R-001"
+
+    response = client.post("/check_auth_need", json={"payer": "MockHealth", "clinical_note": "No details."})
+    assert response.status_code == 422
+
+def test_metrics_and_server_timing():
+    response = client.post("/generate_checklist", json={"diagnosis": "NSCLC", "stage": "IV", "code": "J9312"})
+    assert "total;dur=" in response.headers["server-timing"]
+    metrics = client.get("/metrics").text
+    assert 'risa_http_request_duration_seconds_count{method="POST",route="/generate_checklist",status="200"}' in metrics
+    assert 'risa_llm_calls_total{operation="checklist",path="mock"}' in metrics
+
+def test_serverless_entry_point_serves_the_same_app():
+    from api.index import app as serverless_app
+    serverless = TestClient(serverless_app)
+    # Everything but the job queue, which needs long-running workers
+    server_paths = {path for path in app.openapi()["paths"] if not path.startswith("/jobs")}
+    assert set(serverless_app.openapi()["paths"]) == server_paths
+    assert serverless.get("/health").json()["status"] == "healthy"
+
+    # High-cost specialty drugs need auth whatever the payer
+    response = serverless.post("/check_auth_need", json={
+        "payer": "AnyPayer", "code": "J9271", "diagnosis": "Melanoma", "stage": "Stage III"
+    })
+    assert response.json()["auth_needed"] is True
+    assert response.json()["rule_id"] == "PA-ONCOLOGY-J9271"
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 from dotenv import load_dotenv
@@ -16,7 +17,7 @@ def test_auth_flow():
         "stage": "Stage IV",
         "clinical_note": "Patient has progressed on prior therapy."
     }
-    result = auth_app.invoke(state)
+    result = asyncio.run(auth_app.ainvoke(state))
     print("Result:", result.get("reason"))
     print("-" * 20)
 
@@ -27,7 +28,7 @@ def test_checklist_flow():
         "stage": "Stage II",
         "code": "J9000"
     }
-    result = checklist_app.invoke(state)
+    result = asyncio.run(checklist_app.ainvoke(state))
     print("Result:", result.get("checklist"))
     print("-" * 20)
 
@@ -40,7 +41,7 @@ def test_letter_flow():
         "diagnosis": "Lung Cancer",
         "clinical_note": "Standard of care requires this treatment."
     }
-    result = letter_app.invoke(state)
+    result = asyncio.run(letter_app.ainvoke(state))
     print("Result:", result.get("letter_draft")[:200] + "...") # Print first 200 chars
     print("-" * 20)
 
@@ -0,0 +1,79 @@
+import asyncio
+import csv
+import json
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.bulk import main
+from app.rules_engine import RuleIndex
+
+RULES = [
+    {"id": "R-1", "payer": "MockHealth", "code": "J9312", "requires_auth": True,
+     "conditions": {"diagnosis_keywords": ["nsclc"], "stages": ["stage iv"]}},
+    {"id": "R-2", "payer": "*", "code": "J9271", "requires_auth": True, "conditions": {}},
+    {"id": "R-3", "payer": "MockHealth", "code": "99213", "requires_auth": False, "conditions": {}},
+]
+
+CLAIMS = [
+    ["1", " mockhealth ", "j9312", "NSCLC", "Stage 4"],
+    ["2", "MockHealth", "J9312", "breast cancer", "IV"],
+    ["3", "Cigna", "J9271", "", ""],
+    ["4", "MockHealth", "J9312", "", ""],
+    ["5", "Aetna", "J0897", "NSCLC", "IV"],
+    ["6", "MockHealth", "99213", "", ""],
+    ["7", "MockHealth", "J9312", "NSCLC", "IV"],
+]
+
+def test_bulk_scoring_matches_the_rules_engine(tmp_path):
+    rules_path = tmp_path / "rules.jsonl"
+    rules_path.write_text("\n".join(json.dumps(rule) for rule in RULES))
+    claims_path = tmp_path / "claims.csv"
+    with open(claims_path, "w", newline="") as f:
+        csv.writer(f).writerows([["claim_id", "payer", "code", "diagnosis", "stage"]] + CLAIMS)
+
+    # Worker processes with small chunks must keep input order
+    out_path = tmp_path / "out.csv"
+    main([str(claims_path), "-o", str(out_path), "--rules", str(rules_path), "--chunk-size", "2", "--processes", "2"])
+    with open(out_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    index = RuleIndex(RULES)
+    assert [row["claim_id"] for row in rows] == [claim[0] for claim in CLAIMS]
+    for row in rows:
+        match = index.match(row["payer"], row["code"], row["diagnosis"] or None, row["stage"] or None)
+        assert row["rule_id"] == (match.rule_id if match else "")
+    assert [row["auth_needed"] for row in rows] == ["True", "False", "True", "True", "False", "False", "True"]
+    assert rows[3]["conditions_met"] == "" and "could not be confirmed" in rows[3]["reason"]
+
+    # JSONL output from one process gives the same outcomes
+    jsonl_path = tmp_path / "out.jsonl"
+    main([str(out_path), "-o", str(jsonl_path), "--rules", str(rules_path), "--processes", "1"])
+    records = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert [r["rule_id"] for r in records] == [row["rule_id"] or None for row in rows]
+    assert records[0]["auth_needed"] is True and records[0]["conditions_met"] is True
+
+def test_explanations_share_one_event_loop(tmp_path, monkeypatch):
+    from app.llm_client import llm_client
+    loops = []
+
+    async def explain_auth_need(rule, request):
+        loops.append(asyncio.get_running_loop())
+        return "explained"
+
+    monkeypatch.setattr(llm_client, "explain_auth_need", explain_auth_need)
+    rules_path = tmp_path / "rules.jsonl"
+    rules_path.write_text("\n".join(json.dumps(rule) for rule in RULES))
+    claims_path = tmp_path / "claims.csv"
+    with open(claims_path, "w", newline="") as f:
+        csv.writer(f).writerows([["claim_id", "payer", "code", "diagnosis", "stage"]] + CLAIMS)
+
+    out_path = tmp_path / "out.csv"
+    main([str(claims_path), "-o", str(out_path), "--rules", str(rules_path), "--chunk-size", "2",
+          "--processes", "1", "--explain"])
+    with open(out_path, newline="") as f:
+        assert [row["explanation"] for row in csv.DictReader(f)] == ["explained"] * len(CLAIMS)
+    # Every chunk ran on the same loop, which is closed once scoring ends
+    assert len(loops) > 1 and len(set(loops)) == 1 and loops[0].is_closed()
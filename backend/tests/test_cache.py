@@ -0,0 +1,104 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.cache import MemoryCache, ResponseCache, SQLiteCache, make_key
+
+def test_make_key_normalizes_case_whitespace_and_stage():
+    a = make_key("checklist", diagnosis="Lung  Cancer ", stage="Stage IV", code="J9312")
+    b = make_key("checklist", diagnosis="lung cancer", stage="stage 4", code="j9312")
+    assert a == b
+    assert a != make_key("checklist", diagnosis="lung cancer", stage="stage 3", code="j9312")
+
+def test_memory_cache_lru_and_ttl():
+    cache = MemoryCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1 and len(cache) == 2
+    expired = MemoryCache(maxsize=2, ttl=-1)
+    expired.set("a", 1)
+    assert expired.get("a") != 1
+
+def test_sqlite_cache_roundtrip(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    # Nothing is opened until first use, so a pre-fork master holds no connection
+    assert not (tmp_path / "cache.sqlite3").exists()
+    cache.set("k", [{"item": "Biopsy"}])
+    assert SQLiteCache(str(tmp_path / "cache.sqlite3")).get("k") == [{"item": "Biopsy"}]
+
+def test_single_flight_and_hits():
+    cache = ResponseCache(MemoryCache())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        results = await asyncio.gather(*[cache.get_or_compute("k", compute) for _ in range(5)])
+        results.append(await cache.get_or_compute("k", compute))
+        return results
+
+    assert asyncio.run(run()) == ["answer"] * 6
+    assert len(calls) == 1
+    assert cache.stats == {"misses": 1, "coalesced": 4, "hits": 1}
+
+def test_cancelled_computation_doesnt_cancel_coalesced_requests():
+    cache = ResponseCache(MemoryCache())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        # E.g. a prefetch, cancelled while a real request waits on it
+        first = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await waiter
+
+    assert asyncio.run(scenario()) == "value"
+    assert len(calls) == 2 and cache.stats["coalesced"] == 1
+
+def test_sqlite_cache_waits_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(SQLiteCache(path, ttl=60))
+    assert asyncio.run(cache.peek("k")) is None
+    # Another worker holds the write lock for a while
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, lambda: other.execute("COMMIT")).start()
+
+    async def compute():
+        return ["value"]
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        value = await cache.get_or_compute("k", compute)
+        task.cancel()
+        return value, ticks
+
+    value, ticks = asyncio.run(scenario())
+    # The loop kept serving while the write waited for the lock
+    assert value == ["value"] and ticks >= 10
+    assert asyncio.run(cache.peek("k")) == ["value"]
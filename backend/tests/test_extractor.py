@@ -0,0 +1,31 @@
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.extractor import extract_fields
+
+SAMPLE_NOTE = os.path.join(os.path.dirname(__file__), "..", "..", "examples", "sample_notes", "lung_cancer_case_1.txt")
+
+def test_sample_note():
+    with open(SAMPLE_NOTE) as f:
+        fields = extract_fields(f.read())
+    assert fields.diagnosis == "Non-small cell lung cancer"
+    assert fields.stage == "Stage IV"
+    assert fields.code == "J9305"
+    assert fields.ecog == 1
+    assert fields.missing() == []
+
+def test_synonyms_substages_and_drug_names():
+    fields = extract_fields("Dx: metastatic colon cancer, stage 4b. Plan: start bevacizumab. ECOG PS: 0")
+    assert fields.diagnosis == "Colorectal cancer"
+    assert fields.stage == "Stage IVB"
+    assert fields.code == "J9035"
+    assert fields.codes == []
+    assert fields.ecog == 0
+
+def test_missing_fields():
+    fields = extract_fields("Follow-up visit, patient doing well.")
+    assert fields.missing() == ["diagnosis", "stage", "code"]
+    assert extract_fields(None).missing() == ["diagnosis", "stage", "code"]
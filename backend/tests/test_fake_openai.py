@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import os
+import sys
+
+import pytest
+
+# Add backend and benchmarks to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from fake_openai import FakeOpenAIServer, FakeSettings
+from app import agent_workflow, templates
+from app.llm_client import LLMClient
+from app.metrics import llm_tokens
+from app.resilience import call_with_retries
+
+# Offline counterpart of test_azure_agent.py: the real Azure code path
+# (pooled SDK client, graphs, streaming, parsing) against a local fake.
+
+@pytest.fixture(scope="module")
+def azure_client():
+    server = FakeOpenAIServer(settings=FakeSettings(latency=0.01, tokens_per_sec=5000)).start()
+    env = {
+        "AZURE_OPENAI_ENDPOINT": server.url,
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": "2024-02-01",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "fake",
+    }
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        yield LLMClient(), server
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        server.stop()
+
+def test_explanation_uses_model_when_no_rule(azure_client):
+    client, server = azure_client
+    reason = asyncio.run(client.explain_auth_need(None, {
+        "payer": "OfflineHealth", "code": "J9305", "diagnosis": "NSCLC", "stage": "Stage IV"
+    }))
+    assert reason.startswith("The patient")
+    assert server.requests["fake"] >= 1
+
+def test_checklist_and_streamed_letter(azure_client):
+    client, _ = azure_client
+    checklist_tokens = llm_tokens.value(task="checklist", direction="output")
+
+    async def run():
+        checklist = await client.generate_checklist("NSCLC (offline)", "Stage IV", "J9305")
+        tokens = [t async for t in client.stream_letter("Jane Doe", "OfflineHealth", "J9305", ["ECOG 1"])]
+        return checklist, tokens
+
+    checklist, tokens = asyncio.run(run())
+    # The fake's items, not the mock fallback's (which share its categories)
+    assert [item["item"] for item in checklist] == ["Biopsy report confirming diagnosis", "CT/PET within 30 days", "Oncology consult notes"]
+    assert len(tokens) > 10 and "".join(tokens) != client._mock_letter("Jane Doe", "OfflineHealth", "J9305", ["ECOG 1"])
+    # The checklist is streamed; its usage arrives in the final chunk
+    assert llm_tokens.value(task="checklist", direction="output") > checklist_tokens
+
+def test_hybrid_letter_is_the_template_around_the_model_paragraph(azure_client):
+    client, _ = azure_client
+    head, tail = templates.letter_parts("Jane Doe", "MockHealth", "J9312")
+
+    async def run():
+        letter = await client.draft_letter("Jane Doe", "MockHealth", "J9312", ["ECOG 1 (hybrid)"])
+        tokens = [t async for t in client.stream_letter("Jane Doe", "MockHealth", "J9312", ["ECOG 1 (hybrid)"])]
+        return letter, tokens
+
+    letter, tokens = asyncio.run(run())
+    # Only the justification comes from the model
+    assert letter.startswith(head + "The patient") and letter.endswith(tail)
+    assert tokens[0] == head and tokens[-1] == tail and len(tokens) > 10
+
+def test_streams_are_not_restarted_by_attempt_timeouts(azure_client, monkeypatch):
+    client, server = azure_client
+    # Replies take ~0.5-1s to stream, well past a 0.2s per-attempt timeout
+    monkeypatch.setattr(agent_workflow, "call_with_retries", functools.partial(call_with_retries, attempt_timeout=0.2))
+    monkeypatch.setattr(server.settings, "tokens_per_sec", 40)
+    monkeypatch.setattr(server.settings, "completion_tokens", 20)
+    head, tail = templates.letter_parts("Jane Doe", "MockHealth", "J9312")
+
+    async def run():
+        items = [item async for item in client.stream_checklist("NSCLC (slow)", "Stage IV", "J9305")]
+        tokens = [t async for t in client.stream_letter("Jane Doe", "MockHealth", "J9312", ["ECOG 1 (slow)"])]
+        return items, tokens
+
+    items, tokens = asyncio.run(run())
+    # Each reply streamed once, from the model rather than the fallback
+    assert [item["item"] for item in items] == ["Biopsy report confirming diagnosis", "CT/PET within 30 days", "Oncology consult notes"]
+    assert "".join(tokens) == head + server.reply_for([{"content": "letter"}]) + tail
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+# Force mock mode so these run offline
+os.environ.pop("AZURE_OPENAI_API_KEY", None)
+
+from fastapi.testclient import TestClient
+from app import idempotency
+from app.idempotency import IdempotencyInProgress, IdempotencyMismatch, IdempotencyStore
+from app.main import app
+
+def test_duplicates_share_one_computation(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"letter": len(calls)}
+
+    async def scenario():
+        # Concurrent duplicates wait on the original instead of recomputing
+        first, second = await asyncio.gather(
+            store.run("k", {"a": 1}, compute),
+            store.run("k", {"a": 1}, compute),
+        )
+        assert first == ({"letter": 1}, False) and second == ({"letter": 1}, True)
+        # A later repeat is served from the file, even by another store instance
+        other = IdempotencyStore(store.path)
+        assert await other.run("k", {"a": 1}, compute) == ({"letter": 1}, True)
+        with pytest.raises(IdempotencyMismatch):
+            await other.run("k", {"a": 2}, compute)
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+def test_failures_release_the_key_and_holders_time_out(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"), wait=0.2)
+
+    async def broken():
+        raise RuntimeError("model down")
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.run("k", {}, broken)
+        # Nothing was stored, so the client's retry computes again
+        assert await store.run("k", {}, _ok) == ("ok", False)
+
+        # Another process holds the key and never finishes within `wait`
+        store._reserve("held", idempotency.fingerprint({}))
+        with pytest.raises(IdempotencyInProgress):
+            await IdempotencyStore(store.path, wait=0.2).run("held", {}, _ok)
+
+    asyncio.run(scenario())
+
+async def _ok():
+    return "ok"
+
+def test_endpoints_replay_by_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", IdempotencyStore(str(tmp_path / "idempotency.sqlite3")))
+    request = {"diagnosis": "NSCLC", "stage": "IV", "code": "J9312"}
+
+    with TestClient(app) as client:
+        first = client.post("/generate_checklist", json=request, headers={"Idempotency-Key": "abc"})
+        again = client.post("/generate_checklist", json=request, headers={"Idempotency-Key": "abc"})
+        assert first.status_code == again.status_code == 200
+        assert first.json() == again.json()
+        assert "idempotent-replayed" not in first.headers
+        assert again.headers["idempotent-replayed"] == "true"
+
+        changed = client.post("/generate_checklist", json={**request, "stage": "II"}, headers={"Idempotency-Key": "abc"})
+        assert changed.status_code == 422
+        # Keys are scoped per endpoint
+        auth = client.post("/check_auth_need", json={"payer": "MockHealth", **request},
+                           headers={"Idempotency-Key": "abc"})
+        assert auth.status_code == 200 and "idempotent-replayed" not in auth.headers
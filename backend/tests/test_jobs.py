@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+# Force mock mode so these run offline
+os.environ.pop("AZURE_OPENAI_API_KEY", None)
+
+from fastapi.testclient import TestClient
+from app.jobs import JobStore, JobWorkers, QueueFull
+from app.main import app
+from app.routers import jobs as jobs_router
+
+def test_claim_order_lease_and_backpressure(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    low = store.submit("draft_letter", {"n": 1}, priority=0)
+    high = store.submit("draft_letter", {"n": 2}, priority=5)
+    with pytest.raises(QueueFull):
+        store.submit("draft_letter", {"n": 3}, max_queued=2)
+
+    assert store.claim()["id"] == high["id"]
+    assert store.claim()["id"] == low["id"]
+    assert store.claim() is None
+
+    # A worker that died mid-job: its expired lease makes the job claimable again
+    store.submit("draft_letter", {"n": 4})
+    crashed = store.claim(lease=-1)
+    reclaimed = store.claim()
+    assert reclaimed["id"] == crashed["id"] and reclaimed["attempts"] == 2
+
+    store.complete(reclaimed["id"], {"ok": True})
+    assert store.get(reclaimed["id"])["result"] == {"ok": True}
+
+def test_jobs_endpoints_run_in_background(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs_router, "job_store", store)
+    monkeypatch.setattr(jobs_router.workers, "store", store)
+
+    with TestClient(app) as client:
+        response = client.post("/jobs/draft_letter?priority=3", json={
+            "patient_name": "Jane Doe",
+            "payer": "MockHealth",
+            "code": "J9312",
+            "justification_points": ["ECOG 1"]
+        })
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued" and job["priority"] == 3
+
+        with client.stream("GET", f"/jobs/{job['job_id']}/events") as events:
+            body = events.read().decode()
+        assert "event: done" in body
+
+        job = client.get(f"/jobs/{job['job_id']}").json()
+        assert job["status"] == "done"
+        assert job["result"]["letter_content"].startswith("Date:")
+        assert client.get("/jobs/unknown").status_code == 404
+
+def test_workers_survive_store_errors(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    claim = store.claim
+    failures = []
+
+    def locked_once():
+        if not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return claim()
+
+    store.claim = locked_once
+    job = store.submit("echo", {"n": 1})
+
+    async def echo(payload):
+        return payload
+
+    async def scenario():
+        workers = JobWorkers({"echo": echo}, store, concurrency=1, poll_interval=0.01, error_backoff=0.01)
+        await workers.start()
+        for _ in range(200):
+            if store.get(job["id"])["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        await workers.stop()
+
+    asyncio.run(scenario())
+    assert failures and store.get(job["id"])["result"] == {"n": 1}
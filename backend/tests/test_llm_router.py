@@ -0,0 +1,118 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app import llm_pool
+from app.llm_router import DeploymentRouter, HEDGE_MIN_SAMPLES
+
+class Throttled(Exception):
+    status_code = 429
+    response = type("Response", (), {"headers": {"retry-after": "30"}})()
+
+def _router(*deployments, **kwargs):
+    # "Models" are just deployment names
+    return DeploymentRouter(model_factory=lambda task, deployment: deployment,
+                            deployments=lambda task: deployments, **kwargs)
+
+def test_task_deployments_by_tier(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
+    monkeypatch.setenv("AZURE_OPENAI_SMALL_DEPLOYMENTS", "mini-east, mini-west")
+    monkeypatch.delenv("AZURE_OPENAI_LARGE_DEPLOYMENTS", raising=False)
+    for task in llm_pool.TASKS:
+        monkeypatch.delenv(f"AZURE_OPENAI_{task.upper()}_DEPLOYMENT", raising=False)
+        monkeypatch.delenv(f"AZURE_OPENAI_{task.upper()}_DEPLOYMENTS", raising=False)
+    assert llm_pool.task_deployments("explain") == ["mini-east", "mini-west"]
+    assert llm_pool.task_deployments("letter") == ["gpt-4o"]
+    # A task's own setting wins over its tier
+    monkeypatch.setenv("AZURE_OPENAI_CHECKLIST_DEPLOYMENT", "checklist-ft")
+    assert llm_pool.task_deployments("checklist") == ["checklist-ft"]
+
+def test_switching_loops_closes_the_previous_async_client():
+    async def current_client():
+        llm_pool._ensure_clients()
+        client = llm_pool._http_async_client
+        # Lets the scheduled close of the previous client run
+        await asyncio.sleep(0.01)
+        return client
+
+    try:
+        first = asyncio.run(current_client())
+        second = asyncio.run(current_client())
+        assert second is not first and first.is_closed and not second.is_closed
+        third = asyncio.run(current_client())
+        assert third is not second and second.is_closed and not third.is_closed
+    finally:
+        asyncio.run(llm_pool.aclose_pool())
+    assert third.is_closed
+
+def test_balances_on_latency_and_fails_over_on_429():
+    router = _router("a", "b")
+    calls = []
+
+    async def call(deployment):
+        calls.append(deployment)
+        if deployment == "a":
+            raise Throttled()
+        await asyncio.sleep(0.01)
+        return deployment
+
+    async def scenario():
+        # "a" is throttled: the same call fails over to "b" right away
+        assert await router.call("explain", call) == "b"
+        # ... and "a" gets no traffic while it cools down
+        assert await router.call("explain", call) == "b"
+
+    asyncio.run(scenario())
+    assert calls == ["a", "b", "b"]
+    router.record("letter", "a", 1.0)
+    router.record("letter", "b", 3.0)
+    router._cooldown_until.clear()
+    assert router.pick("letter", ["a", "b"]) == "a"
+
+def test_slow_calls_are_hedged_after_p95():
+    router = _router("slow", "fast")
+    for _ in range(HEDGE_MIN_SAMPLES):
+        router.record("explain", "slow", 0.05)
+    cancelled = []
+
+    async def call(deployment):
+        try:
+            await asyncio.sleep(1.0 if deployment == "slow" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(deployment)
+            raise
+        return deployment
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        assert await router.call("explain", call) == "fast"
+        assert asyncio.get_running_loop().time() - started < 0.5
+        # Unhedged calls wait for their deployment
+        assert await router.call("explain", call, hedge=False) == "slow"
+
+    router.pick = lambda task, candidates, exclude=(): next((d for d in candidates if d not in exclude), None)
+    asyncio.run(scenario())
+    assert cancelled == ["slow"]
+
+def test_streamed_calls_are_not_failed_over():
+    router = _router("a", "b")
+    sent = []
+
+    async def stream(deployment):
+        # Tokens reach the client as they arrive; "a" drops mid-reply
+        for token in ("Dear ", "Reviewer, "):
+            sent.append((deployment, token))
+            await asyncio.sleep(0)
+        if deployment == "a":
+            raise Throttled()
+        return "".join(token for _, token in sent)
+
+    with pytest.raises(Throttled):
+        asyncio.run(router.call("letter", stream, hedge=False, failover=False))
+    # Only one deployment's tokens went out
+    assert sent == [("a", "Dear "), ("a", "Reviewer, ")]
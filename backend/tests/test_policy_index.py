@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+pytest.importorskip("numpy")
+
+from app import policy_index
+from app.policy_index import PolicyIndex, get_policy_index, query_text, retrieve_policies, saved_index
+from app.rules_engine import MappedRuleIndex, RuleIndex, get_index, set_index, write_rule_snapshot
+
+def test_build_save_and_mmap_load(tmp_path):
+    rules = get_index().rules()
+    built = PolicyIndex.build(rules, str(tmp_path), batch_size=2)
+    loaded = PolicyIndex.load(str(tmp_path))
+    assert loaded.ids == built.ids and loaded.fingerprint == built.fingerprint
+    assert loaded.vectors.flags.writeable is False
+
+    query = query_text("Aetna", "J9312", "metastatic lung cancer", "Stage 4")
+    assert loaded.search(query, 2) == built.search(query, 2)
+    assert loaded.search(query, 1)[0][0] == "R-003"
+
+def test_synonyms_retrieve_the_matching_policy():
+    # No Aetna rule exists; NSCLC should surface the NSCLC policy first
+    related = retrieve_policies("Aetna", "J9312", "NSCLC", "Stage IV")
+    assert [rule["id"] for rule, _ in related][:2] == ["R-001", "R-003"]
+    assert all(score >= 0.15 for _, score in related)
+    assert retrieve_policies("Aetna", "J9999", "melanoma", None) == []
+
+def test_rule_swap_keeps_serving_the_previous_index_while_rebuilding():
+    original = get_index()
+    previous = get_policy_index()
+    active = policy_index._active
+    try:
+        set_index(RuleIndex(original.rules()[1:]))
+        # No build on the caller's path: the old index answers meanwhile
+        assert get_policy_index() is previous
+        deadline = time.monotonic() + 10
+        while get_policy_index() is previous and time.monotonic() < deadline:
+            time.sleep(0.01)
+        rebuilt = get_policy_index()
+        assert rebuilt is not previous and len(rebuilt.ids) == len(previous.ids) - 1
+    finally:
+        set_index(original)
+        policy_index._active = active
+
+def test_saved_index_is_matched_to_a_snapshot_without_reading_its_rules(tmp_path, monkeypatch):
+    rules = get_index().rules()
+    PolicyIndex.build(rules, str(tmp_path / "policy"))
+    write_rule_snapshot(rules, str(tmp_path / "rules.snapshot"))
+    mapped = MappedRuleIndex(str(tmp_path / "rules.snapshot"))
+    monkeypatch.setattr(mapped, "rules", lambda: pytest.fail("rules() was read"))
+    assert saved_index(mapped, str(tmp_path / "policy")) is not None
+
+    write_rule_snapshot(rules[1:], str(tmp_path / "changed.snapshot"))
+    changed = MappedRuleIndex(str(tmp_path / "changed.snapshot"))
+    assert saved_index(changed, str(tmp_path / "policy")) is None
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+# Force mock mode so these run offline
+os.environ.pop("AZURE_OPENAI_API_KEY", None)
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.prefetch import PrefetchManager, prefetcher
+
+def test_attach_reuses_matching_prefetches_only():
+    manager = PrefetchManager(ttl=60, max_running=2)
+    calls = []
+
+    def job(name, delay=0.05):
+        async def compute():
+            calls.append(name)
+            await asyncio.sleep(delay)
+            return name
+        return compute
+
+    async def scenario():
+        token = manager.start({"checklist": ("inputs", job("prefetched"))})
+        # Still running: the follow-up waits for it instead of starting over
+        assert await manager.attach(token, "checklist", "inputs", job("fresh")) == "prefetched"
+        # Different inputs, unknown tokens and kinds that weren't prefetched compute normally
+        assert await manager.attach(token, "checklist", "other inputs", job("fresh")) == "fresh"
+        assert await manager.attach("unknown", "checklist", "inputs", job("fresh")) == "fresh"
+        assert await manager.attach(token, "letter", "inputs", job("fresh")) == "fresh"
+
+        # Bounded: no new prefetch while max_running generations are in flight
+        slow = manager.start({"checklist": ("a", job("slow", 1)), "letter": ("b", job("slow", 1))})
+        assert manager.start({"checklist": ("c", job("skipped"))}) is None
+        # Cancelling frees the slots
+        assert manager.cancel(slow)
+        assert await manager.attach(slow, "checklist", "a", job("fresh")) == "fresh"
+
+    asyncio.run(scenario())
+    assert calls.count("prefetched") == 1 and "skipped" not in calls
+    assert manager.stats["hits"] == 1 and manager.stats["skipped"] == 1 and manager.stats["cancelled"] == 2
+
+def test_expired_prefetches_are_cancelled():
+    manager = PrefetchManager(ttl=0.05)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def fresh():
+        return "fresh"
+
+    async def scenario():
+        token = manager.start({"checklist": ("inputs", hang)})
+        await asyncio.sleep(0.1)
+        assert await manager.attach(token, "checklist", "inputs", fresh) == "fresh"
+
+    asyncio.run(scenario())
+    assert manager.stats["expired"] == 1
+
+def test_follow_up_calls_pick_up_the_prefetch():
+    case = {"payer": "Aetna", "code": "J9271", "diagnosis": "Melanoma", "stage": "IV"}
+    letter = {"patient_name": "Jane Doe", "payer": "Aetna", "code": "J9271", "justification_points": ["ECOG 1"]}
+    hits = prefetcher.stats["hits"]
+
+    with TestClient(app) as client:
+        # Not requested: no token
+        assert client.post("/check_auth_need", json=case).json()["case_token"] is None
+
+        auth = client.post("/check_auth_need", json={**case, "prefetch": True, "patient_name": "Jane Doe",
+                                                     "justification_points": ["ECOG 1"]}).json()
+        assert auth["auth_needed"] and auth["case_token"]
+        token = auth["case_token"]
+
+        checklist = {"diagnosis": "Melanoma", "stage": "IV", "code": "J9271"}
+        prefetched = client.post("/generate_checklist", json={**checklist, "case_token": token})
+        assert prefetched.json() == client.post("/generate_checklist", json=checklist).json()
+        prefetched = client.post("/draft_letter", json={**letter, "case_token": token})
+        assert prefetched.json() == client.post("/draft_letter", json=letter).json()
+        assert prefetcher.stats["hits"] == hits + 2
+
+        assert client.delete(f"/prefetch/{token}").status_code == 204
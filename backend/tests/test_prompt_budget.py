@@ -0,0 +1,34 @@
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.prompt_budget import compact_text, count_tokens
+
+NOTE = """- Progression after first-line carboplatin/pemetrexed.
+- Progression after first-line carboplatin/pemetrexed
+Patient enjoys gardening and lives with her daughter. She walks the dog every morning.
+Diagnosis: Non-small cell lung cancer, Stage IV, ECOG 1.
+PD-L1 TPS 60% on biopsy.
+Family history reviewed. Social history unchanged since last visit. Follow-up scheduled."""
+
+def test_duplicates_are_dropped_under_budget():
+    result = compact_text(NOTE, budget=1000)
+    assert result.text.count("Progression after first-line") == 1
+    assert result.saved > 0
+    assert result.tokens_after == count_tokens(result.text)
+
+def test_over_budget_keeps_salient_lines_in_order():
+    result = compact_text(NOTE, budget=45)
+    assert result.tokens_after <= 45
+    lines = result.text.splitlines()
+    assert lines[0].startswith("Progression")
+    assert any("Stage IV" in line for line in lines)
+    assert any("PD-L1" in line for line in lines)
+    assert "gardening" not in result.text
+
+def test_empty_and_oversized_input():
+    assert compact_text(None).text == ""
+    long_sentence = " ".join(["word"] * 500)
+    assert compact_text(long_sentence, budget=50).tokens_after <= 50
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+# Add backend and benchmarks to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from fake_openai import FakeOpenAIServer, FakeSettings
+from app import llm_client, resilience
+from app.resilience import CircuitBreaker, call_with_retries
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+def test_breaker_trips_probes_and_recovers():
+    breaker = CircuitBreaker(window=4, min_calls=4, failure_rate=0.5, open_seconds=0.05, probe_interval=0.01)
+    for ok in (True, False, True, False):
+        breaker.record(ok)
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == "half_open"
+    # Only one probe per interval while half-open
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+def test_breaker_trips_on_slow_calls():
+    breaker = CircuitBreaker(window=3, min_calls=3, slow_call=0.5, slow_rate=1.0)
+    for _ in range(3):
+        breaker.record(True, latency=1.0)
+    assert breaker.state == "open"
+
+def test_retries_honor_retry_after():
+    calls = []
+
+    async def flaky():
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise FakeAPIError(429, {"retry-after-ms": "50"})
+        return "ok"
+
+    breaker = CircuitBreaker(min_calls=100)
+    assert asyncio.run(call_with_retries(flaky, max_retries=2, circuit=breaker)) == "ok"
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.05
+
+def test_non_retryable_errors_and_timeouts():
+    async def bad_request():
+        raise FakeAPIError(400)
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    breaker = CircuitBreaker(min_calls=100)
+    with pytest.raises(FakeAPIError):
+        asyncio.run(call_with_retries(bad_request, circuit=breaker))
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_with_retries(hang, attempt_timeout=0.05, max_retries=1, circuit=breaker))
+    assert time.monotonic() - start < 0.9
+
+def test_failing_provider_fails_over_to_mock(monkeypatch):
+    server = FakeOpenAIServer(settings=FakeSettings(latency=0, error_rate=1.0, retry_after=0.01)).start()
+    breaker = CircuitBreaker(window=4, min_calls=2, open_seconds=60)
+    monkeypatch.setattr(resilience, "breaker", breaker)
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0.01)
+    for name, value in {
+        "AZURE_OPENAI_ENDPOINT": server.url,
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": "2024-02-01",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "fake",
+    }.items():
+        monkeypatch.setenv(name, value)
+
+    client = llm_client.LLMClient()
+    patient = {"payer": "FailoverHealth", "code": "J9305", "diagnosis": "NSCLC", "stage": "Stage IV"}
+    try:
+        reason = asyncio.run(client.explain_auth_need(None, patient))
+        assert reason == client._mock_explain_auth_need(None, patient)
+        assert breaker.state == "open"
+
+        # With the breaker open the provider isn't called at all
+        calls = server.requests["fake"]
+        letter = asyncio.run(client.draft_letter("Jane Doe", "FailoverHealth", "J9305", ["ECOG 1"]))
+        assert letter.startswith("Date:")
+        assert server.requests["fake"] == calls
+    finally:
+        server.stop()
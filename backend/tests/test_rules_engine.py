@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rules_engine import (
+    MappedRuleIndex, RuleIndex, RuleStore, describe_match, find_rule, get_index, load_rules, match_rule,
+    normalize_stage, open_rule_snapshot, set_index, write_rule_snapshot
+)
+
+def test_normalize_stage():
+    assert normalize_stage("Stage IV") == "stage iv"
+    assert normalize_stage("stage 4") == "stage iv"
+    assert normalize_stage("IVB") == "stage iv"
+    assert normalize_stage("Stage: IIIA") == "stage iii"
+    assert normalize_stage("IV (metastasis to brain)") == "stage iv"
+    assert normalize_stage("unknown") is None
+
+def test_find_rule_is_case_insensitive():
+    assert find_rule("mockhealth", "j9312")["id"] == "R-001"
+    assert find_rule("MockHealth", "J0000") is None
+
+def test_match_rule_conditions():
+    match = match_rule("MockHealth", "J9312", "Non-small cell lung cancer (NSCLC)", "Stage 4")
+    assert match.rule_id == "R-001" and match.conditions_met is True
+    # Stage II is outside the rule's stages
+    assert match_rule("MockHealth", "J9312", "NSCLC", "Stage II") is None
+    # Diagnosis keyword must match
+    assert match_rule("BlueCross", "J9312", "Breast cancer", "Stage IV") is None
+    # Rules without conditions always match
+    assert match_rule("MockHealth", "J9000").conditions_met is True
+
+def test_match_rule_ambiguous():
+    match = match_rule("MockHealth", "J9312", "NSCLC", "")
+    assert match.rule_id == "R-001" and match.conditions_met is None
+
+def test_index_prefers_met_rule_over_ambiguous():
+    index = RuleIndex([
+        {"id": "A", "payer": "P", "code": "C1", "requires_auth": True,
+         "conditions": {"stages": ["stage iv"]}},
+        {"id": "B", "payer": "P", "code": "C1", "requires_auth": False,
+         "conditions": {"diagnosis_keywords": ["melanoma"]}},
+    ])
+    assert index.match("p", "c1", "Melanoma", None).rule_id == "B"
+    assert index.match("p", "c1", "Lymphoma", None).rule_id == "A"
+    assert len(index) == 2
+
+def test_updated_only_reindexes_changed_keys():
+    rules = [
+        {"id": "A", "payer": "P", "code": "C1", "requires_auth": True, "conditions": {}},
+        {"id": "B", "payer": "P", "code": "C2", "requires_auth": True, "conditions": {}},
+    ]
+    index = RuleIndex(rules)
+    same, changed = index.updated(rules)
+    assert same is index and not changed
+
+    new_rules = [
+        {"id": "A", "payer": "P", "code": "C1", "requires_auth": True, "conditions": {}},
+        {"id": "B", "payer": "P", "code": "C3", "requires_auth": False, "conditions": {}},
+    ]
+    new_index, changed = index.updated(new_rules)
+    assert changed == {("p", "C2"), ("p", "C3")}
+    assert new_index.find("P", "C2") is None
+    assert new_index.find("P", "C3")["id"] == "B"
+    # Untouched buckets are shared, and the old index is unchanged
+    assert new_index.candidates("P", "C1") is index.candidates("P", "C1")
+    assert index.find("P", "C2")["id"] == "B"
+
+def test_rule_store_reload(tmp_path):
+    path = tmp_path / "rules.jsonl"
+    path.write_text(json.dumps({"id": "X-1", "payer": "Acme", "code": "J1234",
+                                "requires_auth": True, "conditions": {}}) + "\n")
+    previous = get_index()
+    try:
+        store = RuleStore(str(path))
+        set_index(RuleIndex(load_rules(str(path))))
+        assert find_rule("acme", "J1234")["requires_auth"] is True
+
+        path.write_text(json.dumps({"id": "X-1", "payer": "Acme", "code": "J1234",
+                                    "requires_auth": False, "conditions": {}}) + "\n")
+        os.utime(path, ns=(0, 10**18))
+        assert store.reload_if_changed() == {("acme", "J1234")}
+        assert find_rule("acme", "J1234")["requires_auth"] is False
+
+        # A half-written file keeps the active index
+        path.write_text('{"id": "X-1", "payer"')
+        os.utime(path, ns=(0, 2 * 10**18))
+        assert store.reload_if_changed() == set()
+        assert find_rule("acme", "J1234")["requires_auth"] is False
+    finally:
+        set_index(previous)
+
+def test_any_payer_rules_apply_without_a_payer_rule():
+    index = RuleIndex([
+        {"id": "ANY", "payer": "*", "code": "J9271", "requires_auth": True, "conditions": {}},
+        {"id": "OWN", "payer": "Acme", "code": "J9271", "requires_auth": False, "conditions": {}},
+    ])
+    assert index.find("SomePayer", "j9271")["id"] == "ANY"
+    assert index.find("Acme", "J9271")["id"] == "OWN"
+    assert describe_match(index.match("SomePayer", "J9271")).endswith("requires auth for all payers.")
+
+def test_snapshot_index_matches_in_memory_index(tmp_path):
+    rules = load_rules(os.path.join(os.path.dirname(__file__), "..", "data", "rules.jsonl"))
+    write_rule_snapshot(rules, str(tmp_path / "rules.snapshot"))
+    index, mapped = RuleIndex(rules), MappedRuleIndex(str(tmp_path / "rules.snapshot"))
+
+    assert len(mapped) == len(index) and mapped.rules() == index.rules()
+    # Read from the header, and equal to the in-memory index's
+    assert mapped.fingerprint() == index.fingerprint()
+    for rule in rules:
+        assert mapped.get(rule["id"]) == rule
+        for diagnosis, stage in (("Non-small cell lung cancer", "Stage IV"), (None, None), ("Melanoma", "II")):
+            for payer in (rule["payer"].upper(), "UnknownPayer"):
+                expected, got = index.match(payer, rule["code"], diagnosis, stage), mapped.match(payer, rule["code"], diagnosis, stage)
+                assert (expected and (expected.rule_id, expected.conditions_met)) == (got and (got.rule_id, got.conditions_met))
+    assert mapped.get("missing") is None and mapped.find("Acme", "J0000") is None
+
+def test_snapshot_is_rebuilt_when_the_rules_change(tmp_path):
+    path = tmp_path / "rules.jsonl"
+    snapshot = str(tmp_path / "rules.snapshot")
+    path.write_text(json.dumps({"id": "X-1", "payer": "Acme", "code": "J1234",
+                                "requires_auth": True, "conditions": {}}) + "\n")
+    assert open_rule_snapshot(str(path), snapshot).find("acme", "J1234")["requires_auth"] is True
+    previous = get_index()
+    try:
+        store = RuleStore(str(path), snapshot_path=snapshot)
+        set_index(open_rule_snapshot(str(path), snapshot))
+        path.write_text(json.dumps({"id": "X-1", "payer": "Acme", "code": "J1234",
+                                    "requires_auth": False, "conditions": {}}) + "\n")
+        os.utime(path, ns=(0, 10**18))
+        assert store.reload_if_changed() == {("acme", "J1234")}
+        assert isinstance(get_index(), MappedRuleIndex)
+        assert find_rule("acme", "J1234")["requires_auth"] is False
+    finally:
+        set_index(previous)
@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.structured_output import ChecklistStreamParser, parse_checklist, parse_stats
+
+ITEM = '{"category": "Pathology", "item": "Biopsy Report", "mandatory": true, "reason": "Confirm diagnosis"}'
+
+def test_clean_reply():
+    before = parse_stats["clean"]
+    items, error = parse_checklist(f"[{ITEM}, {ITEM}]")
+    assert error is None and len(items) == 2
+    assert parse_stats["clean"] == before + 1
+
+def test_stream_yields_items_as_objects_close():
+    parser = ChecklistStreamParser()
+    reply = f"```json\n[{ITEM},\n{ITEM}]\n```"
+    split = reply.index("},") + 1
+    assert parser.feed(reply[:split - 5]) == []
+    assert len(parser.feed(reply[split - 5:split])) == 1
+    assert len(parser.feed(reply[split:])) == 1
+
+def test_repairs_truncation_and_python_literals():
+    before = parse_stats["repaired"]
+    truncated = f'Here you go: [{ITEM.replace("true", "True")}, {{"category": "Imaging", "item": "CT'
+    items, error = parse_checklist(truncated)
+    assert error is None
+    assert items == [{"category": "Pathology", "item": "Biopsy Report", "mandatory": True, "reason": "Confirm diagnosis"}]
+    assert parse_stats["repaired"] == before + 1
+
+def test_braces_inside_strings_and_wrapper_objects():
+    reply = '{"checklist": [{"category": "Notes", "item": "Plan {draft}", "mandatory": false, "reason": "a \\"}\\" b"}]}'
+    items, error = parse_checklist(reply)
+    assert error is None
+    assert items[0]["item"] == "Plan {draft}"
+
+def test_unparseable_reply_reports_error():
+    items, error = parse_checklist("I cannot help with that.")
+    assert items == [] and error.startswith("Reply is not valid JSON")
+    items, error = parse_checklist('[{"category": "Pathology", "item": "Biopsy", "mandatory": "maybe"}]')
+    assert items == [] and "no valid checklist items" in error
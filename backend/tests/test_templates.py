@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app import templates
+
+def test_letters_use_the_payers_template():
+    default = templates.render_letter("Jane Doe", "OtherHealth", "J9271", ["ECOG 1", "PD-L1 50%"])
+    assert default.startswith("Date:") and "To: OtherHealth Utilization Management" in default
+    assert "- ECOG 1\n- PD-L1 50%\n\nThis treatment aligns" in default
+
+    head, tail = templates.letter_parts("Jane Doe", "BlueCross", "J9271")
+    assert "Prior Authorization Request for Jane Doe" in head and "HCPCS Code: J9271" in head
+    assert head.endswith("\n\n") and tail.startswith("\n\n") and tail.endswith("[Institution]")
+    # Payers match case-insensitively, as in the rules
+    assert templates.letter_parts("Jane Doe", "BLUECROSS", "J9271") == (head, tail)
+    # The model's paragraph goes between them as is
+    letter = templates.render_letter("Jane Doe", "BlueCross", "J9271", [], " The patient progressed. \n")
+    assert letter == head + "The patient progressed." + tail
+
+def test_templates_reject_unknown_fields():
+    assert templates.compile_template("Re: {patient_name}") == (("Re: ", "patient_name"),)
+    with pytest.raises(ValueError):
+        templates.compile_template("Diagnosis: {diagnosis}")
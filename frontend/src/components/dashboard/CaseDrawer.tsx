@@ -22,6 +22,12 @@ interface CaseDrawerProps {
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
+const justificationPoints = (caseData: CaseData) => [
+    `${caseData.diagnosis} ${caseData.stage}`,
+    "Therapy aligned with NCCN guidelines",
+    "Clinical necessity supported by notes"
+];
+
 const CaseDrawer = ({ isOpen, onClose, caseData }: CaseDrawerProps) => {
     const [checklist, setChecklist] = useState<any[]>([]);
     const [letter, setLetter] = useState<string | null>(null);
@@ -57,7 +63,11 @@ const CaseDrawer = ({ isOpen, onClose, caseData }: CaseDrawerProps) => {
                     code: caseData.treatmentCode.split(' ')[0], // Extract code like J9035
                     diagnosis: caseData.diagnosis,
                     stage: caseData.stage,
-                    clinical_note: caseData.clinicalNote || "Standard clinical note"
+                    clinical_note: caseData.clinicalNote || "Standard clinical note",
+                    // Let the backend start the checklist and letter right away
+                    prefetch: true,
+                    patient_name: caseData.patientName,
+                    justification_points: justificationPoints(caseData)
                 })
             });
 
@@ -70,7 +80,7 @@ const CaseDrawer = ({ isOpen, onClose, caseData }: CaseDrawerProps) => {
 
             // If auth needed, generate checklist
             if (data.auth_needed) {
-                generateChecklist();
+                generateChecklist(data.case_token);
             }
         } catch (e) {
             console.error("Error checking auth:", e);
@@ -91,7 +101,7 @@ const CaseDrawer = ({ isOpen, onClose, caseData }: CaseDrawerProps) => {
         setLoading(null);
     };
 
-    const generateChecklist = async () => {
+    const generateChecklist = async (caseToken?: string) => {
         if (!caseData) return;
         setLoading('checklist');
         try {
@@ -102,7 +112,8 @@ const CaseDrawer = ({ isOpen, onClose, caseData }: CaseDrawerProps) => {
                     diagnosis: caseData.diagnosis,
                     stage: caseData.stage,
                     code: caseData.treatmentCode.split(' ')[0],
-                    clinical_note: caseData.clinicalNote || "Standard clinical note"
+                    clinical_note: caseData.clinicalNote || "Standard clinical note",
+                    case_token: caseToken
                 })
             });
 
@@ -133,11 +144,8 @@ const CaseDrawer = ({ isOpen, onClose, caseData }: CaseDrawerProps) => {
                     payer: caseData.payer,
                     code: caseData.treatmentCode.split(' ')[0],
                     clinical_note: caseData.clinicalNote || "Standard clinical note",
-                    justification_points: [
-                        `${caseData.diagnosis} ${caseData.stage}`,
-                        "Therapy aligned with NCCN guidelines",
-                        "Clinical necessity supported by notes"
-                    ]
+                    justification_points: justificationPoints(caseData),
+                    case_token: authStatus?.case_token
                 })
             });
 